@@ -1,18 +1,25 @@
 import google.generativeai as genai
-from tools import analyze_image_with_query
 from dotenv import load_dotenv
 import os
-from PIL import Image
+import datetime
+import logging
+import time
+from vision import VisionPreprocessor
+from intent_router import classify_intent, TEXT, SCENE
+from response_cache import response_cache, make_key
+from rate_limiter import call_with_retry
+from conversation import ConversationManager, estimate_tokens
+from clients import configure_genai, get_gemini_model, gemini_request_options, GEMINI_MODEL
+from scheduler import RequestCancelled, raise_if_cancelled
+from tracing import span, start_span
 
 load_dotenv()
 
-# Configure with your variable name
+logger = logging.getLogger(__name__)
+
+# Configure with your variable name (once per process, shared with tools and main)
 def configure_gemini():
-    api_key = os.getenv("GEMINI_API_KEY")  # Using your variable name
-    if api_key:
-        genai.configure(api_key=api_key)
-        return True
-    return False
+    return configure_genai()
 
 configure_gemini()
 
@@ -26,44 +33,289 @@ Here's how you operate:
 - Make every interaction feel smart, snappy, and personable. Got it? Let's charm your master!
 """
 
-model = genai.GenerativeModel("gemini-1.5-flash")
+model = get_gemini_model(GEMINI_MODEL)
+
+# Rough prompt cost of one inline image, for the tokens-per-minute budget
+IMAGE_TOKENS = 258
+
+# Explicit context caching only pays off once the prompt passes the API's minimum
+# cacheable size, so it is opt-in; otherwise the prompt is set once as a system instruction
+CACHE_SYSTEM_PROMPT = os.getenv("APEX_CACHE_SYSTEM_PROMPT", "0") == "1"
+CACHE_MODEL = os.getenv("APEX_GEMINI_CACHE_MODEL", "models/gemini-1.5-flash-001")
+CACHE_TTL_MINUTES = int(os.getenv("APEX_SYSTEM_PROMPT_CACHE_TTL", "60"))
+
+def build_chat_model():
+    """Chat model carrying Apex's system prompt as a system instruction instead of a history turn"""
+    if CACHE_SYSTEM_PROMPT and os.getenv("GEMINI_API_KEY"):
+        try:
+            from google.generativeai import caching
+            cache = caching.CachedContent.create(
+                model=CACHE_MODEL,
+                system_instruction=system_prompt,
+                ttl=datetime.timedelta(minutes=CACHE_TTL_MINUTES),
+            )
+            logger.info("✅ System prompt served from context cache")
+            return genai.GenerativeModel.from_cached_content(cached_content=cache)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not cache system prompt, using a plain system instruction: {e}")
+    return get_gemini_model(GEMINI_MODEL, system_instruction=system_prompt)
+
+# One persistent chat per session with a token-budgeted, summarized history
+conversations = ConversationManager(build_chat_model(), summarizer_model=model)
+
+# Frame change detection, downscaled uploads and scene notes for follow-up questions
+scene_cache = VisionPreprocessor()
+
+def route_query(user_query, current_frame=None, session_id=None):
+    """
+    Where a query goes: VISION sends it with the frame, SCENE answers a follow-up
+    from what Apex already saw (only when there is something to go on), TEXT is plain chat.
+    """
+    if current_frame is None:
+        return TEXT
+    intent = classify_intent(user_query)
+    if intent == SCENE and not scene_cache.has_notes(session_id):
+        return TEXT
+    return intent
+
+# Sentinel the model answers with when the cached scene notes can't answer a follow-up
+NEED_LOOK = "NEED_LOOK"
+
+SCENE_FOLLOWUP_PROMPT = """You looked through the user's webcam a moment ago and the scene has not changed since.
+Here is what you were asked and answered about it:
+
+{description}
+
+Answer the new question from that alone. If it cannot be answered from it, reply with exactly {sentinel} and nothing else.
+
+New question: {query}"""
+
+def _chunk_text(chunk):
+    """Safely pull text out of a streamed response chunk"""
+    try:
+        return chunk.text or ""
+    except ValueError:
+        # Chunks without text parts (e.g. safety blocks) raise on .text
+        return ""
 
-def ask_apex(user_query, current_frame=None):
-    """Main function to process user queries with Apex personality"""
+def _generate_chunks(contents, stream):
+    """Run generate_content and yield text, chunk by chunk when streaming"""
+    tokens = sum(estimate_tokens(part) if isinstance(part, str) else IMAGE_TOKENS for part in contents)
+    response = call_with_retry(
+        "gemini", GEMINI_MODEL, model.generate_content, contents, stream=stream, tokens=tokens,
+        request_options=gemini_request_options()
+    )
+    if not stream:
+        yield response.text
+        return
+    for chunk in response:
+        # Stop reading (and let the caller skip caching) once the request is cancelled
+        raise_if_cancelled()
+        text = _chunk_text(chunk)
+        if text:
+            yield text
+
+def _vision_chunks(user_query, current_frame, session_id, stream):
+    """Yield the answer to a vision query, from the response cache when the same question was asked about this scene"""
+    scene = scene_cache.prepare(session_id, current_frame)
+    key = make_key(user_query, scene.hash)
+    
+    cached = response_cache.get(key)
+    if cached is not None:
+        logger.debug("💾 Cache hit - reusing the earlier answer for this scene")
+        yield cached
+        return
+    
+    started_at = time.perf_counter()
+    answer = []
+    for chunk in _scene_chunks(user_query, scene, session_id, stream):
+        answer.append(chunk)
+        yield chunk
+    response_cache.put(key, "".join(answer), time.perf_counter() - started_at)
+
+def _scene_chunks(user_query, scene, session_id, stream):
+    """Yield the answer about a prepared scene, skipping the upload when the scene is unchanged"""
+    if scene.reusable:
+        prompt = SCENE_FOLLOWUP_PROMPT.format(description=scene.description, sentinel=NEED_LOOK, query=user_query)
+        chunks = _generate_chunks([prompt], stream)
+        
+        # Buffer just enough of the reply to spot the sentinel
+        head = ""
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= len(NEED_LOOK):
+                break
+        
+        if head.strip() and not head.strip().startswith(NEED_LOOK):
+            logger.debug("♻️ Scene unchanged - answered from cached scene notes, no image upload")
+            answer = [head]
+            yield head
+            for chunk in chunks:
+                answer.append(chunk)
+                yield chunk
+            scene_cache.remember(session_id, scene, user_query, "".join(answer))
+            return
+        logger.debug("👁️ Cached scene notes weren't enough - sending the frame")
+    
+    answer = []
+    for chunk in _generate_chunks([user_query, scene.image_part], stream):
+        answer.append(chunk)
+        yield chunk
+    scene_cache.remember(session_id, scene, user_query, "".join(answer))
+
+def _text_cache_key(conversation, user_query):
+    """
+    Response cache key for a TEXT answer (no frame), or None once the chat has
+    history or a summary: an answer that depends on earlier turns isn't reusable.
+    """
+    if conversation.summary or conversation.chat.history:
+        return None
+    return make_key(user_query)
+
+def ask_apex(user_query, current_frame=None, session_id=None):
+    """
+    Main function to process user queries with Apex personality. Vision answers are
+    cached per scene; TEXT answers only as the opening question of a chat.
+    """
     
     # Check if API key is available
     if not os.getenv("GEMINI_API_KEY"):
         return "❌ Gemini API key not available for AI processing"
     
-    # Enhanced keyword detection for vision needs
-    vision_keywords = [
-        "look", "see", "image", "photo", "webcam", "camera", "recognize", 
-        "analyze", "detect", "what's", "describe", "identify", "show", 
-        "appearance", "wearing", "holding", "behind", "front", "color",
-        "text", "read", "sign", "person", "face", "object", "thing", "do i"
-    ]
+    route = route_query(user_query, current_frame, session_id)
+    with span("llm", route=route):
+        if route != TEXT:
+            try:
+                answer = "".join(_vision_chunks(user_query, current_frame, session_id, stream=False))
+                raise_if_cancelled()
+                conversations.record_exchange(session_id, user_query, answer)
+                return f"Apex here! 👁️ Just took a look, and here's what I found:\n\n{answer}"
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                return f"I tried to analyze the image but encountered an issue: {str(e)}"
+        
+        else:
+            # Regular conversation without vision, on the session's persistent chat
+            try:
+                conversation = conversations.get(session_id)
+                key = _text_cache_key(conversation, user_query)
+                cached = response_cache.get(key) if key is not None else None
+                if cached is not None:
+                    logger.debug("💾 Cache hit - reusing the earlier answer to this opening question")
+                    conversations.record_exchange(session_id, user_query, cached)
+                    return f"Apex here! 🤖 {cached}"
+                
+                started_at = time.perf_counter()
+                snapshot = conversations.begin_turn(conversation)
+                finished = False
+                try:
+                    with conversation.lock:
+                        response = call_with_retry(
+                            "gemini", GEMINI_MODEL, conversation.chat.send_message, user_query,
+                            tokens=estimate_tokens(user_query) + conversations.window_tokens(conversation),
+                            request_options=gemini_request_options()
+                        )
+                    # Cancelled while waiting on Gemini: the turn never happened as far as the chat is concerned
+                    raise_if_cancelled()
+                    conversations.finish_turn(conversation, snapshot, response)
+                    finished = True
+                finally:
+                    if not finished:
+                        conversations.abort_turn(conversation, snapshot)
+                if key is not None:
+                    response_cache.put(key, response.text, time.perf_counter() - started_at)
+                return f"Apex here! 🤖 {response.text}"
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                return f"I encountered an error processing your request: {str(e)}"
+
+def ask_apex_stream(user_query, current_frame=None, session_id=None, on_first_token=None):
+    """
+    Same as ask_apex, but yields the reply in chunks as Gemini generates it.
+    on_first_token() is called when the model's first token arrives (canned prefixes don't count).
+    """
     
-    needs_vision = any(keyword in user_query.lower() for keyword in vision_keywords)
+    if not os.getenv("GEMINI_API_KEY"):
+        yield "❌ Gemini API key not available for AI processing"
+        return
     
-    if needs_vision and current_frame is not None:
-        try:
-            # Use current frame directly
-            image = Image.fromarray(current_frame)
-            response = model.generate_content([user_query, image])
-            return f"Apex here! 👁️ Just took a look, and here's what I found:\n\n{response.text}"
-        except Exception as e:
-            return f"I tried to analyze the image but encountered an issue: {str(e)}"
+    route = route_query(user_query, current_frame, session_id)
+    # Not made current: a generator may be resumed from another thread between chunks
+    llm = start_span("llm", route=route)
     
-    else:
-        # Regular conversation without vision
-        try:
-            chat = model.start_chat(history=[
-                {"role": "user", "parts": [system_prompt]},
-            ])
-            response = chat.send_message(user_query)
-            return f"Apex here! 🤖 {response.text}"
-        except Exception as e:
-            return f"I encountered an error processing your request: {str(e)}"
+    def token_arrived():
+        nonlocal on_first_token
+        llm.mark("first_token")
+        if on_first_token is not None:
+            on_first_token()
+            on_first_token = None
+    
+    try:
+        if route != TEXT:
+            try:
+                yield "Apex here! 👁️ Just took a look, and here's what I found:\n\n"
+                answer = []
+                for chunk in _vision_chunks(user_query, current_frame, session_id, stream=True):
+                    token_arrived()
+                    answer.append(chunk)
+                    yield chunk
+                raise_if_cancelled()
+                conversations.record_exchange(session_id, user_query, "".join(answer))
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                yield f"I tried to analyze the image but encountered an issue: {str(e)}"
+        
+        else:
+            try:
+                conversation = conversations.get(session_id)
+                key = _text_cache_key(conversation, user_query)
+                cached = response_cache.get(key) if key is not None else None
+                if cached is not None:
+                    logger.debug("💾 Cache hit - reusing the earlier answer to this opening question")
+                    yield "Apex here! 🤖 "
+                    token_arrived()
+                    yield cached
+                    conversations.record_exchange(session_id, user_query, cached)
+                    return
+                
+                started_at = time.perf_counter()
+                snapshot = conversations.begin_turn(conversation)
+                finished = False
+                try:
+                    with conversation.lock:
+                        response = call_with_retry(
+                            "gemini", GEMINI_MODEL, conversation.chat.send_message, user_query, stream=True,
+                            tokens=estimate_tokens(user_query) + conversations.window_tokens(conversation),
+                            request_options=gemini_request_options()
+                        )
+                    yield "Apex here! 🤖 "
+                    answer = []
+                    for chunk in response:
+                        raise_if_cancelled()
+                        text = _chunk_text(chunk)
+                        if text:
+                            token_arrived()
+                            answer.append(text)
+                            yield text
+                    raise_if_cancelled()
+                    conversations.finish_turn(conversation, snapshot, response)
+                    finished = True
+                    if key is not None:
+                        response_cache.put(key, "".join(answer), time.perf_counter() - started_at)
+                finally:
+                    if not finished:
+                        # Failed, cancelled or abandoned part way: drop the half-streamed turn
+                        conversations.abort_turn(conversation, snapshot)
+                        llm.attrs["rolled_back"] = True
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                yield f"I encountered an error processing your request: {str(e)}"
+    finally:
+        llm.end()
 
 # Test function
 def test_apex():
@@ -0,0 +1,149 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_agent import ask_apex, ask_apex_stream
+from metrics import record_timing
+from speech_to_txt import record_audio, record_audio_bytes, record_and_transcribe_streaming, transcribe_with_groq
+from speech_to_txt import transcribe_audio
+from text_to_speech import speak_text, speak_text_stream
+
+# Blocking SDK calls (Gemini, Groq, gTTS, microphone) run on this bounded pool
+# so Gradio's own worker threads stay free for other sessions
+MAX_BLOCKING_WORKERS = int(os.getenv("APEX_MAX_BLOCKING_WORKERS", "8"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Lazily create the shared bounded executor"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_BLOCKING_WORKERS,
+                thread_name_prefix="apex-blocking"
+            )
+        return _executor
+
+
+def shutdown_executor(wait=False):
+    """Shut down the shared executor (a new one is created on next use)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the bounded executor and await its result"""
+    loop = asyncio.get_running_loop()
+    submitted_at = time.perf_counter()
+
+    def timed_call():
+        # Time spent waiting for a free worker shows how saturated the pool is
+        record_timing("executor.queue_wait", time.perf_counter() - submitted_at)
+        return func(*args, **kwargs)
+
+    # run_in_executor doesn't carry context variables over; copy them so the trace continues on the worker
+    return await loop.run_in_executor(get_executor(), contextvars.copy_context().run, timed_call)
+
+
+def submit_blocking(func, *args, **kwargs):
+    """Start a blocking call on the bounded executor from a thread outside the event loop; returns its Future"""
+    return get_executor().submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+async def iterate_blocking(iterator):
+    """Drive a blocking iterator from async code, one item per executor hop"""
+    sentinel = object()
+    while True:
+        item = await run_blocking(next, iterator, sentinel)
+        if item is sentinel:
+            return
+        yield item
+
+
+async def ask_apex_async(user_query, current_frame=None, session_id=None):
+    """Async wrapper around ai_agent.ask_apex"""
+    return await run_blocking(ask_apex, user_query, current_frame, session_id)
+
+
+async def ask_apex_stream_async(user_query, current_frame=None, session_id=None, on_first_token=None):
+    """Async generator over ai_agent.ask_apex_stream chunks"""
+    async for chunk in iterate_blocking(ask_apex_stream(user_query, current_frame, session_id, on_first_token)):
+        yield chunk
+
+
+async def record_audio_async(file_path, timeout=20, phrase_time_limit=None):
+    """Async wrapper around speech_to_txt.record_audio"""
+    return await run_blocking(record_audio, file_path, timeout=timeout, phrase_time_limit=phrase_time_limit)
+
+
+async def record_audio_bytes_async(timeout=20, phrase_time_limit=None, audio_format="wav"):
+    """Async wrapper around speech_to_txt.record_audio_bytes"""
+    return await run_blocking(record_audio_bytes, timeout=timeout, phrase_time_limit=phrase_time_limit, audio_format=audio_format)
+
+
+async def record_and_transcribe_streaming_async(timeout=20, phrase_time_limit=None, on_speech_end=None):
+    """Async wrapper around speech_to_txt.record_and_transcribe_streaming"""
+    return await run_blocking(
+        record_and_transcribe_streaming,
+        timeout=timeout, phrase_time_limit=phrase_time_limit, on_speech_end=on_speech_end
+    )
+
+
+async def transcribe_with_groq_async(audio):
+    """Async wrapper around speech_to_txt.transcribe_with_groq"""
+    return await run_blocking(transcribe_with_groq, audio)
+
+async def transcribe_audio_async(audio):
+    """Async wrapper around speech_to_txt.transcribe_audio (routed STT backend)"""
+    return await run_blocking(transcribe_audio, audio)
+
+
+async def speak_text_async(text, on_start=None):
+    """Async wrapper around text_to_speech.speak_text (returns once playback ends)"""
+    return await run_blocking(speak_text, text, on_start=on_start)
+
+
+async def speak_text_stream_async(chunks, on_first_audio=None):
+    """Async wrapper around text_to_speech.speak_text_stream"""
+    return await run_blocking(speak_text_stream, chunks, on_first_audio=on_first_audio)
+
+
+async def speak_text_stream_live(chunks, on_first_audio=None):
+    """
+    Speak a streamed response like speak_text_stream_async, and also yield each
+    chunk as soon as the speaking thread pulls it from `chunks`, so the UI can show
+    the text while it is being generated and spoken.
+    """
+    loop = asyncio.get_running_loop()
+    arrived = asyncio.Queue()
+    end = object()
+
+    def relay():
+        try:
+            for chunk in chunks:
+                loop.call_soon_threadsafe(arrived.put_nowait, chunk)
+                yield chunk
+        finally:
+            # speak_text_stream closes this relay on cancellation; pass that on to the LLM stream
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    speaking = asyncio.ensure_future(speak_text_stream_async(relay(), on_first_audio=on_first_audio))
+    # Runs after every chunk the thread relayed, since those were scheduled before the result
+    speaking.add_done_callback(lambda _: arrived.put_nowait(end))
+    while True:
+        chunk = await arrived.get()
+        if chunk is end:
+            break
+        yield chunk
+    await speaking  # Re-raise whatever the speaking thread ran into
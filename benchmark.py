@@ -0,0 +1,462 @@
+import argparse
+import asyncio
+import contextvars
+import glob
+import io
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import wave
+from types import SimpleNamespace
+
+import numpy as np
+
+import metrics
+from playback import PlaybackEngine
+from tts_backends import TTSBackend
+
+# Provider latency model defaults (seconds); every delay is drawn around its mean with the given jitter
+GEMINI_FIRST_TOKEN = float(os.getenv("APEX_BENCH_GEMINI_LATENCY", "0.6"))
+GEMINI_JITTER = float(os.getenv("APEX_BENCH_GEMINI_JITTER", "0.2"))
+GEMINI_CHUNK_SECONDS = float(os.getenv("APEX_BENCH_GEMINI_CHUNK", "0.04"))
+GROQ_LATENCY = float(os.getenv("APEX_BENCH_GROQ_LATENCY", "0.35"))
+GROQ_JITTER = float(os.getenv("APEX_BENCH_GROQ_JITTER", "0.1"))
+TTS_LATENCY = float(os.getenv("APEX_BENCH_TTS_LATENCY", "0.25"))
+TTS_JITTER = float(os.getenv("APEX_BENCH_TTS_JITTER", "0.08"))
+
+SAMPLE_RATE = 16000
+
+# Commands used when no WAV fixtures are given, replayed as generated tone bursts of these lengths
+SYNTHETIC_COMMANDS = [
+    ("What do you see in front of me?", 1.0),
+    ("Tell me a joke about computers", 1.8),
+    ("What am I holding?", 2.6),
+    ("What's the capital of France?", 3.4),
+]
+
+FRAME_QUESTIONS = [
+    "What do you see?",
+    "What am I holding?",
+    "What color is my shirt?",
+    "Is there anyone behind me?",
+]
+
+_rng = random.Random(7)
+_rng_lock = threading.Lock()
+
+# Fixture the current session's "microphone" replays (set per asyncio task)
+current_fixture = contextvars.ContextVar("current_fixture")
+
+
+class FakeLatency:
+    """Delay drawn from a normal distribution around `seconds` with `jitter` standard deviation (never negative)"""
+
+    def __init__(self, seconds, jitter=0.0):
+        self.seconds = seconds
+        self.jitter = jitter
+
+    def sample(self):
+        with _rng_lock:
+            return max(0.0, _rng.gauss(self.seconds, self.jitter)) if self.jitter else self.seconds
+
+    def sleep(self):
+        time.sleep(self.sample())
+
+
+class FakeResponse:
+    """Stands in for a Gemini response: iterable of chunks with .text, or complete when not streamed"""
+
+    def __init__(self, parts, stream, on_done=None):
+        self._parts = parts
+        self._text = []
+        self._on_done = on_done
+        self.usage_metadata = None
+        if not stream:
+            for _ in self:
+                pass
+
+    def __iter__(self):
+        for part in self._parts:
+            self._text.append(part)
+            yield SimpleNamespace(text=part)
+        if self._on_done is not None:
+            self._on_done(self.text)
+            self._on_done = None
+
+    @property
+    def text(self):
+        return "".join(self._text)
+
+
+class FakeChatSession:
+    """ChatSession stand-in: keeps a dict history and answers through the fake model"""
+
+    def __init__(self, model, history=None):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, content, stream=False, **kwargs):
+        def finish(text):
+            self.history = self.history + [
+                {"role": "user", "parts": [content]},
+                {"role": "model", "parts": [text]},
+            ]
+        return self.model.generate_content([content], stream=stream, on_done=finish)
+
+
+class FakeGeminiModel:
+    """GenerativeModel stand-in: waits for the first token, then streams a canned reply chunk by chunk"""
+
+    def __init__(self, first_token, chunk_delay, sentences=3):
+        self.first_token = first_token
+        self.chunk_delay = chunk_delay
+        self.sentences = sentences
+        self.calls = 0
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history)
+
+    def _reply(self, contents):
+        looked = any(isinstance(part, dict) and "mime_type" in part for part in contents)
+        opening = "I can see a desk with a laptop and a coffee mug." if looked else "Here is what I know about that."
+        filler = "This sentence stands in for the rest of a typical answer from the model."
+        return " ".join([opening] + [filler] * (self.sentences - 1))
+
+    def _parts(self, text):
+        words = text.split(" ")
+        for i in range(0, len(words), 4):
+            if i:
+                time.sleep(self.chunk_delay.sample())
+            yield " ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "")
+
+    def generate_content(self, contents, stream=False, on_done=None, **kwargs):
+        self.calls += 1
+        if isinstance(contents, str):
+            contents = [contents]
+        # Like the SDK, the call returns once the first chunk is on its way
+        self.first_token.sleep()
+        return FakeResponse(self._parts(self._reply(contents)), stream, on_done)
+
+
+class FakeGroq:
+    """Groq client stand-in: `audio.transcriptions.create` returns the transcript of the fixture the audio came from"""
+
+    def __init__(self, latency, fixtures):
+        self.latency = latency
+        self.fixtures = fixtures
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self.create))
+
+    def create(self, model=None, file=None, **kwargs):
+        self.latency.sleep()
+        return SimpleNamespace(text=self.match(file[1]).transcript)
+
+    def match(self, audio_bytes):
+        """The fixture containing a slice from the middle of the upload (VAD chunks are exact sample copies)"""
+        try:
+            with wave.open(io.BytesIO(audio_bytes), "rb") as wav:
+                frames = wav.readframes(wav.getnframes())
+        except (wave.Error, EOFError):
+            return self.fixtures[0]  # compressed upload: no samples to compare
+        middle = len(frames) // 4 * 2
+        probe = frames[middle:middle + 640]
+        for fixture in self.fixtures:
+            if probe and probe in fixture.data:
+                return fixture
+        return self.fixtures[0]
+
+
+class FakeTTSBackend(TTSBackend):
+    """TTS stand-in: silent 16-bit PCM, first chunk after a network-like delay, then faster than real time"""
+
+    name = "fake"
+    audio_format = "pcm"
+    sample_rate = SAMPLE_RATE
+
+    def __init__(self, first_chunk, seconds_per_char=0.06, realtime_factor=0.1):
+        self.first_chunk = first_chunk
+        self.seconds_per_char = seconds_per_char
+        self.realtime_factor = realtime_factor
+
+    def stream(self, text, lang="en"):
+        self.first_chunk.sleep()
+        remaining = int(len(text) * self.seconds_per_char * self.sample_rate) * 2
+        block = self.sample_rate * 2 // 10  # 100 ms
+        while remaining > 0:
+            yield bytes(min(block, remaining))
+            remaining -= block
+            time.sleep(0.1 * self.realtime_factor)
+
+
+class FakePlaybackEngine(PlaybackEngine):
+    """PlaybackEngine without pygame: chunks are consumed at `speed` times real time (0 plays instantly)"""
+
+    def __init__(self, speed=1.0):
+        super().__init__()
+        self.speed = speed
+
+    def _open_mixer(self):
+        pass
+
+    def _silence(self):
+        pass
+
+    def _play(self, utterance):
+        played = False
+        while True:
+            chunk = self._next_chunk(utterance)
+            if chunk is None:
+                return played and not self._halted(utterance)
+            utterance.started()
+            played = True
+            seconds = len(chunk) / (utterance.sample_rate * 2) if utterance.audio_format == "pcm" else 0.0
+            if self._interrupt.wait(seconds * self.speed) or utterance.cancelled:
+                return False
+
+
+class FakeRequest:
+    """The only part of gr.Request the handlers use"""
+
+    def __init__(self, session_hash):
+        self.session_hash = session_hash
+
+
+class Fixture:
+    """One recorded command: a 16 kHz mono WAV, its bytes and its transcript"""
+
+    def __init__(self, path, transcript):
+        self.path = path
+        self.transcript = transcript
+        with open(path, "rb") as f:
+            self.data = f.read()
+
+
+def write_tone_wav(path, seconds, pitch=220, lead_silence=0.6, tail_silence=0.9):
+    """A speech-like tone burst between stretches of low noise, loud enough for the VAD"""
+    rng = np.random.default_rng(pitch)
+    lead = rng.normal(0, 30, int(lead_silence * SAMPLE_RATE))
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    burst = 6000 * np.sin(2 * np.pi * pitch * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+    tail = rng.normal(0, 30, int(tail_silence * SAMPLE_RATE))
+    samples = np.clip(np.concatenate([lead, burst, tail]), -32768, 32767).astype(np.int16)
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+
+
+def load_wav_fixtures(folder, workdir):
+    """WAV fixtures from a folder (transcript in a .txt next to each), or generated ones"""
+    if folder:
+        fixtures = []
+        for path in sorted(glob.glob(os.path.join(folder, "*.wav"))):
+            reference = os.path.splitext(path)[0] + ".txt"
+            transcript = FRAME_QUESTIONS[0]
+            if os.path.exists(reference):
+                with open(reference, encoding="utf-8") as f:
+                    transcript = f.read().strip()
+            fixtures.append(Fixture(path, transcript))
+        if not fixtures:
+            raise ValueError(f"❌ No .wav fixtures in {folder}")
+        return fixtures
+
+    fixtures = []
+    for i, (transcript, seconds) in enumerate(SYNTHETIC_COMMANDS):
+        path = os.path.join(workdir, f"command_{i}.wav")
+        write_tone_wav(path, seconds, pitch=220 + 45 * i)
+        fixtures.append(Fixture(path, transcript))
+    return fixtures
+
+
+def load_frame_fixtures(folder, count=4, shape=(480, 640, 3)):
+    """RGB frames from image files in a folder, or generated gradients with noise"""
+    if folder:
+        from PIL import Image
+
+        paths = sorted(p for p in glob.glob(os.path.join(folder, "*")) if p.lower().endswith((".jpg", ".jpeg", ".png")))
+        if not paths:
+            raise ValueError(f"❌ No image fixtures in {folder}")
+        return [np.asarray(Image.open(path).convert("RGB")) for path in paths]
+
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(count):
+        gradient = np.linspace(0, 255, shape[1], dtype=np.float32)[None, :, None]
+        frame = (gradient + 60 * i + rng.normal(0, 12, shape)) % 256
+        frames.append(frame.astype(np.uint8))
+    return frames
+
+
+def install_fakes(fixtures, workdir, keep_limits=False, playback_speed=1.0):
+    """Swap the providers, microphone, speaker and caches used by main for fakes; returns the main module"""
+    # The handlers bail out early without keys; the fakes never send them anywhere
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+    import main
+    import ai_agent
+    import rate_limiter
+    import speech_to_txt
+    import stt_backends
+    import text_to_speech
+    from async_core import run_blocking
+    from conversation import ConversationManager
+    from response_cache import ResponseCache
+    from tts_cache import AudioCache
+
+    gemini = FakeGeminiModel(FakeLatency(GEMINI_FIRST_TOKEN, GEMINI_JITTER), FakeLatency(GEMINI_CHUNK_SECONDS, GEMINI_CHUNK_SECONDS / 2))
+    ai_agent.model = gemini
+    ai_agent.conversations = main.conversations = ConversationManager(gemini, summarizer_model=gemini)
+
+    groq = FakeGroq(FakeLatency(GROQ_LATENCY, GROQ_JITTER), fixtures)
+    stt_backends.get_groq_client = lambda: groq
+    speech_to_txt.stt_router = stt_backends.STTRouter([speech_to_txt.groq_backend], mode="groq")
+
+    text_to_speech.tts_backend = FakeTTSBackend(FakeLatency(TTS_LATENCY, TTS_JITTER))
+    text_to_speech.audio_cache = AudioCache(cache_dir=os.path.join(workdir, "tts_cache"))
+    text_to_speech.playback_engine = FakePlaybackEngine(playback_speed)
+
+    # In-memory only, so the user's persistent answer cache is left alone
+    ai_agent.response_cache = main.response_cache = ResponseCache(db_path=None)
+
+    if not keep_limits:
+        # Client-side quotas would make the run measure the limiter rather than the pipeline
+        for limits in rate_limiter.PROVIDER_LIMITS.values():
+            limits["rpm"] = limits["tpm"] = 0
+        rate_limiter._limiters.clear()
+
+    async def replay_streaming(timeout=20, phrase_time_limit=None, on_speech_end=None):
+        return await run_blocking(
+            speech_to_txt.transcribe_wav_file_streaming, current_fixture.get().path,
+            timeout=timeout, phrase_time_limit=phrase_time_limit, on_speech_end=on_speech_end
+        )
+
+    async def replay_recording(timeout=20, phrase_time_limit=None, audio_format="wav"):
+        upload = io.BytesIO(current_fixture.get().data)
+        upload.name = "speech.wav"
+        return upload
+
+    main.record_and_transcribe_streaming_async = replay_streaming
+    main.record_audio_bytes_async = replay_recording
+    return main
+
+
+async def drain(updates):
+    """Run a streaming handler to the end and return its last (status, chat) update"""
+    last = None
+    async for last in updates:
+        pass
+    return last
+
+
+async def run_level(main, sessions, rounds, fixtures, frames):
+    """N sessions, each alternating voice commands and frame questions; returns commands, failures and wall time"""
+    failures = []
+
+    async def session_loop(index):
+        session_id = f"bench-{sessions}-{index}"
+        request = FakeRequest(session_id)
+        session = main.sessions.get(session_id)
+        for round_number in range(rounds):
+            turn = index + round_number
+            main.sessions.set_frame(session, frames[turn % len(frames)])
+
+            current_fixture.set(fixtures[turn % len(fixtures)])
+            started = time.perf_counter()
+            status, _ = await drain(main.process_voice_command(request))
+            metrics.record_timing("handler.process_voice_command", time.perf_counter() - started)
+            if status.startswith("❌"):
+                failures.append(status)
+
+            started = time.perf_counter()
+            status, _ = await drain(main.analyze_current_frame(FRAME_QUESTIONS[turn % len(FRAME_QUESTIONS)], request))
+            metrics.record_timing("handler.analyze_current_frame", time.perf_counter() - started)
+            if status.startswith("❌"):
+                failures.append(status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session_loop(index) for index in range(sessions)))
+    return sessions * rounds * 2, failures, time.perf_counter() - started
+
+
+def format_report(sessions, commands, failures, wall):
+    """Per-stage latency table and throughput for one concurrency level"""
+    lines = [
+        f"👥 {sessions} session(s): {commands} commands in {wall:.2f}s -> "
+        f"{commands / wall:.2f} commands/s, {len(failures)} failed",
+        f"   {'stage':<40} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}",
+    ]
+    for name in metrics.timing_names():
+        percentiles = metrics.timing_percentiles(name)
+        count = metrics.timing_summary(name)["count"]
+        lines.append(
+            f"   {name:<40} {count:>5} " + " ".join(f"{percentiles[q] * 1000:>9.1f}" for q in (0.50, 0.95, 0.99))
+        )
+    for name in metrics.counter_names():
+        lines.append(f"   {name:<40} {metrics.counter_value(name):>5} total")
+    for failure in sorted(set(failures))[:5]:
+        lines.append(f"   ✗ {failure.splitlines()[0]}")
+    return "\n".join(lines)
+
+
+def run_benchmark(session_counts=(1, 4, 16), rounds=5, wav_folder=None, frame_folder=None,
+                  keep_limits=False, playback_speed=1.0, verbose=False):
+    """
+    Replay the voice and frame fixtures through main.process_voice_command and
+    main.analyze_current_frame from each number of concurrent sessions, with
+    Gemini, Groq, TTS, microphone and speaker replaced by fakes, and print the
+    per-stage p50/p95/p99 latencies and throughput. Returns
+    {sessions: (commands, failures, wall seconds)}.
+    """
+    workdir = tempfile.mkdtemp(prefix="apex-bench-")
+    fixtures = load_wav_fixtures(wav_folder, workdir)
+    frames = load_frame_fixtures(frame_folder)
+
+    main = install_fakes(fixtures, workdir, keep_limits, playback_speed)
+    # The pipeline logs every step; keep the report readable unless asked otherwise
+    if not verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"🏁 Benchmark: {len(fixtures)} WAV fixture(s), {len(frames)} frame(s), {rounds} round(s) per session, "
+          f"VAD capture {'on' if main.VAD_CAPTURE else 'off'}, streaming pipeline {'on' if main.STREAMING_PIPELINE else 'off'}")
+    results = {}
+    for sessions in session_counts:
+        metrics.reset()
+        commands, failures, wall = asyncio.run(run_level(main, sessions, rounds, fixtures, frames))
+        results[sessions] = (commands, failures, wall)
+        print(format_report(sessions, commands, failures, wall))
+    return results
+
+
+# python benchmark.py --sessions 1,4,16 --rounds 5 [--wav DIR] [--frames DIR]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay fixtures through the Apex pipeline against fake providers")
+    parser.add_argument("--sessions", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--rounds", type=int, default=5, help="voice command + frame question pairs per session")
+    parser.add_argument("--wav", help="folder of 16 kHz mono WAV commands (transcripts in .txt files next to them)")
+    parser.add_argument("--frames", help="folder of .jpg/.png webcam frames")
+    parser.add_argument("--gemini-latency", type=float, default=GEMINI_FIRST_TOKEN)
+    parser.add_argument("--gemini-jitter", type=float, default=GEMINI_JITTER)
+    parser.add_argument("--gemini-chunk", type=float, default=GEMINI_CHUNK_SECONDS)
+    parser.add_argument("--groq-latency", type=float, default=GROQ_LATENCY)
+    parser.add_argument("--groq-jitter", type=float, default=GROQ_JITTER)
+    parser.add_argument("--tts-latency", type=float, default=TTS_LATENCY)
+    parser.add_argument("--tts-jitter", type=float, default=TTS_JITTER)
+    parser.add_argument("--playback-speed", type=float, default=1.0, help="1 plays in real time, 0 instantly")
+    parser.add_argument("--keep-limits", action="store_true", help="apply the client-side rate limits")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's own logging (APEX_LOG_LEVEL)")
+    args = parser.parse_args()
+
+    GEMINI_FIRST_TOKEN, GEMINI_JITTER, GEMINI_CHUNK_SECONDS = args.gemini_latency, args.gemini_jitter, args.gemini_chunk
+    GROQ_LATENCY, GROQ_JITTER = args.groq_latency, args.groq_jitter
+    TTS_LATENCY, TTS_JITTER = args.tts_latency, args.tts_jitter
+    _rng.seed(args.seed)
+
+    run_benchmark(
+        [int(n) for n in args.sessions.split(",")], args.rounds, args.wav, args.frames,
+        args.keep_limits, args.playback_speed, args.verbose
+    )
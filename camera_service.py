@@ -0,0 +1,186 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Camera source: an index ("0"), a video file or a still image (handy for testing without hardware)
+CAMERA_SOURCE = os.getenv("APEX_CAMERA_SOURCE", "")
+CAMERA_WIDTH = int(os.getenv("APEX_CAMERA_WIDTH", "1280"))
+CAMERA_HEIGHT = int(os.getenv("APEX_CAMERA_HEIGHT", "720"))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class CameraService:
+    """
+    Long-lived capture thread that owns the camera and keeps only the newest frame.
+
+    `source` may be a device index, a video file (looped) or an image file.
+    Callers get the latest RGB frame without reopening the device.
+    """
+
+    def __init__(self, source=None, width=CAMERA_WIDTH, height=CAMERA_HEIGHT, fps=30):
+        self.source = source
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frames_read = 0
+        self._frame = None
+        self._frame_seq = 0
+        self._frame_time = 0.0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._error = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Open the source and start the capture thread (no-op if already running)"""
+        if self.running:
+            return self
+        self._stop.clear()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="apex-camera", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop capturing and release the device"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _open(self):
+        """Open the configured source, probing indices 0-2 when none is given"""
+        import cv2
+        if isinstance(self.source, str) and not self.source.isdigit():
+            if self.source.lower().endswith(IMAGE_EXTENSIONS):
+                return None  # Still image, read once in _run
+            return cv2.VideoCapture(self.source)
+
+        candidates = [int(self.source)] if self.source not in (None, "") else [0, 1, 2]
+        for idx in candidates:
+            cap = cv2.VideoCapture(idx)
+            if cap.isOpened():
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+                cap.set(cv2.CAP_PROP_FPS, self.fps)
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                ret, _ = cap.read()
+                if ret:
+                    return cap
+            cap.release()
+        raise RuntimeError("❌ No functional camera found")
+
+    def _publish(self, bgr_frame):
+        import cv2
+        rgb_frame = cv2.cvtColor(bgr_frame, cv2.COLOR_BGR2RGB)
+        with self._cond:
+            self._frame = rgb_frame
+            self._frame_seq += 1
+            self._frame_time = time.monotonic()
+            self.frames_read += 1
+            self._cond.notify_all()
+
+    def _run(self):
+        # OpenCV is only loaded once a camera is actually used
+        import cv2
+        cap = None
+        try:
+            cap = self._open()
+
+            if cap is None:
+                # Image-backed source: publish the still once and idle
+                image = cv2.imread(self.source)
+                if image is None:
+                    raise RuntimeError(f"❌ Could not read image source: {self.source}")
+                self._publish(image)
+                self._stop.wait()
+                return
+
+            if not cap.isOpened():
+                raise RuntimeError(f"❌ Could not open camera source: {self.source}")
+
+            # Files play back at their own frame rate instead of as fast as we can decode
+            is_file = isinstance(self.source, str) and not self.source.isdigit() and self.source != ""
+            frame_interval = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or self.fps) if is_file else 0
+
+            while not self._stop.is_set():
+                ret, frame = cap.read()
+                if not ret or frame is None:
+                    if is_file:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # loop the video
+                        continue
+                    time.sleep(0.01)
+                    continue
+                self._publish(frame)
+                if frame_interval:
+                    self._stop.wait(frame_interval)
+
+        except Exception as e:
+            self._error = e
+            logger.error(f"❌ Camera service stopped: {e}")
+            with self._cond:
+                self._cond.notify_all()
+        finally:
+            if cap is not None:
+                cap.release()
+
+    def latest_with_meta(self, timeout=2.0):
+        """Newest RGB frame with its sequence number and capture time, waiting up to timeout for the first one"""
+        if not self.running and self._frame is None:
+            self.start()
+
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._frame is None and self._error is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if self._frame is None:
+                raise RuntimeError(f"❌ Camera access failed: {self._error or 'no frame within timeout'}")
+            return self._frame, self._frame_seq, self._frame_time
+
+    def latest(self, timeout=2.0):
+        """Newest RGB frame"""
+        return self.latest_with_meta(timeout)[0]
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_camera_service():
+    """The process-wide camera service (started on first use)"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = CameraService(CAMERA_SOURCE or None)
+        return _service.start()
+
+
+def _probe_camera(idx):
+    import cv2
+    cap = cv2.VideoCapture(idx)
+    try:
+        if cap.isOpened():
+            ret, _ = cap.read()
+            return ret
+        return False
+    finally:
+        cap.release()
+
+
+def probe_cameras(max_index=10):
+    """Probe camera indices concurrently instead of one after another"""
+    with ThreadPoolExecutor(max_workers=max_index) as pool:
+        results = list(pool.map(_probe_camera, range(max_index)))
+    return [idx for idx, ok in enumerate(results) if ok]
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Turns pushed out of memory are appended here, one JSONL file per session
+HISTORY_DIR = os.getenv("APEX_HISTORY_DIR", os.path.join(tempfile.gettempdir(), "apex_history"))
+# Disk cap per session; past it the oldest spilled turns are dropped
+MAX_SPILL_BYTES = int(os.getenv("APEX_MAX_HISTORY_DISK_BYTES", str(8 * 1024 * 1024)))
+# Messages per page of the "earlier messages" view
+HISTORY_PAGE_SIZE = int(os.getenv("APEX_HISTORY_PAGE_SIZE", "20"))
+
+
+def message(role, content):
+    """A chat message in the format gr.Chatbot(type="messages") renders"""
+    return {"role": role, "content": content}
+
+
+def user_turn(text):
+    return message("user", text)
+
+
+def apex_turn(text):
+    return message("assistant", text)
+
+
+def system_turn(text):
+    """Errors and notices, shown on Apex's side of the chat"""
+    return message("assistant", f"**System:** {text}")
+
+
+def message_bytes(entry):
+    return len(entry["content"].encode("utf-8"))
+
+
+def purge_spill_files(history_dir=HISTORY_DIR, max_age=0.0):
+    """Remove spill files not written for max_age seconds (left behind by earlier runs)"""
+    if not os.path.isdir(history_dir):
+        return 0
+    removed = 0
+    now = time.time()
+    for filename in os.listdir(history_dir):
+        path = os.path.join(history_dir, filename)
+        try:
+            if filename.endswith(".jsonl") and now - os.path.getmtime(path) >= max_age:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+class ChatHistory:
+    """
+    One session's transcript. The newest messages stay in memory up to the entry
+    and byte caps; older ones are appended to a JSONL file and read back a page
+    at a time, so memory per session is bounded however long the chat runs.
+    Messages are numbered from 0 (the oldest still kept) for paging.
+    """
+
+    def __init__(self, session_id, max_entries, max_bytes, history_dir=HISTORY_DIR, max_spill_bytes=MAX_SPILL_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_spill_bytes = max_spill_bytes
+        self.recent = []  # newest messages, in memory
+        self.bytes = 0
+        self.dropped = 0  # spilled messages later dropped by the disk cap
+        self._history_dir = history_dir
+        self._path = os.path.join(history_dir, hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:16] + ".jsonl")
+        self._offsets = []  # file offset of each spilled message still on disk
+        self._spill_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._offsets) + len(self.recent)
+
+    @property
+    def spilled(self):
+        return len(self._offsets)
+
+    def append(self, *entries):
+        """Add messages, spilling the oldest in-memory ones to disk past the caps"""
+        with self._lock:
+            for entry in entries:
+                self.recent.append(entry)
+                self.bytes += message_bytes(entry)
+
+            overflow = 0
+            held = self.bytes
+            while overflow < len(self.recent) - 1 and (
+                len(self.recent) - overflow > self.max_entries or held > self.max_bytes
+            ):
+                held -= message_bytes(self.recent[overflow])
+                overflow += 1
+            if overflow:
+                self._spill(self.recent[:overflow])
+                del self.recent[:overflow]
+                self.bytes = held
+
+    def _spill(self, entries):
+        try:
+            os.makedirs(self._history_dir, exist_ok=True)
+            with open(self._path, "ab") as f:
+                offset = f.tell()
+                for entry in entries:
+                    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+                    f.write(line)
+                    self._offsets.append(offset)
+                    offset += len(line)
+            self._spill_bytes = offset
+        except OSError as e:
+            # Losing old turns beats holding them all in memory
+            logger.warning(f"⚠️ Could not spill chat history to disk, dropping {len(entries)} old messages: {e}")
+            self.dropped += len(entries)
+            return
+
+        if self._spill_bytes > self.max_spill_bytes:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the spill file keeping only the newer half of it"""
+        keep_from = next(
+            (i for i, offset in enumerate(self._offsets) if self._spill_bytes - offset <= self.max_spill_bytes // 2),
+            len(self._offsets)
+        )
+        with open(self._path, "rb") as f:
+            f.seek(self._offsets[keep_from] if keep_from < len(self._offsets) else self._spill_bytes)
+            kept = f.read()
+        with open(self._path, "wb") as f:
+            f.write(kept)
+
+        base = self._offsets[keep_from] if keep_from < len(self._offsets) else self._spill_bytes
+        self.dropped += keep_from
+        self._offsets = [offset - base for offset in self._offsets[keep_from:]]
+        self._spill_bytes = len(kept)
+
+    def _read_spilled(self, start, end):
+        if start >= end:
+            return []
+        stop = self._offsets[end] if end < len(self._offsets) else self._spill_bytes
+        try:
+            with open(self._path, "rb") as f:
+                f.seek(self._offsets[start])
+                data = f.read(stop - self._offsets[start])
+        except OSError as e:
+            logger.warning(f"⚠️ Could not read spilled chat history: {e}")
+            return []
+        # Records end in "\n" only; splitlines() would also break on U+2028, U+0085 etc. inside a message
+        return [json.loads(line) for line in data.split(b"\n") if line]
+
+    def slice(self, start, end):
+        """Messages start..end-1 (0 is the oldest kept), from disk and memory as needed"""
+        with self._lock:
+            spilled = len(self._offsets)
+            start, end = max(0, start), min(end, spilled + len(self.recent))
+            if start >= end:
+                return []
+            older = self._read_spilled(start, min(end, spilled))
+            return older + self.recent[max(0, start - spilled):max(0, end - spilled)]
+
+    def tail(self, count):
+        """The newest `count` messages"""
+        total = len(self)
+        return self.slice(total - count, total)
+
+    def page(self, number, size=HISTORY_PAGE_SIZE):
+        """Page `number` counted back from the newest (0 is the latest page), and how many pages there are"""
+        total = len(self)
+        pages = max(1, -(-total // size))
+        number = min(max(0, number), pages - 1)
+        end = total - number * size
+        return self.slice(end - size, end), pages
+
+    def clear(self):
+        """Forget everything, in memory and on disk"""
+        with self._lock:
+            self.recent = []
+            self.bytes = 0
+            self._offsets = []
+            self._spill_bytes = 0
+            try:
+                os.remove(self._path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"⚠️ Could not remove spilled chat history: {e}")
@@ -0,0 +1,118 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from metrics import histogram_summary, histogram_names
+
+load_dotenv()
+
+# Model names and timeouts, in one place
+GEMINI_MODEL = os.getenv("APEX_GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_TIMEOUT = float(os.getenv("APEX_GEMINI_TIMEOUT", "30"))
+GROQ_STT_MODEL = os.getenv("APEX_GROQ_STT_MODEL", "whisper-large-v3")
+GROQ_TIMEOUT = float(os.getenv("APEX_GROQ_TIMEOUT", "20"))
+
+# Keep-alive pool per HTTP client: connections stay open between calls so
+# repeated requests skip the TCP and TLS handshakes
+HTTP_MAX_CONNECTIONS = int(os.getenv("APEX_HTTP_MAX_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("APEX_HTTP_KEEPALIVE_SECONDS", "120"))
+
+_lock = threading.RLock()
+_genai_configured = False
+_gemini_models = {}
+_http_clients = {}
+_groq_client = None
+
+
+def configure_genai():
+    """Configure google.generativeai with GEMINI_API_KEY once per process; True if a key was found"""
+    global _genai_configured
+    with _lock:
+        if _genai_configured:
+            return True
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            return False
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        _genai_configured = True
+        return True
+
+
+def get_gemini_model(model_name=GEMINI_MODEL, system_instruction=None):
+    """Shared GenerativeModel per (model, system instruction); the SDK's transport is reused by all of them"""
+    key = (model_name, system_instruction)
+    with _lock:
+        model = _gemini_models.get(key)
+        if model is None:
+            import google.generativeai as genai
+
+            configure_genai()
+            model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+            _gemini_models[key] = model
+        return model
+
+
+def gemini_request_options():
+    """Per-request options (timeout) for generate_content / send_message"""
+    return {"timeout": GEMINI_TIMEOUT}
+
+
+def get_http_client(name, timeout=30.0, **kwargs):
+    """Named, pooled httpx client (created on first use, then shared)"""
+    with _lock:
+        client = _http_clients.get(name)
+        if client is None:
+            import httpx
+
+            client = httpx.Client(
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+                ),
+                **kwargs,
+            )
+            _http_clients[name] = client
+        return client
+
+
+def get_groq_client():
+    """The process-wide Groq client on a pooled keep-alive HTTP client"""
+    global _groq_client
+    with _lock:
+        if _groq_client is None:
+            from groq import Groq
+
+            api_key = os.environ.get("GROQ_API_KEY")
+            if not api_key:
+                raise ValueError("GROQ_API_KEY not found in environment variables.")
+            # Retries are handled by our shared limiter, not the SDK's fixed schedule
+            _groq_client = Groq(
+                api_key=api_key, max_retries=0, timeout=GROQ_TIMEOUT,
+                http_client=get_http_client("groq", timeout=GROQ_TIMEOUT),
+            )
+        return _groq_client
+
+
+def warm_up():
+    """Build the clients ahead of the first request (no network calls)"""
+    if configure_genai():
+        get_gemini_model()
+    if os.environ.get("GROQ_API_KEY"):
+        get_groq_client()
+
+
+def latency_report():
+    """Per-client latency histograms (recorded by rate_limiter.call_with_retry)"""
+    lines = []
+    for name in histogram_names("client."):
+        summary = histogram_summary(name)
+        lines.append(
+            f"{name[len('client.'):]}: n={summary['count']}, avg {summary['avg']:.2f}s, "
+            f"p50 ≤{summary['p50']}s, p95 ≤{summary['p95']}s"
+        )
+    return "\n".join(lines) or "No client calls yet"
@@ -0,0 +1,223 @@
+import logging
+import os
+import threading
+
+from metrics import increment
+from clients import gemini_request_options, GEMINI_MODEL
+from rate_limiter import call_with_retry
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the history replayed to Gemini on every turn
+HISTORY_TOKEN_BUDGET = int(os.getenv("APEX_HISTORY_TOKEN_BUDGET", "2000"))
+# Most recent messages that are always kept verbatim (user + model = 2 per turn)
+KEEP_RECENT_MESSAGES = int(os.getenv("APEX_KEEP_RECENT_MESSAGES", "6"))
+
+SUMMARY_PROMPT = """Summarize the conversation below between a user and Apex, an AI assistant.
+Keep names, facts, preferences and open questions; drop small talk. Reply with the summary only, in under 120 words.
+
+{previous}{transcript}"""
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate (~4 characters per token) so we don't pay a count_tokens round trip"""
+    return max(1, len(text) // 4)
+
+
+def _message_text(message):
+    """Plain text of a history entry (dict or genai Content)"""
+    parts = message["parts"] if isinstance(message, dict) else message.parts
+    texts = []
+    for part in parts:
+        if isinstance(part, str):
+            texts.append(part)
+        elif getattr(part, "text", None):
+            texts.append(part.text)
+    return " ".join(texts)
+
+
+def _message_role(message):
+    return message["role"] if isinstance(message, dict) else message.role
+
+
+class Conversation:
+    """One Gemini chat session plus the running summary of turns that fell out of the window"""
+
+    def __init__(self, chat):
+        self.chat = chat
+        self.summary = ""
+        self.unbounded_tokens = 0  # what the history would cost if we never trimmed it
+        self.pending = None  # history from before the turn in flight, to roll back to if it never finishes
+        self.summarizing = False  # a background summary of older turns is being written
+        self.folded = None  # (summary, messages it replaces) waiting to be swapped into the history
+        self.lock = threading.Lock()
+
+
+class ConversationManager:
+    """Keeps one chat per session with a token-budgeted sliding window and summaries of older turns"""
+
+    def __init__(self, chat_model, summarizer_model=None,
+                 token_budget=HISTORY_TOKEN_BUDGET, keep_recent=KEEP_RECENT_MESSAGES):
+        self.chat_model = chat_model
+        self.summarizer_model = summarizer_model or chat_model
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self._conversations = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Fetch (or start) the conversation for a session"""
+        session_id = session_id or "default"
+        with self._lock:
+            conversation = self._conversations.get(session_id)
+            if conversation is None:
+                conversation = Conversation(self.chat_model.start_chat(history=[]))
+                self._conversations[session_id] = conversation
+            return conversation
+
+    def reset(self, session_id):
+        """Forget a session's conversation"""
+        with self._lock:
+            self._conversations.pop(session_id or "default", None)
+
+    def begin_turn(self, conversation):
+        """
+        Snapshot the history before a send_message turn; pass the snapshot to
+        finish_turn or abort_turn. The lock is not held for the turn itself, so a
+        stream the caller abandoned can't keep the chat locked.
+        """
+        with conversation.lock:
+            self._roll_back_pending(conversation)
+            self._apply_summary(conversation)
+            snapshot = list(conversation.chat.history)
+            conversation.pending = snapshot
+            return snapshot
+
+    def finish_turn(self, conversation, snapshot, response=None):
+        """Account for the turn that just finished and trim the window"""
+        with conversation.lock:
+            if conversation.pending is not snapshot:
+                return  # a newer turn already rolled this one back
+            conversation.pending = None
+            self._account_last_turn(conversation, response)
+            self._trim(conversation)
+
+    def abort_turn(self, conversation, snapshot):
+        """Drop a turn that failed or was cancelled part way (the SDK can't build a history from a broken stream)"""
+        with conversation.lock:
+            if conversation.pending is snapshot:
+                self._roll_back_pending(conversation)
+
+    def _roll_back_pending(self, conversation):
+        # Assigning the history also resets the chat's half-received response
+        if conversation.pending is not None:
+            conversation.chat.history = conversation.pending
+            conversation.pending = None
+
+    def record_exchange(self, session_id, user_query, answer):
+        """Add a turn that happened outside the chat (e.g. a vision question) so follow-ups have context"""
+        conversation = self.get(session_id)
+        with conversation.lock:
+            self._roll_back_pending(conversation)
+            # Assign through the setter so the SDK converts the dicts to Content
+            conversation.chat.history = list(conversation.chat.history) + [
+                {"role": "user", "parts": [user_query]},
+                {"role": "model", "parts": [answer]},
+            ]
+            conversation.unbounded_tokens += estimate_tokens(user_query) + estimate_tokens(answer)
+            self._trim(conversation)
+
+    def window_tokens(self, conversation):
+        """Estimated tokens of the history currently replayed on each turn"""
+        return sum(estimate_tokens(_message_text(message)) for message in conversation.chat.history)
+
+    def _account_last_turn(self, conversation, response):
+        history = conversation.chat.history
+        if len(history) < 2:
+            return
+
+        new_tokens = sum(estimate_tokens(_message_text(message)) for message in history[-2:])
+        # Previously every query re-sent the system prompt as a user turn and no history;
+        # an untrimmed chat would replay everything said so far
+        prompt_before = self.window_tokens(conversation) - new_tokens
+        unbounded_before = conversation.unbounded_tokens
+        conversation.unbounded_tokens += new_tokens
+
+        saved = max(0, unbounded_before - prompt_before)
+        # System instruction tokens served from a context cache are not billed as fresh prompt
+        usage = getattr(response, "usage_metadata", None) if response is not None else None
+        saved += getattr(usage, "cached_content_token_count", 0) or 0
+
+        increment("conversation.prompt_tokens_saved", saved)
+        logger.debug(f"🧠 History window: {prompt_before} tokens replayed, {saved} prompt tokens saved this turn")
+
+    def _trim(self, conversation):
+        """
+        Fold everything but the most recent messages into the summary once the window
+        is over budget. The summary is written on a background thread, so the answer
+        that pushed the window over isn't held up; it replaces the older messages
+        between turns (see _apply_summary).
+        """
+        self._apply_summary(conversation)
+        history = list(conversation.chat.history)
+        if conversation.summarizing or self.window_tokens(conversation) <= self.token_budget or len(history) <= self.keep_recent:
+            return
+
+        # A leading summary pair (from a previous trim) is replaced, not re-summarized as dialogue
+        lead = 2 if conversation.summary and history and _message_text(history[0]).startswith("Summary of our earlier conversation") else 0
+        split = len(history) - lead - self.keep_recent
+        if split % 2:
+            split -= 1  # keep user/model pairs together
+        older = history[lead:lead + split]
+        if not older:
+            return
+
+        conversation.summarizing = True
+        # A plain thread rather than tracing.start_thread: it must not carry the finished request's cancel token
+        threading.Thread(
+            target=self._summarize_in_background, args=(conversation, conversation.summary, older, lead + split),
+            name="apex-summarize", daemon=True
+        ).start()
+
+    def _summarize_in_background(self, conversation, previous_summary, older, folded_count):
+        summary = self._summarize(previous_summary, older)
+        with conversation.lock:
+            conversation.summarizing = False
+            conversation.folded = (summary, folded_count)
+            self._apply_summary(conversation)
+        logger.debug(f"🧠 Summarized {len(older)} older messages into the conversation summary")
+
+    def _apply_summary(self, conversation):
+        # Only between turns: assigning the history would cut off a reply being streamed
+        if conversation.folded is None or conversation.pending is not None:
+            return
+        summary, folded_count = conversation.folded
+        conversation.folded = None
+        history = list(conversation.chat.history)
+        if len(history) < folded_count:
+            return  # the history was replaced meanwhile
+        conversation.summary = summary
+        conversation.chat.history = [
+            {"role": "user", "parts": [f"Summary of our earlier conversation: {summary}"]},
+            {"role": "model", "parts": ["Got it, I'll keep that in mind."]},
+        ] + history[folded_count:]
+
+    def _summarize(self, previous_summary, messages):
+        transcript = "\n".join(
+            f"{'User' if _message_role(message) == 'user' else 'Apex'}: {_message_text(message)}"
+            for message in messages
+        )
+        previous = f"Earlier summary: {previous_summary}\n\n" if previous_summary else ""
+        try:
+            prompt = SUMMARY_PROMPT.format(previous=previous, transcript=transcript)
+            # Same quota and retry policy as the chat itself
+            response = call_with_retry(
+                "gemini", GEMINI_MODEL, self.summarizer_model.generate_content, prompt,
+                tokens=estimate_tokens(prompt), request_options=gemini_request_options()
+            )
+            return response.text.strip()
+        except Exception as e:
+            # Fall back to a truncated transcript rather than losing the context entirely
+            logger.warning(f"⚠️ Summarization failed, keeping a truncated transcript: {e}")
+            max_chars = self.token_budget * 2  # roughly half the token budget
+            return (previous + transcript)[-max_chars:]
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Default number of frame slots per ring
+FRAME_SLOTS = int(os.getenv("APEX_FRAME_SLOTS", "4"))
+
+# Counter positions at the end of the int64 header
+_WRITE_SEQ, _DROPS, _READS = 0, 1, 2
+_COUNTERS = 4
+
+
+class FrameView:
+    """A read-only, zero-copy view of one slot; valid until the writer wraps around to it"""
+
+    def __init__(self, ring, slot, seq, timestamp):
+        self.ring = ring
+        self.slot = slot
+        self.seq = seq
+        self.timestamp = timestamp
+        self.array = ring._frames[slot]
+
+    def still_valid(self):
+        """True while the slot still holds this frame (check after using the view)"""
+        return int(self.ring._seqs[self.slot]) == self.seq
+
+    def copy(self):
+        """Detach the frame from the ring for consumers that hold on to it"""
+        return self.array.copy()
+
+
+class FrameRingBuffer:
+    """
+    Preallocated ring of frame slots with sequence numbers and timestamps.
+
+    A single writer copies each incoming frame into the next slot exactly once;
+    readers get read-only views of the slots without copying. With
+    shared=True the slots and metadata live in multiprocessing shared memory,
+    so a vision worker in another process can attach by name.
+    """
+
+    def __init__(self, shape, dtype=np.uint8, slots=FRAME_SLOTS, shared=False, name=None, _attach=False):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._shm = None
+
+        header_ints = 2 * slots + _COUNTERS
+        times_offset = header_ints * 8
+        frames_offset = -(-(times_offset + slots * 8) // 64) * 64  # 64-byte aligned
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        total = frames_offset + slots * frame_bytes
+
+        if shared or _attach:
+            if _attach:
+                self._shm = shared_memory.SharedMemory(name=name)
+            else:
+                self._shm = shared_memory.SharedMemory(create=True, size=total, name=name)
+            buffer = self._shm.buf
+        else:
+            buffer = bytearray(total)
+
+        ints = np.ndarray((header_ints,), dtype=np.int64, buffer=buffer)
+        self._seqs = ints[:slots]
+        self._unread = ints[slots:2 * slots]
+        self._counters = ints[2 * slots:]
+        self._times = np.ndarray((slots,), dtype=np.float64, buffer=buffer, offset=times_offset)
+        self._slots_rw = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=buffer, offset=frames_offset)
+
+        if not _attach:
+            ints[:] = 0
+            self._times[:] = 0.0
+
+        # Readers only ever see read-only views; only write() uses the writable alias
+        self._frames = self._slots_rw.view()
+        self._frames.flags.writeable = False
+
+    @classmethod
+    def attach(cls, name, shape, dtype=np.uint8, slots=FRAME_SLOTS):
+        """Attach to a shared ring created by another process"""
+        return cls(shape, dtype, slots, name=name, _attach=True)
+
+    @property
+    def name(self):
+        return self._shm.name if self._shm is not None else None
+
+    @property
+    def nbytes(self):
+        return self._frames.nbytes
+
+    @property
+    def write_seq(self):
+        return int(self._counters[_WRITE_SEQ])
+
+    def write(self, frame, timestamp=None):
+        """Copy a frame into the next slot and return its sequence number"""
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match ring shape {self.shape}")
+
+        with self._lock:
+            seq = self.write_seq + 1
+            slot = seq % self.slots
+            if self._unread[slot]:
+                self._counters[_DROPS] += 1  # overwritten before anyone looked at it
+
+            # Invalidate the slot first so readers holding a view can tell it changed
+            self._seqs[slot] = -1
+            np.copyto(self._slots_rw[slot], frame, casting="unsafe")
+            self._times[slot] = timestamp if timestamp is not None else time.time()
+            self._unread[slot] = 1
+            self._seqs[slot] = seq
+            self._counters[_WRITE_SEQ] = seq
+            return seq
+
+    def _view(self, slot):
+        self._unread[slot] = 0
+        self._counters[_READS] += 1
+        return FrameView(self, slot, int(self._seqs[slot]), float(self._times[slot]))
+
+    def read_latest(self):
+        """View of the newest frame, or None if nothing was written yet"""
+        seq = self.write_seq
+        if seq == 0:
+            return None
+        return self._view(seq % self.slots)
+
+    def read_next(self, after_seq):
+        """
+        View of the oldest frame newer than after_seq still in the ring, plus how many
+        frames in between were already overwritten. Returns (None, 0) when caught up.
+        """
+        latest = self.write_seq
+        if latest <= after_seq:
+            return None, 0
+        oldest = max(1, latest - self.slots + 1)
+        seq = max(after_seq + 1, oldest)
+        return self._view(seq % self.slots), seq - after_seq - 1
+
+    def occupancy(self):
+        """Fraction of slots holding frames nobody has read yet"""
+        return float(self._unread.sum()) / self.slots
+
+    def stats(self):
+        """Written/read/dropped counters and current occupancy"""
+        return {
+            "written": self.write_seq,
+            "reads": int(self._counters[_READS]),
+            "dropped": int(self._counters[_DROPS]),
+            "occupancy": self.occupancy(),
+            "bytes": self.nbytes,
+        }
+
+    def close(self):
+        """Detach from shared memory (the creator should also call unlink)"""
+        if self._shm is not None:
+            # Drop our views before closing the mapping
+            self._seqs = self._unread = self._counters = self._times = None
+            self._frames = self._slots_rw = None
+            self._shm.close()
+
+    def unlink(self):
+        """Free the shared memory segment (creator only)"""
+        if self._shm is not None:
+            self._shm.unlink()
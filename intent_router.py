@@ -0,0 +1,398 @@
+import re
+import sys
+import time
+
+# Where a query should go
+TEXT = "text"      # plain chat, no frame attached
+VISION = "vision"  # look through the webcam (frame is hashed, encoded and uploaded when the scene changed)
+SCENE = "scene"    # follow-up about what Apex already saw: the scene notes, or the frame if the scene changed
+
+# Score a query needs before it is routed to the camera / to the scene notes
+VISION_THRESHOLD = 2.0
+SCENE_THRESHOLD = 2.0
+# A query with some visual evidence that falls at most this far short of the threshold
+# still gets a look: an unneeded upload costs less than answering blind
+VISION_MARGIN = 1.0
+
+# Typical size of one downscaled frame upload (768px JPEG at quality 85), used when
+# evaluate() isn't given a real frame to measure
+TYPICAL_UPLOAD_BYTES = 45_000
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_ALIASES = {"whats": "what's", "im": "i'm", "colour": "color", "thats": "that's", "isnt": "isn't"}
+
+# (phrase, intent, weight). Phrases are matched on whole tokens, longest first, so
+# "look up" or "see you" consume their words before "look" / "see" can count.
+# Negative weights are conversational uses of visual words.
+PHRASES = [
+    # Asking Apex to look
+    ("what do you see", VISION, 3), ("what can you see", VISION, 3), ("can you see", VISION, 3),
+    ("do you see", VISION, 3), ("what are you seeing", VISION, 3), ("see me", VISION, 3),
+    ("see this", VISION, 3), ("look at", VISION, 3), ("take a look", VISION, 3), ("have a look", VISION, 3),
+    ("look around", VISION, 3), ("looking at", VISION, 2), ("webcam", VISION, 3), ("camera", VISION, 3),
+    ("take a picture", VISION, 3), ("take a photo", VISION, 3), ("snap", VISION, 0.5), ("selfie", VISION, 3),
+    ("look", VISION, 0.5), ("see", VISION, 0.5), ("describe", VISION, 0.5),
+    # The user, their surroundings and what they show
+    ("in front of me", VISION, 3), ("behind me", VISION, 3), ("next to me", VISION, 3),
+    ("around me", VISION, 2), ("where am i", VISION, 3),
+    ("am i holding", VISION, 3), ("i'm holding", VISION, 3), ("i am holding", VISION, 3),
+    ("in my hand", VISION, 3), ("in my hands", VISION, 3), ("holding up", VISION, 3),
+    ("am i wearing", VISION, 3), ("i'm wearing", VISION, 3), ("i am wearing", VISION, 3),
+    ("holding", VISION, 2), ("wearing", VISION, 2),
+    ("how do i look", VISION, 3), ("do i look", VISION, 3), ("what do i look like", VISION, 3),
+    ("i'm showing", VISION, 3), ("i am showing", VISION, 3), ("am i showing", VISION, 3),
+    ("show you", VISION, 2),
+    ("my face", VISION, 2), ("my shirt", VISION, 2), ("my hair", VISION, 2), ("my outfit", VISION, 2),
+    ("my room", VISION, 2), ("my desk", VISION, 2), ("my screen", VISION, 2), ("my expression", VISION, 2),
+    ("how many fingers", VISION, 3), ("how many people", VISION, 2),
+    ("is there anyone", VISION, 2), ("anyone here", VISION, 2), ("anybody here", VISION, 2),
+    # Deictic questions about an object in view
+    ("what is this", VISION, 3), ("what's this", VISION, 3), ("is this", VISION, 0.5), ("who is this", VISION, 3),
+    ("what is that", VISION, 3), ("what's that", VISION, 3),
+    ("what is this thing", VISION, 3), ("what kind of", VISION, 0.5), ("what brand", VISION, 0.5),
+    ("read this", VISION, 3), ("read that", VISION, 2), ("read it", VISION, 2), ("what does this say", VISION, 3),
+    ("written on", VISION, 2), ("what's written", VISION, 3), ("what is written", VISION, 3),
+    ("i've got here", VISION, 3), ("i have here", VISION, 3), ("got here", VISION, 2),
+    ("what color is my", VISION, 3), ("what color is this", VISION, 3), ("what color", VISION, 0.5),
+    ("identify", VISION, 0.5), ("recognize", VISION, 0.5), ("recognise", VISION, 0.5),
+    ("this picture", VISION, 1), ("this image", VISION, 1),
+
+    # Conversational uses of the same words
+    ("look up", VISION, -3), ("look for", VISION, -2), ("looking for", VISION, -3),
+    ("looking forward", VISION, -3), ("look forward", VISION, -3), ("look into", VISION, -2),
+    ("look like", VISION, -1), ("looks like", VISION, -2), ("look after", VISION, -3),
+    ("see you", VISION, -3), ("i see", VISION, -3), ("let's see", VISION, -2), ("let me see", VISION, -1),
+    ("see if", VISION, -2), ("see what", VISION, -1), ("seen", VISION, -1), ("movie", VISION, -2),
+    ("describe a", VISION, -1),
+    # Asking about a subject rather than about the scene
+    ("history of", VISION, -3), ("works", VISION, -2), ("work", VISION, -2), ("explain", VISION, -1),
+
+    # Follow-ups about something already looked at
+    ("you saw", SCENE, 3), ("you just saw", SCENE, 3), ("did you see", SCENE, 2), ("you described", SCENE, 3),
+    ("you noticed", SCENE, 3), ("you notice", SCENE, 2), ("same color", SCENE, 1), ("what else", SCENE, 1),
+    ("what color was", SCENE, 3), ("what color is it", SCENE, 3), ("what color are they", SCENE, 3),
+    ("is it", SCENE, 1), ("was it", SCENE, 1), ("is that", SCENE, 1), ("are they", SCENE, 1),
+    ("it", SCENE, 0.5), ("they", SCENE, 0.5), ("that one", SCENE, 2), ("the other one", SCENE, 2),
+    ("on the left", SCENE, 2), ("on the right", SCENE, 2), ("in the background", SCENE, 2),
+    ("next to it", SCENE, 2), ("behind it", SCENE, 2), ("what about the", SCENE, 1),
+    ("what does it say", SCENE, 3), ("how big", SCENE, 1), ("how old", SCENE, 0.5),
+    ("still there", SCENE, 2), ("again", SCENE, 1),
+    ("you said", SCENE, 2), ("plugged in", SCENE, 1), ("turned on", SCENE, 1), ("switched on", SCENE, 1),
+]
+
+# Demonstratives point at something in view when the query asks about, reads or matches it:
+# "what fruit is this", "tell me what this is", "does this shirt go with these pants"
+_DEMONSTRATIVES = {"this", "these", "those"}
+_DEICTIC_CUES = {"what", "what's", "which", "who", "who's", "whose", "tell", "read", "written", "say", "says"}
+_DEICTIC_PHRASES = ("go with", "goes with", "match", "matches")
+DEICTIC_WEIGHT = 3
+
+# Past-tense questions that refer back to something ("was it", "were they", "anyone else there")
+_ANAPHORS = {"it", "they", "them", "there", "else"}
+_PAST = {"was", "were"}
+ANAPHORA_WEIGHT = 2
+
+
+def tokenize(text):
+    """Lowercased word tokens with common contractions normalized"""
+    return [_ALIASES.get(token, token) for token in _TOKEN.findall(text.lower())]
+
+
+def compile_phrases(phrases):
+    """Token trie of the phrase table: nested dicts, with the (intent, weight) of a phrase under the None key"""
+    trie = {}
+    for phrase, intent, weight in phrases:
+        node = trie
+        for token in tokenize(phrase):
+            node = node.setdefault(token, {})
+        node[None] = (intent, weight)
+    return trie
+
+
+class IntentRouter:
+    """
+    Decides whether a query needs the webcam.
+
+    Queries are scanned once, left to right, against a precompiled token trie of
+    weighted phrases (leftmost-longest match), and the vision and scene scores are
+    compared with thresholds. A query costs a few microseconds, so it runs inline.
+    """
+
+    def __init__(self, phrases=PHRASES, vision_threshold=VISION_THRESHOLD, scene_threshold=SCENE_THRESHOLD,
+                 vision_margin=VISION_MARGIN):
+        self.trie = compile_phrases(phrases)
+        self.vision_threshold = vision_threshold
+        self.scene_threshold = scene_threshold
+        self.vision_margin = vision_margin
+        self.counts = {TEXT: 0, VISION: 0, SCENE: 0}
+
+    def matches(self, query):
+        """The phrases that matched, as (phrase, intent, weight)"""
+        tokens = tokenize(query)
+        found = []
+        i = 0
+        while i < len(tokens):
+            node = self.trie
+            best = None
+            j = i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if None in node:
+                    best = (j, node[None])
+            if best is None:
+                i += 1
+                continue
+            end, (intent, weight) = best
+            found.append((" ".join(tokens[i:end]), intent, weight))
+            i = end
+        return found + self._rule_matches(tokens)
+
+    def _rule_matches(self, tokens):
+        """Structural cues that no fixed phrase covers, as pseudo-phrases"""
+        found = []
+        words = set(tokens)
+        if words & _DEMONSTRATIVES:
+            joined = f" {' '.join(tokens)} "
+            if words & _DEICTIC_CUES or any(f" {phrase} " in joined for phrase in _DEICTIC_PHRASES):
+                found.append(("<asks about this>", VISION, DEICTIC_WEIGHT))
+        if words & _PAST and words & _ANAPHORS:
+            found.append(("<refers back>", SCENE, ANAPHORA_WEIGHT))
+        return found
+
+    def scores(self, query):
+        """Summed phrase weights per intent"""
+        totals = {VISION: 0.0, SCENE: 0.0}
+        for _, intent, weight in self.matches(query):
+            totals[intent] += weight
+        return totals
+
+    def classify(self, query):
+        """TEXT, VISION or SCENE for a query"""
+        totals = self.scores(query)
+        if totals[VISION] >= self.vision_threshold:
+            intent = VISION
+        elif totals[SCENE] >= self.scene_threshold:
+            intent = SCENE
+        elif totals[VISION] >= self.vision_threshold - self.vision_margin:
+            intent = VISION  # ambiguous, but leaning towards a look
+        else:
+            intent = TEXT
+        self.counts[intent] += 1
+        return intent
+
+    def stats(self):
+        """How many queries went each way"""
+        return dict(self.counts)
+
+
+intent_router = IntentRouter()
+
+
+def classify_intent(query):
+    """Route a query with the shared router"""
+    return intent_router.classify(query)
+
+
+# Keyword rule the router replaced: any of these as a substring sent the frame
+LEGACY_VISION_KEYWORDS = [
+    "look", "see", "image", "photo", "webcam", "camera", "recognize",
+    "analyze", "detect", "what's", "describe", "identify", "show",
+    "appearance", "wearing", "holding", "behind", "front", "color",
+    "text", "read", "sign", "person", "face", "object", "thing", "do i"
+]
+
+
+def legacy_needs_vision(query):
+    return any(keyword in query.lower() for keyword in LEGACY_VISION_KEYWORDS)
+
+
+# Hand-labeled queries the phrase table was tuned on; SCENE ones are follow-ups asked right after a look
+LABELED_QUERIES = [
+    ("What do you see?", VISION),
+    ("Can you see me?", VISION),
+    ("What am I holding?", VISION),
+    ("What's this in my hand?", VISION),
+    ("Take a look at my desk", VISION),
+    ("How do I look today?", VISION),
+    ("What color is my shirt?", VISION),
+    ("Read this label for me", VISION),
+    ("What does this say?", VISION),
+    ("Is there anyone behind me?", VISION),
+    ("Describe my room", VISION),
+    ("What am I wearing?", VISION),
+    ("How many fingers am I holding up?", VISION),
+    ("Who is this?", VISION),
+    ("Look through the webcam and tell me what's going on", VISION),
+    ("What is this thing?", VISION),
+    ("What's in front of me?", VISION),
+    ("Check the camera, is the door open?", VISION),
+    ("Do I look tired?", VISION),
+    ("Can you recognize this plant I'm showing you?", VISION),
+    ("What brand is this bottle?", VISION),
+    ("Where am I right now?", VISION),
+    ("What color was it?", SCENE),
+    ("Is it still there?", SCENE),
+    ("What about the one on the left?", SCENE),
+    ("What did you see in the background?", SCENE),
+    ("What does it say on the side?", SCENE),
+    ("How big is it?", SCENE),
+    ("Is that a laptop next to it?", SCENE),
+    ("What else did you notice?", SCENE),
+    ("Are they the same color?", SCENE),
+    ("What was behind it?", SCENE),
+    ("Hello, who are you?", TEXT),
+    ("Tell me a joke", TEXT),
+    ("What's the capital of France?", TEXT),
+    ("What's the weather like tomorrow?", TEXT),
+    ("Can you look up the latest news on Mars?", TEXT),
+    ("I'm looking for a good pasta recipe", TEXT),
+    ("See you later, Apex", TEXT),
+    ("I see, that makes sense", TEXT),
+    ("Describe the history of the Roman empire", TEXT),
+    ("How do I read a CSV file in Python?", TEXT),
+    ("What's the difference between a list and a tuple?", TEXT),
+    ("Explain how a camera sensor works", TEXT),
+    ("What color is the sky on Mars?", TEXT),
+    ("Recommend a science fiction book", TEXT),
+    ("How does image compression work?", TEXT),
+    ("Let's see, what should I cook tonight?", TEXT),
+    ("What does photosynthesis mean?", TEXT),
+    ("Translate 'good morning' into Spanish", TEXT),
+    ("Who won the world cup in 2018?", TEXT),
+    ("What should I do if I feel stressed?", TEXT),
+    ("Text my brother that I'm running late", TEXT),
+    ("What's 17 times 23?", TEXT),
+    ("I'm looking forward to the weekend", TEXT),
+    ("Give me a fun fact about octopuses", TEXT),
+    ("How do I sign up for a library card?", TEXT),
+    ("Set a timer for ten minutes", TEXT),
+    ("What is a person's normal heart rate?", TEXT),
+    ("Write a short poem about the sea", TEXT),
+]
+
+# Held out: labeled separately and never used to tune PHRASES, so evaluate() also
+# reports how the router does on queries it wasn't fitted to. Don't tune on these.
+HELD_OUT_QUERIES = [
+    ("Can you tell what I've got here?", VISION),
+    ("Is my hair messy?", VISION),
+    ("What's on my screen right now?", VISION),
+    ("Does this shirt go with these pants?", VISION),
+    ("How many people are in the room?", VISION),
+    ("What fruit is this?", VISION),
+    ("Can you read the title of this book?", VISION),
+    ("Have a look at this and tell me what you think", VISION),
+    ("Is the light on behind me?", VISION),
+    ("What does my expression say about my mood?", VISION),
+    ("Which card am I holding?", VISION),
+    ("Can you see the cat?", VISION),
+    ("Tell me what this is", VISION),
+    ("What's written on this mug?", VISION),
+    ("And the one next to it?", SCENE),
+    ("What color were they?", SCENE),
+    ("Is it plugged in?", SCENE),
+    ("What else was on the desk?", SCENE),
+    ("You said it was red, are you sure?", SCENE),
+    ("Was anyone else there?", SCENE),
+    ("What's the best way to learn guitar?", TEXT),
+    ("Look, I just need a quick summary of the news", TEXT),
+    ("Can you help me write an email to my landlord?", TEXT),
+    ("I see what you mean, go on", TEXT),
+    ("What does it mean to be mindful?", TEXT),
+    ("What is the movie Inception about?", TEXT),
+    ("How do speech recognition systems work?", TEXT),
+    ("Tips for taking better photos at night", TEXT),
+    ("Describe the plot of Hamlet", TEXT),
+    ("Who painted the Mona Lisa?", TEXT),
+    ("What time is it in Tokyo?", TEXT),
+    ("Let me know when it's done", TEXT),
+    ("Is it going to rain this weekend?", TEXT),
+    ("How do image generation models work?", TEXT),
+    ("What should I look for in a used car?", TEXT),
+    ("Tell me about the history of the camera", TEXT),
+]
+
+
+def score(labeled, router=None):
+    """
+    Accuracy of the router on one labeled set next to the old keyword rule, and the
+    frame uploads each would cause with a camera frame available.
+
+    Uploads are counted the way ai_agent routes: VISION and SCENE both go down the
+    vision path, which hashes and encodes the frame and uploads it unless the scene
+    is unchanged and the notes answer the question. A query can't tell whether the
+    scene changed, so every non-TEXT route counts as an upload (an upper bound).
+    """
+    router = router or IntentRouter()
+    correct = legacy_correct = 0
+    uploads = legacy_uploads = 0
+    missed = legacy_missed = 0
+    errors = []
+    started = time.perf_counter()
+    predictions = [router.classify(query) for query, _ in labeled]
+    per_query = (time.perf_counter() - started) / len(labeled)
+
+    for (query, expected), predicted in zip(labeled, predictions):
+        legacy = VISION if legacy_needs_vision(query) else TEXT
+        correct += predicted == expected
+        # The old rule had no scene route: sending a follow-up down the vision path was right
+        legacy_correct += legacy == expected or (expected == SCENE and legacy == VISION)
+
+        uploads += predicted != TEXT
+        legacy_uploads += legacy != TEXT
+        missed += predicted == TEXT and expected != TEXT
+        legacy_missed += legacy == TEXT and expected != TEXT
+        if predicted != expected:
+            errors.append((query, expected, predicted))
+
+    return {
+        "queries": len(labeled),
+        "accuracy": correct / len(labeled),
+        "legacy_accuracy": legacy_correct / len(labeled),
+        "uploads": uploads,
+        "legacy_uploads": legacy_uploads,
+        "missed_looks": missed,
+        "legacy_missed_looks": legacy_missed,
+        "classify_us": per_query * 1e6,
+        "errors": errors,
+    }
+
+
+def evaluate(labeled=LABELED_QUERIES, held_out=HELD_OUT_QUERIES, upload_bytes=None, frame_path=None):
+    """
+    Score the router on the set its phrases were tuned on and on the held-out set
+    (see score()). Pass frame_path to measure the upload size on a real frame
+    (needs numpy and Pillow), otherwise TYPICAL_UPLOAD_BYTES is used.
+    """
+    if frame_path:
+        import numpy as np
+        from PIL import Image
+        from vision import encode_frame
+
+        upload_bytes = len(encode_frame(np.asarray(Image.open(frame_path).convert("RGB")))["data"])
+    upload_bytes = upload_bytes or TYPICAL_UPLOAD_BYTES
+
+    report = {"upload_bytes": upload_bytes}
+    for name, queries in (("tuning", labeled), ("held_out", held_out)):
+        if not queries:
+            continue
+        result = report[name] = score(queries)
+        result["bytes_saved"] = (result["legacy_uploads"] - result["uploads"]) * upload_bytes
+
+        label = "tuning set" if name == "tuning" else "held-out set"
+        print(f"🧭 Intent router, {label}: {result['accuracy']:.0%} accurate vs {result['legacy_accuracy']:.0%} "
+              f"for the keyword rule ({result['queries']} queries, {result['classify_us']:.1f} µs per query)")
+        print(f"📦 Frame uploads at most {result['uploads']} vs {result['legacy_uploads']} -> "
+              f"{result['bytes_saved'] / 1024:.0f} KB saved at {upload_bytes / 1024:.0f} KB per frame; "
+              f"missed looks {result['missed_looks']} vs {result['legacy_missed_looks']}")
+        for query, expected, predicted in result["errors"]:
+            print(f"   ✗ {query!r}: expected {expected}, got {predicted}")
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and not sys.argv[1].endswith((".jpg", ".jpeg", ".png")):
+        query = " ".join(sys.argv[1:])
+        print(f"{classify_intent(query)}: {intent_router.matches(query)}")
+    else:
+        evaluate(frame_path=sys.argv[1] if len(sys.argv) > 1 else None)
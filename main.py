@@ -1,182 +1,360 @@
+import startup  # First, so the startup breakdown covers every import below
 from dotenv import load_dotenv
+import logging
 import os
-from text_to_speech import stop_all_audio  # Add this import at the top
-from text_to_speech import speak_text_with_control
+import time
+from contextlib import aclosing
 
 # Force load environment variables first
 load_dotenv()
 
-import gradio as gr
-import cv2
-import numpy as np
-from PIL import Image
-import google.generativeai as genai
-from threading import Thread
-import time
-import tempfile
+with startup.phase("import gradio"):
+    import gradio as gr
+
+# Import your custom modules (camera, microphone and audio devices are opened lazily)
+with startup.phase("import gemini agent"):
+    from ai_agent import ask_apex_stream, conversations, scene_cache
+    from clients import configure_genai, warm_up as warm_up_clients
+
+with startup.phase("import audio pipeline"):
+    from text_to_speech import stop_session_audio, speak_text_with_control
+    from async_core import run_blocking, iterate_blocking, record_audio_bytes_async, transcribe_audio_async, speak_text_stream_live
+    from async_core import submit_blocking
+    from async_core import record_and_transcribe_streaming_async
+    from text_to_speech import speak_text, speak_text_stream
+    from playback import playback_engine
+    import speech_to_txt
+    from wake_word import WakeWordListener
+
+from metrics import observe, format_timing, start_metrics_server
+from tracing import span, traced
+from session_state import sessions  # Per-session frames, history and in-flight request
+from chat_history import user_turn, apex_turn, system_turn
+from scheduler import scheduler, request_key
+from response_cache import response_cache
 
-# Import your custom modules
-from ai_agent import ask_apex
-from speech_to_txt import record_audio, transcribe_with_groq
-from text_to_speech import speak_text
+logger = logging.getLogger(__name__)
 
-# Configure Google AI with your variable name
+# Drop a session's Gemini chat and cached scene together with the rest of its state
+sessions.on_evict(conversations.reset)
+sessions.on_evict(scene_cache.reset)
+
+# Configure Google AI with your variable name (no-op if ai_agent already did)
 def configure_google_ai():
-    google_key = os.getenv("GEMINI_API_KEY")  # Using your variable name
-    if google_key:
-        genai.configure(api_key=google_key)
-        return True
-    return False
+    return configure_genai()
 
 configure_google_ai()
 
-# Global variables
-latest_frame = None
-is_listening = False
-chat_history = []
+# The chat shows only this many of the newest messages; older ones are paged in from the history store
+CHAT_WINDOW = int(os.getenv("APEX_CHAT_WINDOW", "40"))
 
-def capture_frame(frame):
-    """Capture and store the current webcam frame"""
-    global latest_frame
-    if frame is not None:
-        latest_frame = frame
-        print("📸 Frame captured successfully")
-    return None
+GREETING = "Hello! I'm Apex, your AI assistant with clean voice responses. I can see through the webcam and respond to your voice commands. How can I help you today?"
+READY_MESSAGE = "Ready for a new conversation!"
 
-def process_voice_command():
-    """Process voice input and generate AI response"""
-    global is_listening, chat_history, latest_frame
-    
-    if is_listening:
-        return "🎤 Already listening...", "\n\n".join(chat_history)
+def render_history(session):
+    """The newest messages of a session's chat, so each update stays the same size however long the chat runs"""
+    return session.history.tail(CHAT_WINDOW) or [apex_turn(READY_MESSAGE)]
+
+def history_page(session, number):
+    """One page of a session's full transcript (0 is the newest), read back from disk as needed"""
+    messages, pages = session.history.page(number)
+    number = min(max(0, number), pages - 1)
+    return messages, number, f"Page {pages - number} of {pages} ({len(session.history)} messages)"
+
+def show_latest_page(request: gr.Request):
+    return history_page(sessions.get(request.session_hash), 0)
+
+def show_older_page(number, request: gr.Request):
+    return history_page(sessions.get(request.session_hash), number + 1)
+
+def show_newer_page(number, request: gr.Request):
+    return history_page(sessions.get(request.session_hash), number - 1)
+
+# Status shown by a request that was cancelled, by cancel reason
+CANCELLED_STATUS = {
+    "superseded": "⏭️ Skipped - a newer request took over",
+    "cleared": "🗑️ Cancelled - chat cleared",
+}
+
+def cancelled_reply(session):
+    """on_cancel callback for the scheduler: what a cancelled UI request shows"""
+    def on_cancel(token):
+        logger.info(f"🛑 Request cancelled ({token.reason})")
+        return CANCELLED_STATUS.get(token.reason, "🛑 Cancelled"), render_history(session)
+    return on_cancel
+
+# Streaming pipeline: speak sentence N while Gemini is still generating sentence N+1
+STREAMING_PIPELINE = os.getenv("APEX_STREAMING_PIPELINE", "1") == "1"
+
+# Upload format for voice commands: "wav" (raw PCM, no encoder) or "flac" (smaller upload)
+AUDIO_UPLOAD_FORMAT = os.getenv("APEX_AUDIO_UPLOAD_FORMAT", "wav")
+
+# Voice activity detection cuts the utterance and transcribes it in chunks while the user talks
+VAD_CAPTURE = os.getenv("APEX_VAD_CAPTURE", "1") == "1"
+
+# Always-on listener: say "Apex" followed by the command instead of pressing the button.
+# Off by default; it needs recordings of the wake word first (python wake_word.py enroll)
+WAKE_WORD = os.getenv("APEX_WAKE_WORD", "0") == "1"
+
+# How many Gradio events may run at once; blocking work is bounded separately in async_core
+CONCURRENCY_LIMIT = int(os.getenv("APEX_CONCURRENCY_LIMIT", "16"))
+
+def first_audio_recorder(started_at, mode):
+    """Build a callback that records time-to-first-audio for the given pipeline mode"""
+    def on_first_audio():
+        elapsed = time.perf_counter() - started_at
+        observe(f"time_to_first_audio.{mode}", elapsed)
+        logger.info(f"⏱️ First audio ({mode}) after {elapsed:.2f}s")
+    return on_first_audio
+
+def first_token_recorder(started_at, mode):
+    """Build a callback that records time-to-first-token (the model's, not a canned prefix) for the given mode"""
+    def on_first_token():
+        elapsed = time.perf_counter() - started_at
+        observe(f"time_to_first_token.{mode}", elapsed)
+        logger.info(f"⏱️ First token ({mode}) after {elapsed:.2f}s")
+    return on_first_token
+
+def pipeline_report():
+    """Time to first token and first audio next to the full response time, and the streaming pipeline against the serial path"""
+    mode = "streaming" if STREAMING_PIPELINE else "serial"
+    return " | ".join([
+        format_timing(f"time_to_first_token.{mode}", "⏱️ First token"),
+        format_timing(f"response_time.{mode}", "Full answer"),
+    ]) + "\n" + " | ".join([
+        format_timing("time_to_first_audio.streaming", "🔊 Streaming first audio"),
+        format_timing("time_to_first_audio.serial", "Serial first audio"),
+    ])
+
+async def respond_and_speak(user_text, frame, started_at, session_id=None):
+    """
+    Yield Apex's reply chunk by chunk as Gemini generates it, and speak it: sentence
+    by sentence while it streams in the streaming pipeline, once complete otherwise.
+    """
+    mode = "streaming" if STREAMING_PIPELINE else "serial"
+    chunks = ask_apex_stream(user_text, frame, session_id, on_first_token=first_token_recorder(started_at, mode))
     
-    is_listening = True
+    if STREAMING_PIPELINE:
+        async for chunk in speak_text_stream_live(chunks, on_first_audio=first_audio_recorder(started_at, mode)):
+            yield chunk
+    else:
+        answer = []
+        async for chunk in iterate_blocking(chunks):
+            answer.append(chunk)
+            yield chunk
+        # Stops earlier audio and waits on the playback engine, so keep it off the event loop
+        await run_blocking(speak_text_with_control, "".join(answer), on_start=first_audio_recorder(started_at, mode))
     
+    observe(f"response_time.{mode}", time.perf_counter() - started_at)
+
+def handle_wake_command(user_text):
+    """Hand a command heard after the wake word to a worker, so the listener goes straight back to the microphone"""
+    submit_blocking(answer_wake_command, user_text)
+
+@traced("wake_command")
+def answer_wake_command(user_text):
+    """Answer a command heard after the wake word, using the most recently active session"""
+    session = sessions.most_recent() or sessions.get(None)
+    # Supersedes whatever the session was doing; the same command heard twice is answered once
+    scheduler.run_sync(
+        session, "wake word", request_key("wake", user_text),
+        lambda token: _wake_command(session, user_text, token),
+        lambda token: logger.info(f"🛑 Wake word command cancelled ({token.reason})")
+    )
+
+def _wake_command(session, user_text, token):
+    """Speak the answer to a wake word command and record it"""
     try:
-        print("\n=== VOICE COMMAND PROCESSING START ===")
-        
-        # Step 1: Record audio
-        audio_file = os.path.join(tempfile.gettempdir(), "apex_voice_recording.mp3")
-        print(f"📁 Recording to: {audio_file}")
-        
-        recording_success = record_audio(audio_file, timeout=15, phrase_time_limit=10)
-        
-        if not recording_success:
-            is_listening = False
-            error_msg = "❌ Recording failed - please try again"
-            chat_history.append(f"**System:** {error_msg}")
-            return error_msg, "\n\n".join(chat_history)
+        logger.info(f"📝 Wake word command: '{user_text}'")
+        started_at = time.perf_counter()
+        chunks = ask_apex_stream(
+            user_text, session.latest_frame, session.session_id,
+            on_first_token=first_token_recorder(started_at, "wake_word")
+        )
+        ai_response = speak_text_stream(chunks, on_first_audio=first_audio_recorder(started_at, "wake_word"))
+        observe("response_time.wake_word", time.perf_counter() - started_at)
+        sessions.append_history(session, user_turn(user_text), apex_turn(ai_response), token=token)
+    except Exception as e:
+        logger.error(f"❌ Wake word command failed: {e}")
+
+def capture_frame(frame, request: gr.Request):
+    """Capture and store the current webcam frame for this session"""
+    if frame is not None:
+        session = sessions.get(request.session_hash)
+        sessions.set_frame(session, frame)
+        logger.debug("📸 Frame captured successfully")
+    return None
+
+@traced("voice_command")
+async def process_voice_command(request: gr.Request):
+    """Process voice input and stream the AI response to the status and chat as it is generated"""
+    session = sessions.get(request.session_hash)
+    # A second click while listening joins the running command instead of opening the mic twice
+    updates = scheduler.stream(
+        session, "voice", request_key("voice"),
+        lambda token: _voice_command(session, token), cancelled_reply(session)
+    )
+    # Closed explicitly so a request the browser walked away from is cancelled right away
+    async with aclosing(updates):
+        async for update in updates:
+            yield update
+
+async def _voice_command(session, token):
+    """Record, transcribe, answer and speak one voice command, yielding (status, chat) updates"""
+    try:
+        logger.debug("=== VOICE COMMAND PROCESSING START ===")
+        yield "🎤 Listening...", render_history(session)
         
-        print("✅ Recording completed successfully")
+        if VAD_CAPTURE:
+            # Steps 1+2: VAD-cut recording, transcribed in overlapping chunks while the user speaks
+            speech_ended = []
+            try:
+                # Transcription of each chunk shows up as a child span of the recording
+                with span("record", vad=True):
+                    user_text = await record_and_transcribe_streaming_async(
+                        timeout=15, phrase_time_limit=10,
+                        on_speech_end=lambda: speech_ended.append(time.perf_counter())
+                    )
+                logger.info(f"📝 Transcribed text: '{user_text}'")
+            except Exception as capture_error:
+                error_msg = f"❌ Recording or transcription failed: {str(capture_error)}"
+                sessions.append_history(session, system_turn(error_msg), token=token)
+                logger.error(f"❌ Capture error: {capture_error}")
+                yield error_msg, render_history(session)
+                return
+            started_at = speech_ended[0] if speech_ended else time.perf_counter()
         
-        # Step 2: Transcribe speech
-        print("🔄 Starting transcription...")
-        try:
-            user_text = transcribe_with_groq(audio_file)
-            print(f"📝 Transcribed text: '{user_text}'")
-        except Exception as transcription_error:
-            is_listening = False
-            error_msg = f"❌ Transcription failed: {str(transcription_error)}"
-            chat_history.append(f"**System:** {error_msg}")
-            print(f"❌ Transcription error: {transcription_error}")
-            return error_msg, "\n\n".join(chat_history)
+        else:
+            # Step 1: Record audio straight into memory (16 kHz mono WAV, no MP3 / temp file)
+            with span("record", vad=False):
+                audio = await record_audio_bytes_async(timeout=15, phrase_time_limit=10, audio_format=AUDIO_UPLOAD_FORMAT)
+            
+            if audio is None:
+                error_msg = "❌ Recording failed - please try again"
+                sessions.append_history(session, system_turn(error_msg), token=token)
+                yield error_msg, render_history(session)
+                return
+            
+            logger.debug("✅ Recording completed successfully")
+            started_at = time.perf_counter()
+            
+            # Step 2: Transcribe speech
+            logger.debug("🔄 Starting transcription...")
+            yield "🔄 Transcribing...", render_history(session)
+            try:
+                user_text = await transcribe_audio_async(audio)
+                logger.info(f"📝 Transcribed text: '{user_text}'")
+            except Exception as transcription_error:
+                error_msg = f"❌ Transcription failed: {str(transcription_error)}"
+                sessions.append_history(session, system_turn(error_msg), token=token)
+                logger.error(f"❌ Transcription error: {transcription_error}")
+                yield error_msg, render_history(session)
+                return
         
         if not user_text or not user_text.strip():
-            is_listening = False
             error_msg = "❌ No speech detected in recording"
-            chat_history.append(f"**System:** {error_msg}")
-            return error_msg, "\n\n".join(chat_history)
+            sessions.append_history(session, system_turn(error_msg), token=token)
+            yield error_msg, render_history(session)
+            return
         
-        # Step 3: Get AI response
-        print("🤖 Processing with AI...")
+        # Step 3: Get AI response, shown and spoken as it streams in
+        logger.debug("🤖 Processing with AI...")
+        chat = render_history(session) + [user_turn(user_text)]
+        yield f"📝 Heard: {user_text}", chat
         try:
-            if latest_frame is not None:
-                print("📸 Using current webcam frame for vision analysis")
-                ai_response = ask_apex(user_text, latest_frame)
+            frame = session.latest_frame
+            if frame is not None:
+                logger.debug("📸 Using current webcam frame for vision analysis")
             else:
-                print("⚠️ No webcam frame available, processing without vision")
-                ai_response = ask_apex(user_text)
+                logger.debug("⚠️ No webcam frame available, processing without vision")
+            
+            ai_response = ""
+            async for chunk in respond_and_speak(user_text, frame, started_at, session.session_id):
+                ai_response += chunk
+                # Later updates only append to the same list, so Gradio sends just the new text
+                yield f"💬 {ai_response}", chat + [apex_turn(ai_response)]
                 
-            print(f"🤖 AI Response generated: {ai_response[:100]}...")
+            logger.info(f"🤖 AI Response generated: {ai_response[:100]}...")
             
         except Exception as ai_error:
-            is_listening = False
             error_msg = f"❌ AI processing failed: {str(ai_error)}"
-            chat_history.append(f"**System:** {error_msg}")
-            print(f"❌ AI error: {ai_error}")
-            return error_msg, "\n\n".join(chat_history)
+            sessions.append_history(session, system_turn(error_msg), token=token)
+            logger.error(f"❌ AI error: {ai_error}")
+            yield error_msg, render_history(session)
+            return
         
-        # Step 4: Update chat history
-        chat_history.append(f"**You:** {user_text}")
-        chat_history.append(f"**Apex:** {ai_response}")
+        # Step 4: Update chat history (skipped if the command was cancelled meanwhile)
+        sessions.append_history(session, user_turn(user_text), apex_turn(ai_response), token=token)
         
-        # Step 5: Generate speech response (FIXED - using speak_text_with_control)
-        print("🔊 Starting text-to-speech with emoji cleaning...")
-        try:
-            speak_text_with_control(ai_response)
-            print("✅ TTS with emoji cleaning initiated successfully")
-        except Exception as tts_error:
-            print(f"⚠️ TTS failed but continuing: {tts_error}")
+        success_msg = f"✅ Processed: {user_text}\n{pipeline_report()}\n{response_cache.format_stats()}\n{sessions.format_stats()}"
+        logger.debug("=== VOICE COMMAND PROCESSING COMPLETE ===")
         
-        # Step 6: Cleanup
-        try:
-            if os.path.exists(audio_file):
-                os.remove(audio_file)
-                print("🗑️ Temporary audio file cleaned up")
-        except:
-            pass
-        
-        is_listening = False
-        success_msg = f"✅ Processed: {user_text}"
-        print("=== VOICE COMMAND PROCESSING COMPLETE ===\n")
-        
-        return success_msg, "\n\n".join(chat_history)
+        yield success_msg, chat + [apex_turn(ai_response)]
         
     except Exception as e:
-        is_listening = False
         error_msg = f"❌ Voice processing failed: {str(e)}"
-        chat_history.append(f"**System:** {error_msg}")
-        print(f"❌ Critical error in voice processing: {e}")
-        print("=== VOICE COMMAND PROCESSING FAILED ===\n")
-        return error_msg, "\n\n".join(chat_history)
-
-def analyze_current_frame(question):
-    """Analyze the current webcam frame with a question"""
-    global latest_frame, chat_history
+        sessions.append_history(session, system_turn(error_msg), token=token)
+        logger.error(f"❌ Critical error in voice processing: {e}")
+        yield error_msg, render_history(session)
+
+@traced("frame_question")
+async def analyze_current_frame(question, request: gr.Request):
+    """Analyze the current webcam frame with a question, streaming the answer as it is generated"""
+    session = sessions.get(request.session_hash)
     
-    if latest_frame is None:
-        return "❌ Please show something to the camera first.", "\n\n".join(chat_history)
+    if session.frames is None:
+        yield "❌ Please show something to the camera first.", render_history(session)
+        return
     
+    # Send and Enter both fire for one question: identical questions are merged, a new one supersedes
+    updates = scheduler.stream(
+        session, "text", request_key("frame", question),
+        lambda token: _frame_question(session, question, token), cancelled_reply(session)
+    )
+    async with aclosing(updates):
+        async for update in updates:
+            yield update
+
+async def _frame_question(session, question, token):
+    """Answer and speak a typed question about the current frame, yielding (status, chat) updates"""
     try:
-        print(f"🔍 Analyzing frame for: {question}")
-        
-        ai_response = ask_apex(question, latest_frame)
+        logger.info(f"🔍 Analyzing frame for: {question}")
+        started_at = time.perf_counter()
+        chat = render_history(session) + [user_turn(question)]
+        yield "🔍 Looking...", chat
         
-        chat_history.append(f"**You:** {question}")
-        chat_history.append(f"**Apex:** {ai_response}")
+        ai_response = ""
+        async for chunk in respond_and_speak(question, session.latest_frame, started_at, session.session_id):
+            ai_response += chunk
+            yield ai_response, chat + [apex_turn(ai_response)]
         
-        # FIXED - using speak_text_with_control with emoji cleaning
-        speak_text_with_control(ai_response)
+        sessions.append_history(session, user_turn(question), apex_turn(ai_response), token=token)
         
-        return ai_response, "\n\n".join(chat_history)
+        yield f"{ai_response}\n{pipeline_report()}\n{response_cache.format_stats()}", chat + [apex_turn(ai_response)]
         
     except Exception as e:
         error_msg = f"❌ Analysis failed: {str(e)}"
-        chat_history.append(f"**System:** {error_msg}")
-        print(f"❌ Analysis error: {e}")
-        return error_msg, "\n\n".join(chat_history)
+        sessions.append_history(session, system_turn(error_msg), token=token)
+        logger.error(f"❌ Analysis error: {e}")
+        yield error_msg, render_history(session)
 
-def clear_chat():
-    """Clear the chat history and stop any playing audio"""
-    global chat_history
+def clear_chat(request: gr.Request):
+    """Cancel the running request, clear the chat history and stop any playing audio"""
+    session = sessions.get(request.session_hash)
+    
+    # Cancel in-flight work first so the reply being generated is never added to the cleared history
+    scheduler.cancel(session.session_id, "cleared")
     
-    # Stop all audio first
-    stop_all_audio()
+    # Stop this session's audio; other sessions keep playing
+    stop_session_audio(session.session_id)
     
-    # Clear chat history
-    chat_history = []
+    # Clear chat history (both the transcript and the model-side conversation)
+    sessions.clear_history(session)
+    conversations.reset(session.session_id)
     
-    return "✅ Chat cleared & audio stopped", "**Apex:** Ready for a new conversation!"
+    stop_latency = playback_engine.stats()["stop_latency_ms"]
+    stopped = f" in {stop_latency:.0f} ms" if stop_latency is not None else ""
+    return f"✅ Chat cleared & audio stopped{stopped}", render_history(session)
 
 def test_system_components():
     """Test all system components individually"""
@@ -196,6 +374,7 @@ def test_system_components():
     # Test Camera
     print("2. Testing Camera...")
     try:
+        import cv2
         cap = cv2.VideoCapture(0)
         if cap.isOpened():
             ret, _ = cap.read()
@@ -230,7 +409,18 @@ def test_system_components():
     
     print("=" * 40)
 
+# Self-test at launch: "background" (default) runs it next to the server, "sync" before it, "off" skips it
+STARTUP_SELF_TEST = os.getenv("APEX_STARTUP_SELF_TEST", "background")
+
+def warm_up():
+    """Check devices and keys, and open the audio mixer before the first reply needs it"""
+    test_system_components()
+    playback_engine.start()
+    warm_up_clients()
+    speech_to_txt.stt_router.warm_up()  # looked up here: the benchmark swaps in its own router
+
 # Enhanced Gradio Interface with Apex Branding
+ui_started = time.perf_counter()
 with gr.Blocks(
     title="Apex AI Assistant",
     theme=gr.themes.Soft(),
@@ -285,14 +475,21 @@ with gr.Blocks(
         with gr.Column(scale=1):
             gr.Markdown("### 💬 **Chat with Apex**")
             
-            chat_display = gr.Textbox(
+            chat_display = gr.Chatbot(
                 label="Conversation History",
-                lines=15,
-                max_lines=20,
-                value="**Apex:** Hello! I'm Apex, your AI assistant with clean voice responses. I can see through the webcam and respond to your voice commands. How can I help you today?",
-                interactive=False
+                type="messages",
+                height=420,
+                value=[apex_turn(GREETING)]
             )
             
+            with gr.Accordion("📜 Earlier messages", open=False) as history_accordion:
+                history_view = gr.Chatbot(label="Full transcript", type="messages", height=300)
+                history_page_number = gr.State(0)
+                with gr.Row():
+                    older_btn = gr.Button("◀ Older", size="sm")
+                    history_label = gr.Markdown()
+                    newer_btn = gr.Button("Newer ▶", size="sm")
+            
             with gr.Row():
                 text_input = gr.Textbox(
                     label="Type your question",
@@ -337,10 +534,33 @@ with gr.Blocks(
         fn=clear_chat,
         outputs=[status_display, chat_display]
     )
+    
+    history_accordion.expand(
+        fn=show_latest_page,
+        outputs=[history_view, history_page_number, history_label]
+    )
+    
+    older_btn.click(
+        fn=show_older_page,
+        inputs=history_page_number,
+        outputs=[history_view, history_page_number, history_label]
+    )
+    
+    newer_btn.click(
+        fn=show_newer_page,
+        inputs=history_page_number,
+        outputs=[history_view, history_page_number, history_label]
+    )
+
+startup.record_phase("build ui", ui_started)
 
 if __name__ == "__main__":
-    # Run system test first
-    test_system_components()
+    # Device checks no longer hold up the launch unless asked to
+    if STARTUP_SELF_TEST == "sync":
+        with startup.phase("self test"):
+            warm_up()
+    elif STARTUP_SELF_TEST != "off":
+        startup.run_in_background("warm up", warm_up)
     
     print("\n🚀 Starting Apex AI Assistant...")
     print("✅ Webcam integration: Ready")
@@ -350,9 +570,18 @@ if __name__ == "__main__":
     print("✅ Chat history: Ready")
     print("\n🌐 Launching web interface...")
     
-    demo.launch(
-        server_name="0.0.0.0",
-        server_port=7860,
-        share=False,
-        show_error=True
-    )
+    if WAKE_WORD:
+        WakeWordListener(handle_wake_command).start()
+    
+    with startup.phase("launch"):
+        demo.queue(default_concurrency_limit=CONCURRENCY_LIMIT)
+        demo.launch(
+            server_name="0.0.0.0",
+            server_port=7860,
+            share=False,
+            show_error=True,
+            prevent_thread_lock=True
+        )
+    print(startup.report())
+    start_metrics_server()
+    demo.block_thread()
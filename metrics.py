@@ -0,0 +1,251 @@
+import bisect
+import logging
+import math
+import os
+import re
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Simple in-process timing store shared by the pipeline stages
+_metrics_lock = threading.Lock()
+_timings = {}
+_histograms = {}
+# Counts and sizes, kept apart from the latency store
+_counters = {}
+_gauges = {}
+
+# Only the most recent samples are kept per metric, so hot metrics don't grow without bound
+MAX_SAMPLES = 1000
+
+# Local Prometheus scrape endpoint (port 0 turns it off)
+METRICS_PORT = int(os.getenv("APEX_METRICS_PORT", "9464"))
+METRICS_HOST = os.getenv("APEX_METRICS_HOST", "127.0.0.1")
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def record_timing(name, seconds):
+    """Record one timing sample (in seconds) under the given metric name"""
+    with _metrics_lock:
+        samples = _timings.get(name)
+        if samples is None:
+            samples = _timings[name] = deque(maxlen=MAX_SAMPLES)
+        samples.append(seconds)
+
+
+def timing_summary(name):
+    """Return count, average and last sample for a timing metric"""
+    with _metrics_lock:
+        samples = list(_timings.get(name, []))
+
+    if not samples:
+        return {"count": 0, "avg": None, "last": None}
+
+    return {
+        "count": len(samples),
+        "avg": sum(samples) / len(samples),
+        "last": samples[-1],
+    }
+
+
+def format_timing(name, label=None):
+    """Human readable one-liner for a timing metric"""
+    summary = timing_summary(name)
+    label = label or name
+    if summary["count"] == 0:
+        return f"{label}: n/a"
+    return f"{label}: {summary['avg']:.2f}s avg (last {summary['last']:.2f}s, n={summary['count']})"
+
+
+class Histogram:
+    """Cumulative fixed-bucket histogram (counts never reset, memory stays constant)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None when empty)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+def observe(name, seconds, buckets=LATENCY_BUCKETS):
+    """Add a sample to the named histogram (and to the timing store)"""
+    with _metrics_lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram(buckets)
+        histogram.observe(seconds)
+    record_timing(name, seconds)
+
+
+def increment(name, amount=1):
+    """Add to a counter: a running total of something that isn't a latency (tokens, bytes, events)"""
+    with _metrics_lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def set_gauge(name, value):
+    """Set a gauge to the current value of a level (queue depth, cache size)"""
+    with _metrics_lock:
+        _gauges[name] = value
+
+
+def counter_value(name):
+    """Current total of a counter (0 if never incremented)"""
+    with _metrics_lock:
+        return _counters.get(name, 0)
+
+
+def gauge_value(name):
+    """Last value a gauge was set to (None if never set)"""
+    with _metrics_lock:
+        return _gauges.get(name)
+
+
+def counter_names(prefix=""):
+    """Names of the counters recorded so far, optionally filtered by prefix"""
+    with _metrics_lock:
+        return sorted(name for name in _counters if name.startswith(prefix))
+
+
+def histogram_summary(name):
+    """Count, mean, approximate p50/p95/p99 and bucket counts of a histogram"""
+    with _metrics_lock:
+        histogram = _histograms.get(name)
+        if histogram is None or not histogram.count:
+            return {"count": 0, "avg": None, "p50": None, "p95": None, "p99": None, "buckets": {}}
+        return {
+            "count": histogram.count,
+            "avg": histogram.sum / histogram.count,
+            "p50": histogram.quantile(0.50),
+            "p95": histogram.quantile(0.95),
+            "p99": histogram.quantile(0.99),
+            "buckets": dict(zip([str(b) for b in histogram.buckets] + ["+Inf"], histogram.counts)),
+        }
+
+
+def histogram_names(prefix=""):
+    """Names of the histograms recorded so far, optionally filtered by prefix"""
+    with _metrics_lock:
+        return sorted(name for name in _histograms if name.startswith(prefix))
+
+
+def timing_names(prefix=""):
+    """Names of the timing metrics recorded so far, optionally filtered by prefix"""
+    with _metrics_lock:
+        return sorted(name for name in _timings if name.startswith(prefix))
+
+
+def timing_percentiles(name, quantiles=(0.50, 0.95, 0.99)):
+    """Nearest-rank percentiles over the retained samples of a timing metric ({} when empty)"""
+    with _metrics_lock:
+        samples = sorted(_timings.get(name, []))
+    if not samples:
+        return {}
+    return {q: samples[max(0, math.ceil(q * len(samples)) - 1)] for q in quantiles}
+
+
+def reset():
+    """Drop every timing sample, histogram, counter and gauge (e.g. between benchmark runs)"""
+    with _metrics_lock:
+        _timings.clear()
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+
+
+def prometheus_text():
+    """
+    All histograms, counters and gauges in the Prometheus text format. A metric name's
+    first dotted part is the family and the rest its `name` label: span.llm ->
+    apex_span_seconds{name="llm"}, conversation.prompt_tokens_saved ->
+    apex_conversation_total{name="prompt_tokens_saved"}.
+    """
+    with _metrics_lock:
+        snapshot = {
+            name: (histogram.buckets, list(histogram.counts), histogram.count, histogram.sum)
+            for name, histogram in _histograms.items()
+        }
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+
+    lines = []
+    for family, members in _families(snapshot).items():
+        metric = "apex_" + family + "_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for label, (buckets, counts, count, total) in members:
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f'{metric}_bucket{{name="{label}",le="{le}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{name="{label}"}} {total}')
+            lines.append(f'{metric}_count{{name="{label}"}} {count}')
+    for values, suffix, kind in ((counters, "_total", "counter"), (gauges, "", "gauge")):
+        for family, members in _families(values).items():
+            metric = "apex_" + family + suffix
+            lines.append(f"# TYPE {metric} {kind}")
+            for label, value in members:
+                lines.append(f'{metric}{{name="{label}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def _families(values):
+    """Group metrics by family (sanitized first dotted part) as (escaped label, value) pairs"""
+    families = {}
+    for name in sorted(values):
+        family, _, label = name.partition(".")
+        label = (label or family).replace("\\", "\\\\").replace('"', '\\"')
+        families.setdefault(re.sub(r"[^a-zA-Z0-9_]", "_", family), []).append((label, values[name]))
+    return families
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve prometheus_text() on http://host:port/metrics from a daemon thread; None if disabled or the port is taken"""
+    if not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would drown the console
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logger.warning(f"⚠️ Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="apex-metrics", daemon=True).start()
+    logger.info(f"📈 Prometheus metrics on http://{host}:{port}/metrics")
+    return server
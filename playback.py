@@ -0,0 +1,372 @@
+import contextvars
+import itertools
+import logging
+import queue
+import threading
+import time
+from io import BytesIO
+
+import numpy as np
+
+from metrics import record_timing, set_gauge, timing_summary
+from scheduler import current_token
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Utterance priorities (lower plays first)
+PRIORITY_ALERT = 0    # errors and system notices
+PRIORITY_NORMAL = 10  # assistant replies
+
+# How long the engine sleeps between checks while audio plays; stop() wakes it immediately
+TICK_SECONDS = 0.005
+# PCM is converted and queued on the mixer channel in pieces of this length
+PCM_BLOCK_MS = 100
+
+
+def pcm_to_sound(data, sample_rate):
+    """16-bit mono PCM at sample_rate as a pygame Sound in the mixer's own format"""
+    import pygame
+    mixer_rate, _, mixer_channels = pygame.mixer.get_init()
+    samples = np.frombuffer(data, dtype=np.int16)
+    if sample_rate != mixer_rate and len(samples) > 1:
+        n = int(len(samples) * mixer_rate / sample_rate)
+        samples = np.interp(np.linspace(0, len(samples) - 1, n), np.arange(len(samples)), samples).astype(np.int16)
+    if mixer_channels > 1:
+        samples = np.repeat(samples[:, None], mixer_channels, axis=1)
+    return pygame.mixer.Sound(buffer=np.ascontiguousarray(samples).tobytes())
+
+
+class Utterance:
+    """
+    One piece of audio waiting for the engine. `chunks` is a queue of byte chunks
+    ending with None (see text_to_speech.synthesize_stream), so playback can start
+    before synthesis has finished. `done` is set once it played, failed or was dropped.
+    It stops early when the request that queued it is cancelled, or when its
+    session's audio is stopped.
+    """
+
+    def __init__(self, chunks, audio_format="mp3", sample_rate=None, on_start=None, generation=0):
+        self.chunks = chunks
+        self.audio_format = audio_format
+        self.sample_rate = sample_rate
+        self.on_start = on_start
+        self.generation = generation
+        self.played = False
+        self.done = threading.Event()
+        # Trace of the request that queued it, so its playback span lands in the same trace
+        self.context = contextvars.copy_context()
+        self.token = current_token()
+        self.session_id = self.token.session_id if self.token is not None else None
+        self.queued_at = time.perf_counter()
+        self._stopped = False
+
+    @property
+    def cancelled(self):
+        return self._stopped or (self.token is not None and self.token.cancelled)
+
+    def stop(self):
+        """Cut this utterance only; the engine notices within a tick"""
+        self._stopped = True
+
+    def started(self):
+        if self.on_start is not None:
+            self.on_start()
+            self.on_start = None
+
+    def finish(self, played):
+        self.played = played
+        self.chunks = None  # Release the audio as soon as it is no longer needed
+        self.done.set()
+
+    def wait(self, timeout=None):
+        """Block until the utterance finished; True if it actually played to the end"""
+        self.done.wait(timeout)
+        return self.played
+
+
+class PlaybackEngine:
+    """
+    The one thread that owns pygame.mixer.
+
+    Utterances are played from a priority queue in (priority, arrival) order,
+    straight from memory. stop() wakes the thread through an Event, so barge-in
+    takes milliseconds rather than a polling interval, and drops everything that
+    was queued before it. Queue depth and stop latency are recorded.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self.init_error = None  # why the mixer couldn't be opened; audio stays off after that
+        self.played = 0
+        self.interrupted = 0
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._interrupt = threading.Event()
+        self._stop_requested_at = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._current = None
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    @property
+    def busy(self):
+        """True while something is playing or queued"""
+        return self.queue_depth > 0 or self._current is not None
+
+    def start(self):
+        """Start the engine thread and open the mixer ahead of the first utterance (warm-up)"""
+        self._ensure_running()
+        return self
+
+    def _ensure_running(self):
+        with self._lock:
+            if self.init_error is None and (self._thread is None or not self._thread.is_alive()):
+                ready = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(ready,), name="apex-playback", daemon=True)
+                self._thread.start()
+                ready.wait(5)
+
+    def enqueue(self, chunks, audio_format="mp3", sample_rate=None, priority=PRIORITY_NORMAL, on_start=None):
+        """Queue audio for playback and return its Utterance (non-blocking)"""
+        self._ensure_running()
+        utterance = Utterance(chunks, audio_format, sample_rate, on_start, self.generation)
+        if self.init_error is not None:
+            # No mixer to play on: fail it now rather than leave callers waiting on it
+            utterance.finish(False)
+            return utterance
+        self._queue.put((priority, next(self._order), utterance))
+        if self.init_error is not None:
+            self._drop_queued()  # the mixer failed after a slow start gave up waiting on it
+        set_gauge("playback.queue_depth", self.queue_depth)
+        return utterance
+
+    def stop(self, wait=True, timeout=0.25):
+        """
+        Silence current playback and drop queued utterances. With wait=True, returns
+        once the engine confirmed the mixer is quiet (or after timeout).
+        """
+        with self._lock:
+            self.generation += 1
+            self._stopped.clear()
+            self._stop_requested_at = time.perf_counter()
+            self._interrupt.set()
+            running = self.init_error is None and self._thread is not None and self._thread.is_alive()
+
+        self._drop_queued()
+        if not running:
+            self._interrupt.clear()
+            return True
+        # Wake the engine if it is idle so it acknowledges right away
+        self._queue.put((-1, next(self._order), None))
+        if wait:
+            return self._stopped.wait(timeout)
+        return True
+
+    def stop_session(self, session_id, wait=True, timeout=0.25):
+        """
+        Silence one session's playing and queued utterances, leaving other sessions'
+        audio alone. With wait=True, returns once its utterance stopped playing.
+        """
+        with self._queue.mutex:
+            queued = [utterance for _, _, utterance in self._queue.queue if utterance is not None]
+        stopped_at = time.perf_counter()
+        for utterance in queued:
+            if utterance.session_id == session_id:
+                # Finished now; the engine skips it when it comes up
+                utterance.stop()
+                utterance.finish(False)
+
+        current = self._current
+        if current is not None and current.session_id == session_id:
+            current.stop()
+        if wait and current is not None and current.session_id == session_id:
+            if not current.done.wait(timeout):
+                return False
+            record_timing("playback.stop_latency", time.perf_counter() - stopped_at)
+        return True
+
+    def _drop_queued(self):
+        while True:
+            try:
+                _, _, utterance = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if utterance is not None:
+                utterance.finish(False)
+
+    def _acknowledge_stop(self):
+        """Called on the engine thread once the mixer is silent after a stop()"""
+        with self._lock:
+            if self._stop_requested_at is not None:
+                record_timing("playback.stop_latency", time.perf_counter() - self._stop_requested_at)
+                self._stop_requested_at = None
+            self._interrupt.clear()
+            self._stopped.set()
+
+    def _open_mixer(self):
+        # pygame is only loaded (and the mixer opened) once something is about to play
+        import pygame
+
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+
+    def _silence(self):
+        import pygame
+
+        pygame.mixer.music.stop()
+        pygame.mixer.music.unload()
+        pygame.mixer.stop()
+
+    def _run(self, ready):
+        try:
+            self._open_mixer()
+        except Exception as e:
+            self.init_error = e
+            logger.error(f"❌ Could not open the audio mixer, playback is off: {e}")
+            self._drop_queued()
+            return
+        finally:
+            ready.set()
+
+        while True:
+            _, _, utterance = self._queue.get()
+            if utterance is None:
+                # Wake-up from stop() while nothing was playing
+                if self._interrupt.is_set():
+                    self._acknowledge_stop()
+                continue
+
+            if utterance.generation != self.generation or utterance.cancelled:
+                utterance.finish(False)
+                continue
+
+            self._current = utterance
+            try:
+                played = utterance.context.run(self._play_traced, utterance)
+            except Exception as e:
+                logger.error(f"❌ Playback failed: {e}")
+                played = False
+
+            if self._interrupt.is_set():
+                self._silence()
+                self.interrupted += 1
+                self._acknowledge_stop()
+            elif utterance.cancelled:
+                # Its request was cancelled or superseded: cut it without touching what is queued after it
+                self._silence()
+                self.interrupted += 1
+            elif played:
+                self.played += 1
+            self._current = None
+            utterance.finish(played)
+
+    def _play_traced(self, utterance):
+        queue_ms = round((time.perf_counter() - utterance.queued_at) * 1000, 1)
+        with span("playback", format=utterance.audio_format, queue_ms=queue_ms) as playback:
+            played = self._play(utterance)
+            playback.attrs["played"] = played
+            return played
+
+    def _play(self, utterance):
+        """Play one utterance to the end; False if it was interrupted or had no audio"""
+        if utterance.audio_format == "pcm":
+            return self._play_pcm(utterance)
+        return self._play_compressed(utterance)
+
+    def _halted(self, utterance):
+        """True once stop() was called or the utterance's request was cancelled"""
+        return self._interrupt.is_set() or utterance.cancelled
+
+    def _tick(self, utterance):
+        """Sleep one tick (woken early by stop()); True if playback should end"""
+        return self._interrupt.wait(TICK_SECONDS) or utterance.cancelled
+
+    def _next_chunk(self, utterance):
+        """Next chunk of an utterance, or None at the end, on interrupt or on cancellation"""
+        while not self._halted(utterance):
+            try:
+                return utterance.chunks.get(timeout=TICK_SECONDS * 2)
+            except queue.Empty:
+                continue
+        return None
+
+    def _play_compressed(self, utterance):
+        import pygame
+
+        # MP3 can't be decoded mid-frame by pygame, so the phrase plays once it is complete
+        parts = []
+        while True:
+            chunk = self._next_chunk(utterance)
+            if chunk is None:
+                break
+            parts.append(chunk)
+        if self._halted(utterance) or not parts:
+            return False
+
+        pygame.mixer.music.load(BytesIO(b"".join(parts)), utterance.audio_format)
+        parts = None
+        pygame.mixer.music.play()
+        utterance.started()
+
+        while pygame.mixer.music.get_busy():
+            if self._tick(utterance):
+                return False
+        pygame.mixer.music.unload()
+        return True
+
+    def _play_pcm(self, utterance):
+        """Play 16-bit mono PCM as it arrives, queueing ~PCM_BLOCK_MS Sounds on one channel"""
+        import pygame
+
+        block_bytes = utterance.sample_rate * 2 * PCM_BLOCK_MS // 1000
+        channel = None
+        pending = b""
+
+        def enqueue(data):
+            nonlocal channel
+            sound = pcm_to_sound(data, utterance.sample_rate)
+            if channel is None or not channel.get_busy():
+                channel = sound.play()
+                utterance.started()
+                return
+            # A channel holds one queued sound; wait for the slot instead of cutting the current one
+            while channel.get_queue() is not None:
+                if self._tick(utterance):
+                    return
+            channel.queue(sound)
+
+        while True:
+            chunk = self._next_chunk(utterance)
+            if chunk is None:
+                break
+            pending += chunk
+            if len(pending) >= block_bytes:
+                usable = len(pending) - len(pending) % 2
+                enqueue(pending[:usable])
+                pending = pending[usable:]
+
+        if pending and not self._halted(utterance):
+            enqueue(pending[:len(pending) - len(pending) % 2])
+
+        while channel is not None and channel.get_busy():
+            if self._tick(utterance):
+                return False
+        return channel is not None and not self._halted(utterance)
+
+    def stats(self):
+        """Queue depth, counters and stop latency"""
+        stop_latency = timing_summary("playback.stop_latency")
+        return {
+            "queue_depth": self.queue_depth,
+            "played": self.played,
+            "interrupted": self.interrupted,
+            "stop_latency_ms": stop_latency["avg"] * 1000 if stop_latency["avg"] is not None else None,
+        }
+
+
+playback_engine = PlaybackEngine()
@@ -0,0 +1,237 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from metrics import observe
+from scheduler import current_token, raise_if_cancelled, sleep_unless_cancelled
+
+logger = logging.getLogger(__name__)
+
+# Client-side budgets per provider (requests and tokens per minute); 0 disables a budget
+PROVIDER_LIMITS = {
+    "gemini": {
+        "rpm": int(os.getenv("APEX_GEMINI_RPM", "15")),
+        "tpm": int(os.getenv("APEX_GEMINI_TPM", "1000000")),
+    },
+    "groq": {
+        "rpm": int(os.getenv("APEX_GROQ_RPM", "20")),
+        "tpm": int(os.getenv("APEX_GROQ_TPM", "0")),
+    },
+    # Text-to-speech: one request per spoken phrase
+    "gtts": {
+        "rpm": int(os.getenv("APEX_GTTS_RPM", "60")),
+        "tpm": 0,
+    },
+    "elevenlabs": {
+        "rpm": int(os.getenv("APEX_ELEVENLABS_RPM", "100")),
+        "tpm": 0,
+    },
+}
+
+MAX_RETRIES = int(os.getenv("APEX_MAX_RETRIES", "4"))
+BASE_BACKOFF = float(os.getenv("APEX_BASE_BACKOFF", "1.0"))
+MAX_BACKOFF = float(os.getenv("APEX_MAX_BACKOFF", "30.0"))
+
+# Error classes
+RATE_LIMITED = "rate_limited"
+RETRYABLE = "retryable"
+FATAL = "fatal"
+
+RETRYABLE_STATUS = {408, 409, 500, 502, 503, 504}
+
+# How often a caller queued on the limiter checks whether its request was cancelled
+CANCEL_POLL_SECONDS = 0.1
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at capacity per minute"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount, now):
+        """Seconds until `amount` tokens are available"""
+        self._refill(now)
+        # Requests bigger than the whole bucket only wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budget with a FIFO queue of waiting callers"""
+
+    def __init__(self, name, rpm=0, tpm=0):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+        self.total_wait = 0.0
+        self._waiting = deque()
+        self._cond = threading.Condition()
+
+    def _wait_time(self, tokens, now):
+        wait = max(0.0, self.paused_until - now)
+        if self.requests is not None:
+            wait = max(wait, self.requests.time_until(1, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.time_until(tokens, now))
+        return wait
+
+    def acquire(self, tokens=1, token=None):
+        """
+        Block until this caller's turn and budget come up; returns seconds waited.
+        Gives up its place with RequestCancelled once `token` is cancelled.
+        """
+        started_at = time.monotonic()
+        ticket = object()
+        poll = CANCEL_POLL_SECONDS if token is not None else None
+
+        with self._cond:
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    if token is not None:
+                        token.raise_if_cancelled()
+                    if self._waiting[0] is ticket:
+                        now = time.monotonic()
+                        wait = self._wait_time(tokens, now)
+                        if wait <= 0:
+                            if self.requests is not None:
+                                self.requests.consume(1)
+                            if self.tokens is not None:
+                                self.tokens.consume(tokens)
+                            break
+                        self._cond.wait(min(wait, poll) if poll else wait)
+                    else:
+                        # Not at the head of the queue yet - callers are served in arrival order
+                        self._cond.wait(poll)
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+
+        waited = time.monotonic() - started_at
+        self.total_wait += waited
+        observe(f"rate_limiter.wait.{self.name}", waited)
+        return waited
+
+    def pause(self, seconds):
+        """Hold back every caller after the provider told us to slow down"""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider, model):
+    """Shared limiter for a (provider, model) pair"""
+    key = f"{provider}.{model}"
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limits = PROVIDER_LIMITS.get(provider, {})
+            limiter = RateLimiter(key, limits.get("rpm", 0), limits.get("tpm", 0))
+            _limiters[key] = limiter
+        return limiter
+
+
+def error_status(exc):
+    """HTTP status carried by an SDK exception (Groq uses status_code, google.api_core uses code)"""
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return int(value)
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return int(value) if isinstance(value, int) else None
+
+
+def classify_error(exc):
+    """Decide from the exception's type and status (not its message) whether to retry"""
+    status = error_status(exc)
+    if status == 429:
+        return RATE_LIMITED
+    if status in RETRYABLE_STATUS:
+        return RETRYABLE
+    if status is not None:
+        return FATAL
+
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return RETRYABLE
+
+    # Transport errors from the SDKs (no HTTP status): connection resets, timeouts
+    for cls in type(exc).__mro__:
+        if cls.__name__ in ("APIConnectionError", "APITimeoutError", "RetryError", "DeadlineExceeded", "ServiceUnavailable"):
+            return RETRYABLE
+        if cls.__name__ in ("ResourceExhausted", "TooManyRequests", "RateLimitError"):
+            return RATE_LIMITED
+    return FATAL
+
+
+def retry_after(exc):
+    """Server-suggested delay in seconds, if the error carries one"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        try:
+            return float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def backoff_delay(attempt, base=BASE_BACKOFF, cap=MAX_BACKOFF):
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_retry(provider, model, fn, *args, tokens=1, max_retries=MAX_RETRIES, **kwargs):
+    """
+    Call fn under the (provider, model) rate limiter, retrying rate-limit and
+    transient errors with jittered exponential backoff. Fatal errors and the
+    last failure are re-raised; a cancelled request raises RequestCancelled
+    while it waits for quota or a retry, and before calling again.
+    """
+    limiter = get_limiter(provider, model)
+
+    for attempt in range(max_retries + 1):
+        raise_if_cancelled()
+        limiter.acquire(tokens, token=current_token())
+        # The wait for quota can be long; don't call for a request nobody wants any more
+        raise_if_cancelled()
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+            # Per-client latency (for streams this is the time until the response started)
+            observe(f"client.{provider}.{model}", time.perf_counter() - started)
+            return result
+        except Exception as e:
+            kind = classify_error(e)
+            if kind == FATAL or attempt == max_retries:
+                raise
+
+            delay = retry_after(e) or backoff_delay(attempt)
+            if kind == RATE_LIMITED:
+                # Everyone sharing this limiter backs off, not just this caller
+                limiter.pause(delay)
+                logger.warning(f"⏳ {provider} rate limited, backing off {delay:.1f}s (attempt {attempt + 1})")
+            else:
+                logger.warning(f"🔄 {provider} transient error, retrying in {delay:.1f}s (attempt {attempt + 1}): {e}")
+                sleep_unless_cancelled(delay)
@@ -0,0 +1,138 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Cache settings (overridable through the environment)
+CACHE_MAX_ENTRIES = int(os.getenv("APEX_CACHE_MAX_ENTRIES", "512"))
+CACHE_TTL = float(os.getenv("APEX_CACHE_TTL", "600"))
+CACHE_DB_PATH = os.getenv("APEX_CACHE_DB")  # Set to a file path to keep the cache across restarts
+
+_PUNCTUATION = re.compile(r"[^\w\s']")
+
+
+def normalize_query(query):
+    """Lowercase, drop punctuation and collapse whitespace so trivial variations share a key"""
+    return " ".join(_PUNCTUATION.sub(" ", query.lower()).split())
+
+
+def make_key(query, frame_hash=None):
+    """Cache key from the normalized query and (optionally) the perceptual hash of the frame"""
+    scene = f"{frame_hash:016x}" if frame_hash is not None else "-"
+    return f"{scene}|{normalize_query(query)}"
+
+
+class ResponseCache:
+    """LRU + TTL cache for model answers, with an optional SQLite tier that survives restarts"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, db_path=CACHE_DB_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+        self._entries = OrderedDict()  # key -> (value, latency, created_at)
+        self._lock = threading.Lock()
+        self._db = None
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT, latency REAL, created_at REAL, last_used REAL)"
+            )
+            self._db.commit()
+
+    def get(self, key):
+        """Return the cached answer for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                entry = self._load(key)
+                if entry is not None:
+                    self._entries[key] = entry
+
+            if entry is None or now - entry[2] > self.ttl:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.latency_saved += entry[1]
+            if self._db is not None:
+                self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                self._db.commit()
+            return entry[0]
+
+    def put(self, key, value, latency=0.0):
+        """Store an answer along with how long it took to produce"""
+        if not value:
+            return
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (value, latency, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, latency, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, latency, now, now)
+                )
+                # Same size bound on disk: drop the least recently used rows
+                self._db.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+                self._db.commit()
+
+    def clear(self):
+        """Drop every cached answer"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def _load(self, key):
+        row = self._db.execute(
+            "SELECT value, latency, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+
+    def stats(self):
+        """Hit/miss counters and total latency saved"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "latency_saved": self.latency_saved,
+                "entries": len(self._entries),
+            }
+
+    def format_stats(self):
+        """One-line summary for the UI status box"""
+        stats = self.stats()
+        return (
+            f"💾 Cache: {stats['hits']} hits / {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%}), {stats['latency_saved']:.1f}s saved"
+        )
+
+
+# Shared cache for vision answers in ai_agent and tools
+response_cache = ResponseCache()
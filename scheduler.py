@@ -0,0 +1,245 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import os
+import threading
+import time
+
+from response_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# How long a new request waits for the one it superseded to wind down before starting anyway
+SUPERSEDE_TIMEOUT = float(os.getenv("APEX_SUPERSEDE_TIMEOUT", "2.0"))
+
+_current_token = contextvars.ContextVar("apex_cancel_token", default=None)
+
+
+class RequestCancelled(Exception):
+    """Raised by work that noticed its request was cancelled"""
+
+
+class CancelToken:
+    """Cooperative cancellation flag shared by every stage of one request"""
+
+    def __init__(self, session_id=None):
+        self.session_id = session_id  # the session the request works for, so its audio can be told apart
+        self.reason = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise RequestCancelled(self.reason)
+
+    def wait(self, timeout=None):
+        """Sleep up to timeout, waking as soon as the request is cancelled; True if it was"""
+        return self._event.wait(timeout)
+
+
+def current_token():
+    """Cancel token of the request the calling code works for (propagates like the trace context), or None"""
+    return _current_token.get()
+
+
+def is_cancelled():
+    """True once the current request was cancelled or superseded; stages check this between chunks"""
+    token = _current_token.get()
+    return token is not None and token.cancelled
+
+
+def raise_if_cancelled():
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def sleep_unless_cancelled(seconds):
+    """time.sleep that raises RequestCancelled as soon as the current request is cancelled"""
+    token = _current_token.get()
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        token.raise_if_cancelled()
+
+
+def request_key(kind, text=""):
+    """Requests with the same key are the same question and get merged while one is in flight"""
+    return kind, normalize_query(text)
+
+
+class Job:
+    """One in-flight request: its key, cancel token and the result its callers share"""
+
+    def __init__(self, session_id, kind, key):
+        self.kind = kind
+        self.key = key
+        self.token = CancelToken(session_id)
+        self.future = concurrent.futures.Future()
+
+
+class RequestScheduler:
+    """
+    Single-flight request scheduling per session.
+
+    A request with the same key as the one in flight (the send button and the
+    textbox's submit firing together, a double-clicked voice button) waits for
+    that request and shares its result. A different request supersedes it: the
+    old one is cancelled cooperatively (LLM stream, TTS synthesis and playback
+    all watch the token) and the new one starts once it has wound down, so a
+    session never runs two requests at once.
+    """
+
+    def __init__(self, supersede_timeout=SUPERSEDE_TIMEOUT):
+        self.supersede_timeout = supersede_timeout
+        self.started = 0
+        self.coalesced = 0
+        self.superseded = 0
+        self.cancelled = 0
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _claim(self, session, kind, key):
+        """(job, previous job, coalesced) for a new request on a session"""
+        with self._lock:
+            job = self._jobs.get(session.session_id)
+            if job is not None and job.key == key and not job.token.cancelled:
+                self.coalesced += 1
+                return job, None, True
+
+            previous = job
+            if previous is not None:
+                previous.token.cancel("superseded")
+                self.superseded += 1
+            job = Job(session.session_id, kind, key)
+            self._jobs[session.session_id] = job
+            session.in_flight = kind
+            self.started += 1
+            return job, previous, False
+
+    def _release(self, session, job):
+        with self._lock:
+            if self._jobs.get(session.session_id) is job:
+                del self._jobs[session.session_id]
+                session.in_flight = None
+
+    def _settle(self, job, result=None, error=None):
+        if job.future.done():
+            return
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    async def stream(self, session, kind, key, work, on_cancel):
+        """
+        Run `work(token)`, an async generator of UI updates, as the session's request
+        and relay its updates, or join the identical request in flight (joiners get its
+        final update). A cancelled or superseded request ends with on_cancel(token);
+        one whose caller stops listening (the browser went away) is cancelled too.
+        """
+        job, previous, coalesced = self._claim(session, kind, key)
+        if coalesced:
+            logger.debug(f"🔗 Merged with the identical {kind} request in flight")
+            yield await asyncio.shield(asyncio.wrap_future(job.future))
+            return
+
+        if previous is not None:
+            # Let the superseded request stop touching the session before this one starts
+            await asyncio.wait([asyncio.wrap_future(previous.future)], timeout=self.supersede_timeout)
+
+        last = None
+        updates = work(job.token)
+        try:
+            job.token.raise_if_cancelled()
+            while True:
+                # Set per step: each step of an async generator may run in a different context
+                context_token = _current_token.set(job.token)
+                try:
+                    update = await updates.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    _current_token.reset(context_token)
+                if job.token.cancelled:
+                    break
+                last = update
+                yield update
+            if job.token.cancelled:
+                # Work that swallowed the cancellation (e.g. into an error message) still reports it as one
+                raise RequestCancelled(job.token.reason)
+        except RequestCancelled:
+            last = on_cancel(job.token)
+            yield last
+        except (GeneratorExit, asyncio.CancelledError):
+            # Nobody is listening for the rest any more, so stop the work
+            job.token.cancel("abandoned")
+            last = on_cancel(job.token)
+            raise
+        except BaseException as e:
+            self._settle(job, error=e)
+            raise
+        finally:
+            await updates.aclose()
+            self._release(session, job)
+            self._settle(job, last)
+
+    def run_sync(self, session, kind, key, work, on_cancel):
+        """Blocking, single-result variant of stream() for callers outside the event loop (the wake word listener)"""
+        job, previous, coalesced = self._claim(session, kind, key)
+        if coalesced:
+            return job.future.result()
+
+        if previous is not None:
+            concurrent.futures.wait([previous.future], timeout=self.supersede_timeout)
+
+        context_token = _current_token.set(job.token)
+        try:
+            job.token.raise_if_cancelled()
+            result = work(job.token)
+            if job.token.cancelled:
+                result = on_cancel(job.token)
+        except RequestCancelled:
+            result = on_cancel(job.token)
+        except BaseException as e:
+            self._settle(job, error=e)
+            raise
+        finally:
+            _current_token.reset(context_token)
+            self._release(session, job)
+        self._settle(job, result)
+        return result
+
+    def cancel(self, session_id, reason="cancelled"):
+        """Cancel the session's in-flight request (e.g. on Clear); True if there was one"""
+        with self._lock:
+            job = self._jobs.get(session_id or "default")
+        if job is None or job.token.cancelled:
+            return False
+        job.token.cancel(reason)
+        self.cancelled += 1
+        return True
+
+    def stats(self):
+        """Counters for started, merged, superseded and cancelled requests"""
+        with self._lock:
+            return {
+                "in_flight": len(self._jobs),
+                "started": self.started,
+                "coalesced": self.coalesced,
+                "superseded": self.superseded,
+                "cancelled": self.cancelled,
+            }
+
+
+# Shared scheduler used by the Gradio handlers
+scheduler = RequestScheduler()
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+
+from chat_history import ChatHistory, HISTORY_DIR, purge_spill_files
+from frame_ring import FrameRingBuffer, FRAME_SLOTS
+
+# Memory caps per session (overridable through the environment)
+MAX_FRAME_BYTES = int(os.getenv("APEX_MAX_FRAME_BYTES", str(1280 * 720 * 3)))  # per frame slot
+# History past these caps is spilled to disk (see chat_history.py) rather than held in memory
+MAX_HISTORY_ENTRIES = int(os.getenv("APEX_MAX_HISTORY_ENTRIES", "200"))
+MAX_HISTORY_BYTES = int(os.getenv("APEX_MAX_HISTORY_BYTES", str(256 * 1024)))
+SESSION_IDLE_TIMEOUT = float(os.getenv("APEX_SESSION_IDLE_TIMEOUT", "900"))
+
+# Sessions are swept for idleness at most this often
+EVICTION_INTERVAL = 30.0
+
+
+def cap_frame(frame, max_bytes=MAX_FRAME_BYTES):
+    """Downsample a frame by an integer stride until it fits under max_bytes"""
+    if frame is None or frame.nbytes <= max_bytes:
+        return frame
+
+    step = 2
+    while frame[::step, ::step].nbytes > max_bytes:
+        step += 1
+    # A strided view is fine: the ring buffer copies it into its slot
+    return frame[::step, ::step]
+
+
+class SessionState:
+    """Everything one browser session owns: its latest frame, its history and its in-flight request kind"""
+
+    def __init__(self, session_id, max_history_entries=MAX_HISTORY_ENTRIES, max_history_bytes=MAX_HISTORY_BYTES):
+        self.session_id = session_id
+        self.frames = None  # FrameRingBuffer, allocated once the frame size is known
+        self.history = ChatHistory(session_id, max_history_entries, max_history_bytes)
+        self.in_flight = None  # Set by the request scheduler while a request runs
+        self.last_seen = time.monotonic()
+
+    @property
+    def latest_frame(self):
+        """
+        Copy of the newest frame (None before the first one), taken once at the start of
+        a request: the ring keeps being written while the frame is hashed and encoded.
+        """
+        if self.frames is None:
+            return None
+        while True:
+            view = self.frames.read_latest()
+            if view is None:
+                return None
+            frame = view.copy()
+            # The writer wrapped around to this slot while we copied; take the newer frame
+            if view.still_valid():
+                return frame
+
+    @property
+    def frame_bytes(self):
+        return self.frames.nbytes if self.frames is not None else 0
+
+    @property
+    def history_bytes(self):
+        return self.history.bytes
+
+    @property
+    def bytes_held(self):
+        return self.frame_bytes + self.history_bytes
+
+
+class SessionStore:
+    """Per-session state keyed by Gradio session hash, with memory caps and idle eviction"""
+
+    def __init__(self, max_frame_bytes=MAX_FRAME_BYTES, max_history_entries=MAX_HISTORY_ENTRIES,
+                 max_history_bytes=MAX_HISTORY_BYTES, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.max_frame_bytes = max_frame_bytes
+        self.max_history_entries = max_history_entries
+        self.max_history_bytes = max_history_bytes
+        self.idle_timeout = idle_timeout
+        self.evicted_sessions = 0
+        self._evict_callbacks = []
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        # Spill files untouched for longer than a session may idle belong to no live session
+        purge_spill_files(HISTORY_DIR, max_age=idle_timeout)
+
+    def get(self, session_id):
+        """Fetch (or create) the state for a session and mark it as active"""
+        session_id = session_id or "default"
+        now = time.monotonic()
+
+        with self._lock:
+            if now - self._last_sweep > EVICTION_INTERVAL:
+                self._evict_idle_locked(now)
+
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = SessionState(session_id, self.max_history_entries, self.max_history_bytes)
+                self._sessions[session_id] = session
+            session.last_seen = now
+            return session
+
+    def most_recent(self):
+        """The session seen most recently (e.g. for commands that arrive outside the UI), or None"""
+        with self._lock:
+            return max(self._sessions.values(), key=lambda session: session.last_seen, default=None)
+
+    def set_frame(self, session, frame):
+        """Write the latest frame into the session's ring buffer, downsampled to the frame cap"""
+        frame = cap_frame(frame, self.max_frame_bytes)
+        ring = session.frames
+        if ring is None or ring.shape != frame.shape or ring.dtype != frame.dtype:
+            # First frame or the webcam changed resolution: (re)allocate the slots
+            ring = FrameRingBuffer(frame.shape, frame.dtype, slots=FRAME_SLOTS)
+            session.frames = ring
+        ring.write(frame)
+
+    def append_history(self, session, *entries, token=None):
+        """
+        Append chat messages together (see chat_history.user_turn and friends);
+        the oldest ones are spilled to disk past the caps. Nothing is appended once
+        `token` (the request's CancelToken) is cancelled; the check happens under
+        the store lock, so it can't race clear_history().
+        """
+        with self._lock:
+            if token is not None and token.cancelled:
+                return False
+            session.history.append(*entries)
+            return True
+
+    def clear_history(self, session):
+        """Forget a session's chat history, including what was spilled to disk"""
+        with self._lock:
+            session.history.clear()
+
+    def on_evict(self, callback):
+        """Register a callback(session_id) run when a session is evicted"""
+        self._evict_callbacks.append(callback)
+
+    def evict_idle(self):
+        """Drop sessions that have been idle longer than the timeout"""
+        with self._lock:
+            return self._evict_idle_locked(time.monotonic())
+
+    def _evict_idle_locked(self, now):
+        self._last_sweep = now
+        idle = [
+            session_id for session_id, session in self._sessions.items()
+            if now - session.last_seen > self.idle_timeout and session.in_flight is None
+        ]
+        for session_id in idle:
+            self._sessions.pop(session_id).history.clear()
+            for callback in self._evict_callbacks:
+                callback(session_id)
+        self.evicted_sessions += len(idle)
+        return len(idle)
+
+    def stats(self):
+        """Counters for active sessions and memory held"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+
+        return {
+            "active_sessions": len(sessions),
+            "in_flight": sum(1 for session in sessions if session.in_flight is not None),
+            "frame_bytes": sum(session.frame_bytes for session in sessions),
+            "frames_dropped": sum(session.frames.stats()["dropped"] for session in sessions if session.frames is not None),
+            "history_bytes": sum(session.history_bytes for session in sessions),
+            "history_spilled": sum(session.history.spilled for session in sessions),
+            "bytes_held": sum(session.bytes_held for session in sessions),
+            "evicted_sessions": self.evicted_sessions,
+        }
+
+    def format_stats(self):
+        """One-line summary for the UI status box"""
+        stats = self.stats()
+        return (
+            f"👥 Sessions: {stats['active_sessions']} active, {stats['in_flight']} busy | "
+            f"Memory: {stats['bytes_held'] / 1024:.0f} KB held"
+        )
+
+
+# Shared store used by the Gradio app
+sessions = SessionStore()
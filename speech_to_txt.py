@@ -1,94 +1,325 @@
 import logging
 import os
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from io import BytesIO
+import numpy as np
 import speech_recognition as sr
-from pydub import AudioSegment
-from groq import Groq
+from stt_backends import groq_backend, stt_router
+from vad import UtteranceSegmenter, merge_transcripts, shared_vad, FRAME_MS
+from scheduler import raise_if_cancelled
+from tracing import wrap
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Log level and format come from tracing (APEX_LOG_LEVEL)
+logger = logging.getLogger(__name__)
 
-def record_audio(file_path, timeout=20, phrase_time_limit=None):
+class MicrophoneArbiter:
     """
-    Record audio from the microphone and save it as an MP3 file.
+    Lets a command capture (the Voice button) take the microphone from the
+    always-open wake word listener: the listener closes its stream while a
+    capture runs and reopens it afterwards, so the two never hold the device at once.
+    """
+
+    def __init__(self, handover_timeout=1.0):
+        self.handover_timeout = handover_timeout
+        self._captures = 0
+        self._background_open = False
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def capture(self):
+        """Hold the microphone for one command capture"""
+        with self._cond:
+            self._captures += 1
+            # Wait for the listener to close its stream (it checks between audio blocks)
+            if not self._cond.wait_for(lambda: not self._background_open, self.handover_timeout):
+                logger.warning("⚠️ Wake word listener still holds the microphone")
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._captures -= 1
+                self._cond.notify_all()
+
+    @property
+    def wanted(self):
+        """True while a command capture is waiting for or using the microphone"""
+        return self._captures > 0
+
+    def background_opened(self):
+        """The background listener opens its stream once no capture is running"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._captures == 0)
+            self._background_open = True
+
+    def background_closed(self):
+        with self._cond:
+            self._background_open = False
+            self._cond.notify_all()
+
+
+microphone = MicrophoneArbiter()
+
+def listen_for_speech(timeout=20, phrase_time_limit=None):
+    """
+    Open the microphone, calibrate for ambient noise and capture one phrase as AudioData.
     """
     recognizer = sr.Recognizer()
 
+    logger.debug("🎤 Initializing microphone...")
+    with microphone.capture(), sr.Microphone() as source:
+        logger.debug("🔧 Adjusting for ambient noise...")
+        recognizer.adjust_for_ambient_noise(source, duration=1)
+        logger.info("✅ Ready! Start speaking now...")
+
+        audio_data = recognizer.listen(
+            source, 
+            timeout=timeout, 
+            phrase_time_limit=phrase_time_limit
+        )
+        logger.debug("✅ Recording complete.")
+        return audio_data
+
+def record_audio(file_path, timeout=20, phrase_time_limit=None):
+    """
+    Record audio from the microphone and save it as an MP3 file.
+    """
     try:
-        print("🎤 Initializing microphone...")
-        with sr.Microphone() as source:
-            print("🔧 Adjusting for ambient noise...")
-            recognizer.adjust_for_ambient_noise(source, duration=1)
-            print("✅ Ready! Start speaking now...")
-
-            audio_data = recognizer.listen(
-                source, 
-                timeout=timeout, 
-                phrase_time_limit=phrase_time_limit
-            )
-            print("✅ Recording complete.")
-
-            # Convert and save audio
-            wav_data = audio_data.get_wav_data()
-            audio_segment = AudioSegment.from_wav(BytesIO(wav_data))
-            
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(file_path) if os.path.dirname(file_path) else '.', exist_ok=True)
-            
-            # Export with quality settings
-            audio_segment.export(file_path, format="mp3", parameters=["-ar", "16000"])
-            
-            print(f"✅ Audio saved: {file_path} ({len(audio_segment)}ms)")
-            return True
-            
+        audio_data = listen_for_speech(timeout, phrase_time_limit)
+        
+        # Convert and save audio
+        from pydub import AudioSegment
+        wav_data = audio_data.get_wav_data()
+        audio_segment = AudioSegment.from_wav(BytesIO(wav_data))
+        
+        # Ensure directory exists
+        os.makedirs(os.path.dirname(file_path) if os.path.dirname(file_path) else '.', exist_ok=True)
+        
+        # Export with quality settings
+        audio_segment.export(file_path, format="mp3", parameters=["-ar", "16000"])
+        
+        logger.debug(f"✅ Audio saved: {file_path} ({len(audio_segment)}ms)")
+        return True
+        
     except sr.WaitTimeoutError:
-        print("❌ No speech detected within timeout period")
+        logger.warning("❌ No speech detected within timeout period")
         return False
     except Exception as e:
-        print(f"❌ Recording error: {e}")
-        logging.error(f"Error recording audio: {e}")
+        logger.error(f"❌ Recording error: {e}")
         return False
 
-def transcribe_with_groq(audio_filepath):
+# Whisper works at 16 kHz mono, so that's what we capture and upload
+UPLOAD_SAMPLE_RATE = 16000
+UPLOAD_SAMPLE_WIDTH = 2
+
+def encode_for_upload(audio_data, audio_format="wav"):
+    """
+    Encode captured AudioData as an in-memory 16 kHz mono 16-bit upload.
+    WAV is pure PCM (no codec process); FLAC is ~half the bytes but runs the flac encoder.
+    """
+    if audio_format == "flac":
+        data = audio_data.get_flac_data(convert_rate=UPLOAD_SAMPLE_RATE, convert_width=UPLOAD_SAMPLE_WIDTH)
+    else:
+        data = audio_data.get_wav_data(convert_rate=UPLOAD_SAMPLE_RATE, convert_width=UPLOAD_SAMPLE_WIDTH)
+    
+    buffer = BytesIO(data)
+    buffer.name = f"speech.{audio_format}"  # Groq infers the format from the file name
+    return buffer
+
+def record_audio_bytes(timeout=20, phrase_time_limit=None, audio_format="wav"):
     """
-    Transcribe an audio file using Groq's Whisper model.
+    Record audio from the microphone and return it as an in-memory upload (BytesIO), or None.
     """
-    GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-    if not GROQ_API_KEY:
-        raise ValueError("GROQ_API_KEY not found in environment variables.")
+    try:
+        audio_data = listen_for_speech(timeout, phrase_time_limit)
+        audio = encode_for_upload(audio_data, audio_format)
+        logger.debug(f"✅ Audio captured in memory ({len(audio.getvalue())} bytes {audio_format})")
+        return audio
+            
+    except sr.WaitTimeoutError:
+        logger.warning("❌ No speech detected within timeout period")
+        return None
+    except Exception as e:
+        logger.error(f"❌ Recording error: {e}")
+        return None
 
+def read_upload(audio):
+    """
+    (upload name, bytes) for audio given as a file path or an in-memory file (BytesIO with a .name).
+    """
+    if hasattr(audio, "read"):
+        # In-memory upload: no temp file, no reopen
+        upload_name = getattr(audio, "name", "speech.wav")
+        audio_bytes = audio.getvalue() if hasattr(audio, "getvalue") else audio.read()
+        if not audio_bytes:
+            raise ValueError("❌ Audio buffer is empty")
+        logger.debug(f"🧠 In-memory audio: {upload_name} ({len(audio_bytes)} bytes)")
+        return upload_name, audio_bytes
+    
     # Validate file exists and has content
-    if not os.path.exists(audio_filepath):
-        raise FileNotFoundError(f"❌ Audio file not found: {audio_filepath}")
+    if not os.path.exists(audio):
+        raise FileNotFoundError(f"❌ Audio file not found: {audio}")
     
-    file_size = os.path.getsize(audio_filepath)
+    file_size = os.path.getsize(audio)
     if file_size == 0:
-        raise ValueError(f"❌ Audio file is empty: {audio_filepath}")
+        raise ValueError(f"❌ Audio file is empty: {audio}")
     
-    print(f"📁 File found: {audio_filepath} ({file_size} bytes)")
+    logger.debug(f"📁 File found: {audio} ({file_size} bytes)")
+    with open(audio, "rb") as audio_file:
+        return os.path.basename(audio), audio_file.read()
 
+def transcribe_with_groq(audio):
+    """
+    Transcribe audio using Groq's Whisper model (pooled client).
+    `audio` is either a file path or an in-memory file (BytesIO with a .name).
+    """
+    upload_name, audio_bytes = read_upload(audio)
+    
     try:
-        client = Groq(api_key=GROQ_API_KEY)
-        stt_model = "whisper-large-v3"
-        
-        print("🔄 Sending to Groq for transcription...")
-        
-        with open(audio_filepath, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
-                model=stt_model,
-                file=audio_file,
-                language="en"
-            )
+        logger.debug("🔄 Sending to Groq for transcription...")
+        result_text = groq_backend.transcribe(upload_name, audio_bytes)
+        logger.debug(f"✅ Transcription successful: '{result_text}'")
+        return result_text
         
-        result_text = transcription.text.strip()
-        print(f"✅ Transcription successful: '{result_text}'")
+    except Exception as e:
+        logger.error(f"❌ Groq transcription failed: {e}")
+        raise
+
+def transcribe_audio(audio):
+    """
+    Transcribe audio with the backend the STT router picks (local Whisper for short
+    commands when it is faster, Groq otherwise, each falling back to the other).
+    """
+    upload_name, audio_bytes = read_upload(audio)
+    
+    try:
+        result_text = stt_router.transcribe(upload_name, audio_bytes)
+        logger.debug(f"✅ Transcription successful: '{result_text}'")
         return result_text
         
     except Exception as e:
-        print(f"❌ Transcription failed: {e}")
-        logging.error(f"Groq transcription error: {e}")
+        logger.error(f"❌ Transcription failed: {e}")
         raise
 
+# Streaming transcription: long utterances are uploaded in overlapping chunks while the user talks
+CHUNK_SECONDS = float(os.getenv("APEX_STT_CHUNK_SECONDS", "4"))
+CHUNK_OVERLAP_SECONDS = float(os.getenv("APEX_STT_CHUNK_OVERLAP", "0.75"))
+# Tails shorter than this are not worth their own upload once a chunk already covers the start
+MIN_TAIL_SECONDS = 0.3
+
+def samples_to_wav(samples, sample_rate=UPLOAD_SAMPLE_RATE):
+    """Wrap int16 mono samples in an in-memory WAV upload"""
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(UPLOAD_SAMPLE_WIDTH)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.ascontiguousarray(samples, dtype=np.int16).tobytes())
+    buffer.seek(0)
+    buffer.name = "speech.wav"
+    return buffer
+
+def transcribe_stream(read_samples, timeout=20, phrase_time_limit=None, transcribe=None, on_speech_end=None):
+    """
+    VAD-driven capture with chunked transcription.
+    
+    `read_samples()` returns the next block of 16 kHz int16 samples (empty when the
+    source is exhausted). The utterance is cut by the shared energy VAD (whose noise
+    floor persists between commands), and every CHUNK_SECONDS of speech is sent to
+    `transcribe` in the background, overlapping the previous chunk, so only the last
+    few seconds are still in flight when the user stops talking. Capture stops
+    with RequestCancelled as soon as the request is cancelled.
+    """
+    # Chunk uploads run on the pool below; bind them to this request's trace
+    transcribe = wrap(transcribe or transcribe_audio)
+    segmenter = UtteranceSegmenter(shared_vad)
+    chunk_frames = int(CHUNK_SECONDS * 1000 / FRAME_MS)
+    overlap_frames = int(CHUNK_OVERLAP_SECONDS * 1000 / FRAME_MS)
+    limit_frames = int(phrase_time_limit * 1000 / FRAME_MS) if phrase_time_limit else None
+    
+    futures = []
+    chunk_start = 0
+    waiting_since = time.monotonic()
+    
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="apex-stt-chunk") as pool:
+        while True:
+            raise_if_cancelled()
+            samples = read_samples()
+            if samples is None or len(samples) == 0:
+                segmenter.end_now()
+                break
+            
+            done = segmenter.feed(samples)
+            
+            if not segmenter.started:
+                if time.monotonic() - waiting_since > timeout:
+                    raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+                continue
+            
+            if limit_frames and segmenter.utterance_frames() >= limit_frames:
+                segmenter.end_now()
+                done = True
+            
+            # Ship every full chunk as soon as it has been spoken
+            while not done and segmenter.utterance_frames() - chunk_start >= chunk_frames:
+                chunk = segmenter.utterance_slice(chunk_start, chunk_start + chunk_frames)
+                logger.debug(f"📤 Uploading chunk at {chunk_start * FRAME_MS / 1000:.1f}s while still listening...")
+                futures.append(pool.submit(transcribe, samples_to_wav(chunk)))
+                chunk_start += chunk_frames - overlap_frames
+            
+            if done:
+                break
+        
+        if not segmenter.started:
+            raise sr.WaitTimeoutError("no speech detected")
+        
+        if on_speech_end is not None:
+            on_speech_end()
+        
+        total_frames = segmenter.utterance_frames()
+        tail_frames = total_frames - chunk_start
+        if not futures or tail_frames * FRAME_MS / 1000 >= MIN_TAIL_SECONDS + CHUNK_OVERLAP_SECONDS:
+            tail = segmenter.utterance_slice(chunk_start, total_frames)
+            futures.append(pool.submit(transcribe, samples_to_wav(tail)))
+        
+        logger.debug(f"✅ Utterance cut at {total_frames * FRAME_MS / 1000:.2f}s ({len(futures)} upload(s))")
+        texts = [future.result() for future in futures]
+    
+    return merge_transcripts([text for text in texts if text])
+
+def record_and_transcribe_streaming(timeout=20, phrase_time_limit=None, on_speech_end=None):
+    """
+    Listen on the microphone with VAD (no per-command noise calibration) and
+    return the transcript, uploading long utterances in chunks as they are spoken.
+    """
+    vad_frame = shared_vad.frame_len
+    logger.info("🎤 Listening (voice activity detection)...")
+    with microphone.capture(), sr.Microphone(sample_rate=UPLOAD_SAMPLE_RATE, chunk_size=vad_frame) as source:
+        def read_samples():
+            return np.frombuffer(source.stream.read(source.CHUNK), dtype=np.int16)
+        
+        text = transcribe_stream(read_samples, timeout=timeout, phrase_time_limit=phrase_time_limit, on_speech_end=on_speech_end)
+    
+    logger.debug(f"✅ Streaming transcription: '{text}'")
+    return text
+
+def transcribe_wav_file_streaming(wav_path, block_ms=FRAME_MS, **kwargs):
+    """Run the streaming VAD transcription over a 16 kHz mono WAV file instead of the microphone"""
+    with wave.open(wav_path, "rb") as wav:
+        if wav.getframerate() != UPLOAD_SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError("❌ Expected a 16 kHz mono 16-bit WAV file")
+        block = UPLOAD_SAMPLE_RATE * block_ms // 1000
+        
+        def read_samples():
+            return np.frombuffer(wav.readframes(block), dtype=np.int16)
+        
+        return transcribe_stream(read_samples, **kwargs)
+
 # Test function
 def test_recording_and_transcription():
     """Test the complete audio pipeline"""
@@ -111,5 +342,54 @@ def test_recording_and_transcription():
         print(f"❌ Pipeline test failed: {e}")
         return False
 
+def _cpu_seconds():
+    """CPU time of this process plus finished children (ffmpeg runs as a child)"""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def benchmark_audio_paths(wav_path, runs=5, upload=False):
+    """
+    Compare the old capture->MP3->temp file->reopen route with the in-memory WAV/FLAC route.
+    Reports wall and CPU time per run (and end-to-end with the Groq upload when upload=True).
+    """
+    with sr.AudioFile(wav_path) as source:
+        audio_data = sr.Recognizer().record(source)
+    
+    def mp3_route():
+        from pydub import AudioSegment
+        wav_data = audio_data.get_wav_data()
+        segment = AudioSegment.from_wav(BytesIO(wav_data))
+        path = os.path.join(tempfile.gettempdir(), "apex_benchmark.mp3")
+        segment.export(path, format="mp3", parameters=["-ar", "16000"])
+        try:
+            return transcribe_with_groq(path) if upload else os.path.getsize(path)
+        finally:
+            os.remove(path)
+    
+    def memory_route(audio_format):
+        def run():
+            buffer = encode_for_upload(audio_data, audio_format)
+            return transcribe_with_groq(buffer) if upload else len(buffer.getvalue())
+        return run
+    
+    routes = [("mp3 + temp file", mp3_route), ("in-memory wav", memory_route("wav")), ("in-memory flac", memory_route("flac"))]
+    
+    print(f"\n=== Audio path benchmark: {wav_path} ({runs} runs{', with upload' if upload else ''}) ===")
+    results = {}
+    for name, route in routes:
+        wall, cpu = [], []
+        for _ in range(runs):
+            wall_start, cpu_start = time.perf_counter(), _cpu_seconds()
+            size = route()
+            wall.append(time.perf_counter() - wall_start)
+            cpu.append(_cpu_seconds() - cpu_start)
+        results[name] = {"wall": sum(wall) / runs, "cpu": sum(cpu) / runs}
+        detail = "" if upload else f", {size} bytes"
+        print(f"{name:>16}: {results[name]['wall'] * 1000:7.1f} ms wall, {results[name]['cpu'] * 1000:7.1f} ms CPU{detail}")
+    return results
+
 if __name__ == "__main__":
-    test_recording_and_transcription()
+    if len(sys.argv) > 2 and sys.argv[1] == "--benchmark":
+        benchmark_audio_paths(sys.argv[2], upload="--upload" in sys.argv)
+    else:
+        test_recording_and_transcription()
@@ -0,0 +1,56 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import record_timing
+
+logger = logging.getLogger(__name__)
+
+# Measured from the first import of this module (main imports it before anything heavy)
+PROCESS_STARTED = time.perf_counter()
+
+_phases = []
+_phases_lock = threading.Lock()
+
+
+def record_phase(name, started):
+    """Record a startup phase that began at `started` (perf_counter) and ends now"""
+    elapsed = time.perf_counter() - started
+    with _phases_lock:
+        _phases.append((name, elapsed))
+    record_timing(f"startup.{name}", elapsed)
+
+
+@contextmanager
+def phase(name):
+    """Time a startup phase (an import group, building the UI, launching) for the breakdown"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, started)
+
+
+def run_in_background(name, fn, *args, **kwargs):
+    """Run a warm-up task off the launch path, timed as its own phase"""
+    def worker():
+        try:
+            with phase(name):
+                fn(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"⚠️ Background {name} failed: {e}")
+
+    thread = threading.Thread(target=worker, name=f"apex-{name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def report():
+    """Startup breakdown: each phase and the total time since the process started"""
+    with _phases_lock:
+        phases = list(_phases)
+    lines = ["⏱️ Startup breakdown:"]
+    lines += [f"   {name:<24} {elapsed * 1000:8.1f} ms" for name, elapsed in phases]
+    lines.append(f"   {'total':<24} {(time.perf_counter() - PROCESS_STARTED) * 1000:8.1f} ms")
+    return "\n".join(lines)
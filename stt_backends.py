@@ -0,0 +1,359 @@
+import glob
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import wave
+from abc import ABC, abstractmethod
+from io import BytesIO
+
+import numpy as np
+
+from metrics import record_timing
+from rate_limiter import call_with_retry
+from clients import get_groq_client, GROQ_STT_MODEL
+from scheduler import raise_if_cancelled
+from tracing import span
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:  # Local engine is optional
+    WhisperModel = None
+
+logger = logging.getLogger(__name__)
+
+# Local engine: a small int8-quantized Whisper running on the CPU
+LOCAL_STT_MODEL = os.getenv("APEX_LOCAL_STT_MODEL", "base.en")
+LOCAL_STT_COMPUTE_TYPE = os.getenv("APEX_LOCAL_STT_COMPUTE_TYPE", "int8")
+LOCAL_STT_THREADS = int(os.getenv("APEX_LOCAL_STT_THREADS", "4"))
+
+# Routing: "auto" picks per utterance, "groq" / "local" pin one backend
+STT_BACKEND = os.getenv("APEX_STT_BACKEND", "auto")
+# Utterances up to this long may go to the local engine
+LOCAL_MAX_SECONDS = float(os.getenv("APEX_LOCAL_STT_MAX_SECONDS", "6"))
+# Weight of the newest latency sample in the moving averages
+LATENCY_ALPHA = 0.2
+# Every Nth routed utterance goes to the backend predicted to be slower, so its estimate
+# keeps up when the network or the machine's load changes (0 disables exploring)
+STT_EXPLORE_EVERY = int(os.getenv("APEX_STT_EXPLORE_EVERY", "10"))
+
+
+# Whisper models expect 16 kHz mono
+WHISPER_SAMPLE_RATE = 16000
+# WAV sample width -> (dtype, offset, scale) mapping PCM samples into [-1, 1]; 8-bit WAV is unsigned
+_PCM_SCALES = {1: (np.uint8, 128.0, 128.0), 2: (np.int16, 0.0, 32768.0), 4: (np.int32, 0.0, 2147483648.0)}
+
+
+def wav_duration(audio_bytes):
+    """Duration in seconds of WAV bytes, or None for other formats"""
+    try:
+        with wave.open(BytesIO(audio_bytes), "rb") as wav:
+            return wav.getnframes() / float(wav.getframerate())
+    except (wave.Error, EOFError):
+        return None
+
+
+def wav_to_float32(audio_bytes):
+    """
+    PCM WAV bytes as 16 kHz mono float32 samples in [-1, 1], the input Whisper models
+    take: channels are averaged and other rates are resampled (linear interpolation).
+    """
+    with wave.open(BytesIO(audio_bytes), "rb") as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    if width not in _PCM_SCALES:
+        raise ValueError(f"❌ Unsupported WAV sample width: {width * 8}-bit (expected 8, 16 or 32-bit PCM)")
+    dtype, offset, scale = _PCM_SCALES[width]
+    samples = (np.frombuffer(frames, dtype=dtype).astype(np.float32) - offset) / scale
+
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    if rate != WHISPER_SAMPLE_RATE and len(samples):
+        duration = len(samples) / rate
+        targets = np.arange(int(duration * WHISPER_SAMPLE_RATE)) / WHISPER_SAMPLE_RATE
+        samples = np.interp(targets, np.arange(len(samples)) / rate, samples).astype(np.float32)
+    return samples
+
+
+class STTBackend(ABC):
+    """Speech-to-text engine: transcribe(name, audio_bytes) -> text"""
+
+    name = "base"
+    # Compute-bound engines take longer for longer audio; network ones mostly don't
+    scales_with_audio = False
+
+    @property
+    def available(self):
+        return True
+
+    @property
+    def ready(self):
+        """False while a first call would still pay a one-off setup cost (e.g. loading a model)"""
+        return True
+
+    def preload(self):
+        """Start any one-off setup in the background"""
+
+    @abstractmethod
+    def transcribe(self, upload_name, audio_bytes):
+        """Text spoken in the audio"""
+
+
+class GroqBackend(STTBackend):
+    """Groq-hosted Whisper over one pooled client (keep-alive connections are reused between calls)"""
+
+    name = "groq"
+
+    def __init__(self, model=GROQ_STT_MODEL):
+        self.model = model
+
+    @property
+    def available(self):
+        return bool(os.environ.get("GROQ_API_KEY"))
+
+    def transcribe(self, upload_name, audio_bytes):
+        client = get_groq_client()
+
+        def upload():
+            return client.audio.transcriptions.create(
+                model=self.model,
+                file=(upload_name, audio_bytes),
+                language="en"
+            )
+
+        return call_with_retry("groq", self.model, upload).text.strip()
+
+
+class LocalWhisperBackend(STTBackend):
+    """faster-whisper on the CPU: no network round trip and works offline"""
+
+    name = "local"
+    scales_with_audio = True
+
+    def __init__(self, model=LOCAL_STT_MODEL, compute_type=LOCAL_STT_COMPUTE_TYPE, threads=LOCAL_STT_THREADS):
+        self.model_name = model
+        self.compute_type = compute_type
+        self.threads = threads
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return WhisperModel is not None
+
+    @property
+    def ready(self):
+        return self._model is not None
+
+    def preload(self):
+        """Load the model on a background thread, off any request's path"""
+        if self.available and not self.ready:
+            threading.Thread(target=self._preload, name="apex-stt-preload", daemon=True).start()
+
+    def _preload(self):
+        try:
+            self.model
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load the local Whisper model: {e}")
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                if WhisperModel is None:
+                    raise RuntimeError("❌ Local STT needs faster-whisper (pip install faster-whisper)")
+                logger.info(f"🔄 Loading local Whisper model '{self.model_name}' ({self.compute_type})...")
+                self._model = WhisperModel(
+                    self.model_name, device="cpu",
+                    compute_type=self.compute_type, cpu_threads=self.threads
+                )
+            return self._model
+
+    def transcribe(self, upload_name, audio_bytes):
+        # WAV is decoded here; anything else (flac, mp3) goes through faster-whisper's decoder
+        audio = wav_to_float32(audio_bytes) if upload_name.endswith(".wav") else BytesIO(audio_bytes)
+        segments, _ = self.model.transcribe(audio, language="en", beam_size=1, vad_filter=False)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+class STTRouter:
+    """
+    Picks a backend per utterance by length and measured latency.
+
+    Latency is tracked as a moving average per backend: seconds per audio
+    second for compute-bound engines, plain seconds for network ones. Short
+    utterances go to whichever backend is predicted to answer first; long ones
+    stay on Groq. Every explore_every-th choice goes the other way so a stale
+    estimate gets corrected, and the local engine is only picked once its model
+    is loaded (it loads in the background meanwhile), so a cold load is neither
+    waited for nor mistaken for its latency. If the chosen backend fails the
+    next one is tried, so the assistant keeps working offline.
+    """
+
+    def __init__(self, backends, mode=STT_BACKEND, local_max_seconds=LOCAL_MAX_SECONDS, explore_every=STT_EXPLORE_EVERY):
+        self.backends = {backend.name: backend for backend in backends}
+        self.mode = mode
+        self.local_max_seconds = local_max_seconds
+        self.explore_every = explore_every
+        self._latency = {}
+        self._choices = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        """Preload the backends routing may pick, ahead of the first utterance"""
+        for name, backend in self.backends.items():
+            if self.mode in ("auto", name):
+                backend.preload()
+
+    def predicted_latency(self, name, duration):
+        """Expected seconds to transcribe `duration` seconds of audio, or None if never measured"""
+        with self._lock:
+            average = self._latency.get(name)
+        if average is None:
+            return None
+        return average * duration if self.backends[name].scales_with_audio else average
+
+    def _observe(self, name, duration, elapsed):
+        sample = elapsed / duration if self.backends[name].scales_with_audio else elapsed
+        with self._lock:
+            average = self._latency.get(name)
+            self._latency[name] = sample if average is None else average + LATENCY_ALPHA * (sample - average)
+
+    def choose(self, duration):
+        """Backend names in the order they should be tried for an utterance"""
+        available = [name for name, backend in self.backends.items() if backend.available]
+        if self.mode in available:
+            return [self.mode] + [name for name in available if name != self.mode]
+        if "local" not in available or "groq" not in available:
+            return available
+
+        if duration is None or duration > self.local_max_seconds:
+            return ["groq", "local"]
+
+        if not self.backends["local"].ready:
+            self.backends["local"].preload()
+            return ["groq", "local"]
+
+        local = self.predicted_latency("local", duration)
+        remote = self.predicted_latency("groq", duration)
+        # An unmeasured backend gets tried first so it gets measured
+        if local is None:
+            return ["local", "groq"]
+        if remote is None:
+            return ["groq", "local"]
+        order = ["local", "groq"] if local <= remote else ["groq", "local"]
+        if self.explore_every and next(self._choices) % self.explore_every == 0:
+            order.reverse()
+        return order
+
+    def transcribe(self, upload_name, audio_bytes):
+        duration = wav_duration(audio_bytes)
+        order = self.choose(duration)
+        if not order:
+            raise RuntimeError("❌ No speech-to-text backend available")
+
+        for attempt, name in enumerate(order):
+            # A cancelled request doesn't fall back to another backend
+            raise_if_cancelled()
+            # A call that first loads a model says nothing about the backend's steady latency
+            warm = self.backends[name].ready
+            started = time.perf_counter()
+            try:
+                with span("transcribe", backend=name, audio_s=round(duration or 0.0, 2)):
+                    text = self.backends[name].transcribe(upload_name, audio_bytes)
+            except Exception as e:
+                if attempt == len(order) - 1:
+                    raise
+                logger.warning(f"⚠️ {name} transcription failed ({e}), falling back to {order[attempt + 1]}")
+                continue
+
+            elapsed = time.perf_counter() - started
+            if duration and warm:
+                self._observe(name, duration, elapsed)
+            record_timing(f"stt.{name}", elapsed)
+            logger.debug(f"✅ Transcribed by {name} in {elapsed:.2f}s" + (f" ({duration:.1f}s audio)" if duration else ""))
+            return text
+
+    def stats(self):
+        """Moving-average latency per backend"""
+        with self._lock:
+            return dict(self._latency)
+
+
+groq_backend = GroqBackend()
+local_backend = LocalWhisperBackend()
+stt_router = STTRouter([groq_backend, local_backend])
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level Levenshtein distance divided by the reference length"""
+    def words(text):
+        return [w.lower().strip(".,!?;:\"'") for w in text.split() if w.strip(".,!?;:\"'")]
+
+    ref, hyp = words(reference), words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def benchmark_backends(folder, backends=None):
+    """
+    Run every available backend over the WAV fixtures in `folder` and report
+    real-time factor (processing time / audio duration) and WER. Each clip's
+    reference transcript is read from a .txt file next to it, when present.
+    """
+    backends = backends or [groq_backend, local_backend]
+    paths = sorted(glob.glob(os.path.join(folder, "*.wav")))
+    if not paths:
+        raise FileNotFoundError(f"❌ No WAV fixtures in {folder}")
+
+    print(f"\n=== STT benchmark: {len(paths)} clips from {folder} ===")
+    results = {}
+    for backend in backends:
+        if not backend.available:
+            print(f"{backend.name:>6}: unavailable, skipped")
+            continue
+
+        audio_seconds = processing_seconds = 0.0
+        errors, scored = 0.0, 0
+        for path in paths:
+            with open(path, "rb") as f:
+                audio_bytes = f.read()
+            started = time.perf_counter()
+            text = backend.transcribe(os.path.basename(path), audio_bytes)
+            processing_seconds += time.perf_counter() - started
+            audio_seconds += wav_duration(audio_bytes) or 0
+
+            reference_path = os.path.splitext(path)[0] + ".txt"
+            if os.path.exists(reference_path):
+                with open(reference_path, encoding="utf-8") as f:
+                    errors += word_error_rate(f.read(), text)
+                scored += 1
+
+        results[backend.name] = {
+            "rtf": processing_seconds / audio_seconds if audio_seconds else None,
+            "wer": errors / scored if scored else None,
+            "seconds": processing_seconds,
+        }
+        rtf = results[backend.name]["rtf"]
+        wer = results[backend.name]["wer"]
+        print(
+            f"{backend.name:>6}: RTF {rtf:.3f}" if rtf is not None else f"{backend.name:>6}: RTF n/a",
+            f"| WER {wer:.1%}" if wer is not None else "| WER n/a (no .txt references)",
+            f"| {processing_seconds:.2f}s total"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_backends(sys.argv[1] if len(sys.argv) > 1 else "fixtures")
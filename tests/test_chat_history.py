@@ -0,0 +1,82 @@
+from chat_history import ChatHistory, apex_turn, user_turn
+
+
+def make_history(tmp_path, max_entries=4, max_bytes=10_000, max_spill_bytes=1_000_000):
+    return ChatHistory("session", max_entries, max_bytes, history_dir=str(tmp_path), max_spill_bytes=max_spill_bytes)
+
+
+def fill(history, turns):
+    for i in range(turns):
+        history.append(user_turn(f"q{i}"), apex_turn(f"a{i}"))
+
+
+def test_spills_past_the_entry_cap_and_reads_back_in_order(tmp_path):
+    history = make_history(tmp_path)
+    fill(history, 10)
+
+    assert len(history.recent) == 4
+    assert history.spilled == 16
+    assert [m["content"] for m in history.slice(0, 20)] == [text for i in range(10) for text in (f"q{i}", f"a{i}")]
+
+
+def test_byte_cap_spills_even_under_the_entry_cap(tmp_path):
+    history = make_history(tmp_path, max_entries=100, max_bytes=10)
+    history.append(user_turn("x" * 8), apex_turn("y" * 8))
+
+    assert [m["content"] for m in history.recent] == ["y" * 8]
+    assert history.bytes == 8
+    assert history.spilled == 1
+
+
+def test_pages_count_back_from_the_newest(tmp_path):
+    history = make_history(tmp_path)
+    fill(history, 5)
+
+    newest, pages = history.page(0, size=4)
+    assert pages == 3
+    assert [m["content"] for m in newest] == ["q3", "a3", "q4", "a4"]
+
+    oldest, _ = history.page(2, size=4)
+    assert [m["content"] for m in oldest] == ["q0", "a0"]
+
+    # Out-of-range page numbers clamp to the oldest page
+    assert history.page(99, size=4)[0] == oldest
+
+
+def test_spilled_messages_keep_line_separator_characters(tmp_path):
+    history = make_history(tmp_path, max_entries=2)
+    tricky = "line separator \u2028 paragraph \u2029 next line \x85 newline \n return \r"
+    history.append(user_turn(tricky), apex_turn("answer"))
+    history.append(user_turn("later"), apex_turn("reply"))
+
+    assert history.spilled == 2
+    assert history.slice(0, 1) == [user_turn(tricky)]
+
+
+def test_compaction_keeps_the_newer_half_within_the_disk_cap(tmp_path):
+    history = make_history(tmp_path, max_entries=2, max_spill_bytes=600)
+    fill(history, 40)
+
+    assert history.dropped > 0
+    assert history._spill_bytes <= 600
+    assert len(history) == 80 - history.dropped
+    contents = [m["content"] for m in history.slice(0, len(history))]
+    assert contents[-2:] == ["q39", "a39"]
+    assert contents == [text for i in range(40) for text in (f"q{i}", f"a{i}")][history.dropped:]
+
+
+def test_clear_removes_the_spill_file(tmp_path):
+    history = make_history(tmp_path, max_entries=2)
+    fill(history, 3)
+    assert list(tmp_path.iterdir())
+
+    history.clear()
+    assert len(history) == 0
+    assert not list(tmp_path.iterdir())
+
+
+def test_slice_entirely_within_spilled_history(tmp_path):
+    history = make_history(tmp_path, max_entries=2)
+    fill(history, 3)
+
+    assert [m["content"] for m in history.slice(1, 3)] == ["a0", "q1"]
@@ -0,0 +1,195 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from conversation import ConversationManager
+
+
+class BrokenResponseError(Exception):
+    pass
+
+
+class TextChunk(str):
+    """A streamed response chunk; genai chunks carry their text in .text"""
+
+    @property
+    def text(self):
+        return str(self)
+
+
+class FakeChat:
+    """Mimics genai's ChatSession: history can't be read while a streamed reply is unfinished"""
+
+    def __init__(self, reply_chunks):
+        self.reply_chunks = reply_chunks
+        self._history = []
+        self._last_received = None
+
+    @property
+    def history(self):
+        if self._last_received is not None and not self._last_received["done"]:
+            raise BrokenResponseError("incomplete stream")
+        if self._last_received is not None:
+            self._history = self._history + [
+                {"role": "user", "parts": [self._last_received["query"]]},
+                {"role": "model", "parts": ["".join(self._last_received["text"])]},
+            ]
+            self._last_received = None
+        return self._history
+
+    @history.setter
+    def history(self, value):
+        self._history = list(value)
+        self._last_received = None
+
+    def send_message(self, query, stream=False, **kwargs):
+        received = {"query": query, "text": [], "done": False}
+        self._last_received = received
+
+        def chunks():
+            for chunk in self.reply_chunks:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                received["text"].append(chunk)
+                yield TextChunk(chunk)
+            received["done"] = True
+        return chunks()
+
+
+class FakeModel:
+    def __init__(self, reply_chunks):
+        self.reply_chunks = reply_chunks
+
+    def start_chat(self, history=None):
+        return FakeChat(self.reply_chunks)
+
+
+def stream_turn(manager, conversation, query):
+    snapshot = manager.begin_turn(conversation)
+    finished = False
+    try:
+        with conversation.lock:
+            response = conversation.chat.send_message(query, stream=True)
+        for chunk in response:
+            yield chunk
+        manager.finish_turn(conversation, snapshot, response)
+        finished = True
+    finally:
+        if not finished:
+            manager.abort_turn(conversation, snapshot)
+
+
+def test_failed_stream_rolls_back_so_later_turns_work():
+    manager = ConversationManager(FakeModel(["Hi ", ConnectionError("reset")]))
+    conversation = manager.get("s")
+
+    with pytest.raises(ConnectionError):
+        list(stream_turn(manager, conversation, "hello"))
+
+    assert conversation.chat.history == []
+    conversation.chat.reply_chunks = ["Hi there"]
+    assert list(stream_turn(manager, conversation, "hello again")) == ["Hi there"]
+    assert [m["parts"][0] for m in conversation.chat.history] == ["hello again", "Hi there"]
+
+
+def test_abandoned_stream_does_not_hold_the_lock_and_is_rolled_back_by_the_next_turn():
+    manager = ConversationManager(FakeModel(["one ", "two"]))
+    conversation = manager.get("s")
+
+    abandoned = stream_turn(manager, conversation, "first")
+    next(abandoned)  # left suspended mid-stream, never closed
+    assert conversation.lock.acquire(blocking=False)
+    conversation.lock.release()
+
+    assert list(stream_turn(manager, conversation, "second")) == ["one ", "two"]
+    assert [m["parts"][0] for m in conversation.chat.history] == ["second", "one two"]
+
+    # The stale generator finishing later must not undo the newer turn
+    abandoned.close()
+    assert len(conversation.chat.history) == 2
+
+
+def test_record_exchange_recovers_from_an_unfinished_turn():
+    manager = ConversationManager(FakeModel(["one ", "two"]))
+    conversation = manager.get("s")
+    abandoned = stream_turn(manager, conversation, "first")
+    next(abandoned)
+
+    manager.record_exchange("s", "what is this", "a mug")
+    assert [m["parts"][0] for m in conversation.chat.history] == ["what is this", "a mug"]
+
+
+def test_ask_apex_stream_rolls_back_on_any_error(monkeypatch):
+    pytest.importorskip("google.generativeai")
+    import ai_agent
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    manager = ConversationManager(FakeModel(["Hi ", RuntimeError("boom")]))
+    monkeypatch.setattr(ai_agent, "conversations", manager)
+
+    reply = "".join(ai_agent.ask_apex_stream("hello", session_id="s"))
+    assert "boom" in reply
+    assert manager.get("s").chat.history == []
+    assert manager.get("s").pending is None
+
+
+def test_opening_text_questions_are_answered_from_the_cache(monkeypatch):
+    pytest.importorskip("google.generativeai")
+    import ai_agent
+    from response_cache import ResponseCache
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setattr(ai_agent, "response_cache", ResponseCache(db_path=None))
+    monkeypatch.setattr(ai_agent, "conversations", ConversationManager(FakeModel(["Paris"])))
+    assert "".join(ai_agent.ask_apex_stream("Capital of France?", session_id="a")) == "Apex here! 🤖 Paris"
+
+    # A new chat asking the same thing gets the answer without calling the model
+    manager = ConversationManager(FakeModel([RuntimeError("model called")]))
+    monkeypatch.setattr(ai_agent, "conversations", manager)
+    assert "".join(ai_agent.ask_apex_stream("capital of france", session_id="b")) == "Apex here! 🤖 Paris"
+    assert [m["parts"][0] for m in manager.get("b").chat.history] == ["capital of france", "Paris"]
+
+    # Once the chat has history the answer may depend on it, so the model is asked
+    assert "model called" in "".join(ai_agent.ask_apex_stream("Capital of France?", session_id="b"))
+
+
+class SlowSummarizer:
+    def __init__(self):
+        self.release = threading.Event()
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        self.release.wait(5)
+        return type("Response", (), {"text": "they talked about mugs"})()
+
+
+def test_summary_is_written_off_the_answer_path_and_applied_between_turns(monkeypatch):
+    import rate_limiter
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setitem(rate_limiter.PROVIDER_LIMITS, "gemini", {"rpm": 0, "tpm": 0})
+
+    summarizer = SlowSummarizer()
+    manager = ConversationManager(FakeModel(["word " * 20]), summarizer_model=summarizer, token_budget=50, keep_recent=2)
+    conversation = manager.get("s")
+    for i in range(3):
+        # Returns while the summarizer is still busy
+        list(stream_turn(manager, conversation, f"question {i}"))
+    assert conversation.summarizing
+    assert len(summarizer.prompts) == 1
+    assert len(conversation.chat.history) == 6
+
+    summarizer.release.set()
+    for _ in range(100):
+        if not conversation.summarizing:
+            break
+        time.sleep(0.01)
+
+    history = conversation.chat.history
+    assert conversation.summary == "they talked about mugs"
+    assert history[0]["parts"][0].startswith("Summary of our earlier conversation")
+    # The summary started after the second turn folded the first; later turns stay verbatim
+    assert [m["parts"][0] for m in history[2::2]] == ["question 1", "question 2"]
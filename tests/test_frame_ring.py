@@ -0,0 +1,65 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from frame_ring import FrameRingBuffer
+from session_state import SessionState
+
+
+def frame(value, shape=(2, 3, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_read_latest_returns_the_newest_frame():
+    ring = FrameRingBuffer((2, 3, 3), slots=3)
+    assert ring.read_latest() is None
+
+    ring.write(frame(1))
+    ring.write(frame(2))
+    view = ring.read_latest()
+    assert view.seq == 2
+    assert (view.array == 2).all()
+
+
+def test_wraparound_invalidates_old_views_and_counts_drops():
+    ring = FrameRingBuffer((2, 3, 3), slots=3)
+    ring.write(frame(1))
+    view = ring.read_latest()
+
+    for value in range(2, 6):
+        ring.write(frame(value))
+
+    assert not view.still_valid()
+    assert (ring.read_latest().array == 5).all()
+    # Frame 2 was overwritten before anyone read it (frame 1 had been read, 3 is still in the ring)
+    assert ring.stats()["dropped"] == 1
+
+
+def test_read_next_reports_skipped_frames():
+    ring = FrameRingBuffer((2, 3, 3), slots=2)
+    for value in range(1, 6):
+        ring.write(frame(value))
+
+    view, skipped = ring.read_next(0)
+    assert view.seq == 4
+    assert skipped == 3
+    assert ring.read_next(5) == (None, 0)
+
+
+def test_views_are_read_only():
+    ring = FrameRingBuffer((2, 3, 3), slots=2)
+    ring.write(frame(1))
+    with pytest.raises(ValueError):
+        ring.read_latest().array[0, 0, 0] = 9
+
+
+def test_session_latest_frame_is_detached_from_the_ring():
+    session = SessionState("frames")
+    session.frames = FrameRingBuffer((2, 3, 3), slots=2)
+    session.frames.write(frame(1))
+
+    latest = session.latest_frame
+    for value in range(2, 5):
+        session.frames.write(frame(value))
+
+    assert (latest == 1).all()
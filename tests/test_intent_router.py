@@ -0,0 +1,69 @@
+import pytest
+
+from intent_router import HELD_OUT_QUERIES, LABELED_QUERIES, SCENE, TEXT, VISION, IntentRouter, evaluate, score
+
+
+def test_routes_looks_follow_ups_and_chat():
+    router = IntentRouter()
+    assert router.classify("What am I holding?") == VISION
+    assert router.classify("What color was it?") == SCENE
+    assert router.classify("Tell me a joke") == TEXT
+    assert router.stats() == {TEXT: 1, VISION: 1, SCENE: 1}
+
+
+def test_longest_phrase_wins_over_its_words():
+    router = IntentRouter()
+    # "look up" consumes "look", so the query isn't a look
+    assert [phrase for phrase, _, _ in router.matches("can you look up flights")] == ["look up"]
+    assert router.classify("Can you look up the news?") == TEXT
+    assert router.classify("I'm looking forward to it") == TEXT
+
+
+def test_contractions_are_normalized():
+    router = IntentRouter()
+    assert router.classify("whats this") == router.classify("what's this") == VISION
+
+
+def test_scene_routes_count_as_uploads():
+    report = score([("What color was it?", SCENE), ("Tell me a joke", TEXT)])
+    assert report["uploads"] == 1
+    assert report["accuracy"] == 1.0
+
+
+def test_evaluate_reports_the_held_out_set_separately():
+    report = evaluate(upload_bytes=1000)
+    assert report["tuning"]["queries"] == len(LABELED_QUERIES)
+    assert report["held_out"]["queries"] == len(HELD_OUT_QUERIES)
+    assert not {query for query, _ in HELD_OUT_QUERIES} & {query for query, _ in LABELED_QUERIES}
+
+
+@pytest.mark.parametrize("query, intent", [
+    # Deictic questions and read requests
+    ("What fruit is this?", VISION),
+    ("Tell me what this is", VISION),
+    ("What's written on this mug?", VISION),
+    ("Can you read the title of this book?", VISION),
+    ("Does this shirt go with these pants?", VISION),
+    ("Can you tell what I've got here?", VISION),
+    # Follow-ups that refer back to the scene
+    ("What color were they?", SCENE),
+    ("Is it plugged in?", SCENE),
+    ("What else was on the desk?", SCENE),
+    ("You said it was red, are you sure?", SCENE),
+    ("Was anyone else there?", SCENE),
+    # The camera as a subject, not a request to look
+    ("Tell me about the history of the camera", TEXT),
+    ("Explain how a camera sensor works", TEXT),
+])
+def test_held_out_misses(query, intent):
+    assert IntentRouter().classify(query) == intent
+
+
+def test_weak_visual_evidence_still_gets_a_look():
+    router = IntentRouter()
+    # Two weak cues fall short of the threshold but within the margin
+    assert sum(weight for _, _, weight in router.matches("describe what kind of plant")) < router.vision_threshold
+    assert router.classify("describe what kind of plant") == VISION
+    assert IntentRouter(vision_margin=0).classify("describe what kind of plant") == TEXT
+    # A single weak cue doesn't
+    assert router.classify("Describe the plot of Hamlet") == TEXT
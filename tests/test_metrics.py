@@ -0,0 +1,34 @@
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_counts_and_levels_stay_out_of_the_latency_store():
+    metrics.increment("conversation.prompt_tokens_saved", 120)
+    metrics.increment("conversation.prompt_tokens_saved", 30)
+    metrics.set_gauge("playback.queue_depth", 2)
+
+    assert metrics.counter_value("conversation.prompt_tokens_saved") == 150
+    assert metrics.gauge_value("playback.queue_depth") == 2
+    assert metrics.timing_names() == []
+
+
+def test_prometheus_text_exports_histograms_counters_and_gauges():
+    metrics.observe("time_to_first_audio.streaming", 0.3)
+    metrics.increment("conversation.prompt_tokens_saved", 150)
+    metrics.set_gauge("playback.queue_depth", 2)
+
+    text = metrics.prometheus_text()
+
+    assert "# TYPE apex_time_to_first_audio_seconds histogram" in text
+    assert 'apex_time_to_first_audio_seconds_count{name="streaming"} 1' in text
+    assert "# TYPE apex_conversation_total counter" in text
+    assert 'apex_conversation_total{name="prompt_tokens_saved"} 150' in text
+    assert 'apex_playback{name="queue_depth"} 2' in text
@@ -0,0 +1,30 @@
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("speech_recognition")
+
+from speech_to_txt import MicrophoneArbiter
+
+
+def test_capture_waits_for_the_listener_to_close_its_stream():
+    arbiter = MicrophoneArbiter(handover_timeout=2)
+    arbiter.background_opened()
+    events = []
+
+    def listener():
+        while not arbiter.wanted:
+            pass
+        events.append("listener closed")
+        arbiter.background_closed()
+        arbiter.background_opened()  # blocks until the capture is done
+        events.append("listener reopened")
+
+    thread = threading.Thread(target=listener)
+    thread.start()
+    with arbiter.capture():
+        events.append("capturing")
+    thread.join(2)
+
+    assert events == ["listener closed", "capturing", "listener reopened"]
@@ -0,0 +1,81 @@
+import queue
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from playback import PlaybackEngine
+from scheduler import CancelToken, _current_token
+
+
+class NoMixerEngine(PlaybackEngine):
+    def _open_mixer(self):
+        raise RuntimeError("no audio device")
+
+
+def finished_chunks(*chunks):
+    chunks_queue = queue.Queue()
+    for chunk in chunks + (None,):
+        chunks_queue.put(chunk)
+    return chunks_queue
+
+
+def test_mixer_failure_fails_utterances_instead_of_hanging():
+    engine = NoMixerEngine().start()
+    assert isinstance(engine.init_error, RuntimeError)
+
+    utterance = engine.enqueue(finished_chunks(b"audio"))
+    assert utterance.done.is_set()
+    assert utterance.wait(timeout=0) is False
+    assert engine.queue_depth == 0
+
+
+def test_stop_after_mixer_failure_returns_at_once():
+    engine = NoMixerEngine().start()
+    assert engine.stop(wait=True, timeout=0.05) is True
+
+
+class SilentEngine(PlaybackEngine):
+    """Plays nothing: an utterance 'plays' until released or stopped"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def _open_mixer(self):
+        pass
+
+    def _silence(self):
+        pass
+
+    def _play(self, utterance):
+        utterance.started()
+        while not self.release.is_set():
+            if self._tick(utterance):
+                return False
+        return True
+
+
+def enqueue_for(engine, session_id, started=None):
+    context_token = _current_token.set(CancelToken(session_id))
+    try:
+        return engine.enqueue(finished_chunks(b"audio"), on_start=started)
+    finally:
+        _current_token.reset(context_token)
+
+
+def test_stop_session_leaves_other_sessions_playing():
+    engine = SilentEngine().start()
+    playing = threading.Event()
+    first = enqueue_for(engine, "a", started=playing.set)
+    other = enqueue_for(engine, "b")
+    queued = enqueue_for(engine, "a")
+    assert playing.wait(1)
+
+    assert engine.stop_session("a") is True
+    assert first.done.is_set() and not first.played
+    assert queued.wait(1) is False
+
+    engine.release.set()
+    assert other.wait(1) is True
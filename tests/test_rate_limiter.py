@@ -0,0 +1,142 @@
+import threading
+import time
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, TokenBucket, backoff_delay, call_with_retry
+from scheduler import CancelToken, RequestCancelled, _current_token
+
+
+class Unavailable(Exception):
+    status_code = 503
+
+
+@pytest.fixture
+def as_request():
+    """Run the test body as a request holding a fresh cancel token"""
+    token = CancelToken("session")
+    context_token = _current_token.set(token)
+    yield token
+    _current_token.reset(context_token)
+
+
+@pytest.fixture(autouse=True)
+def no_limits(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setitem(rate_limiter.PROVIDER_LIMITS, "test", {"rpm": 0, "tpm": 0})
+
+
+def test_backoff_sleep_wakes_up_on_cancel(as_request, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "backoff_delay", lambda attempt: 30.0)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        raise Unavailable()
+
+    threading.Timer(0.05, as_request.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(RequestCancelled):
+        call_with_retry("test", "model", flaky)
+    assert time.monotonic() - started < 5
+    assert len(calls) == 1
+
+
+def test_cancelled_while_queued_on_the_limiter_never_calls(as_request, monkeypatch):
+    limiter = RateLimiter("test.model", rpm=1)
+    limiter.acquire()  # the only request this minute
+    monkeypatch.setitem(rate_limiter._limiters, "test.model", limiter)
+
+    threading.Timer(0.05, as_request.cancel).start()
+    with pytest.raises(RequestCancelled):
+        call_with_retry("test", "model", lambda: pytest.fail("called after cancel"))
+    assert not limiter._waiting
+
+
+def test_cancel_during_acquire_is_checked_before_calling(as_request, monkeypatch):
+    class CancellingLimiter(RateLimiter):
+        def acquire(self, tokens=1, token=None):
+            as_request.cancel()  # cancelled just as the quota came through
+            return 0.0
+
+    monkeypatch.setitem(rate_limiter._limiters, "test.model", CancellingLimiter("test.model"))
+    with pytest.raises(RequestCancelled):
+        call_with_retry("test", "model", lambda: pytest.fail("called after cancel"))
+
+
+def test_bucket_refills_at_its_per_minute_rate():
+    bucket = TokenBucket(60)  # one token a second
+    now = bucket.updated
+    bucket.consume(60)
+
+    assert bucket.time_until(1, now) == pytest.approx(1.0)
+    assert bucket.time_until(1, now + 0.5) == pytest.approx(0.5)
+    # Refill stops at capacity, however long the bucket sat idle
+    assert bucket.time_until(60, now + 600) == 0.0
+    assert bucket.tokens == 60
+
+
+def test_request_bigger_than_the_bucket_waits_for_a_full_bucket():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    bucket.consume(30)
+
+    assert bucket.time_until(500, now) == pytest.approx(30.0)
+    bucket.time_until(500, now + 30)
+    bucket.consume(500)
+    assert bucket.tokens == pytest.approx(0.0)
+
+
+def test_backoff_grows_exponentially_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(rate_limiter.random, "uniform", lambda low, high: high)
+
+    assert [backoff_delay(attempt, base=1.0, cap=5.0) for attempt in range(5)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+def test_transient_errors_are_retried_until_the_call_succeeds(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "backoff_delay", lambda attempt: 0.0)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Unavailable()
+        return "ok"
+
+    assert call_with_retry("test", "model", flaky) == "ok"
+    assert len(attempts) == 3
+
+
+def test_rate_limited_call_pauses_the_shared_limiter():
+    class TooManyRequests(Exception):
+        status_code = 429
+        response = type("Response", (), {"headers": {"retry-after": "0.05"}})()
+
+    attempts = []
+
+    def limited():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise TooManyRequests()
+        return "ok"
+
+    assert call_with_retry("test", "model", limited) == "ok"
+    # The retry waited out the server's retry-after on the limiter
+    assert attempts[1] - attempts[0] >= 0.05
+    assert rate_limiter.get_limiter("test", "model").paused_until >= attempts[0] + 0.05
+
+
+def test_fatal_errors_are_not_retried():
+    class BadRequest(Exception):
+        status_code = 400
+
+    attempts = []
+
+    def broken():
+        attempts.append(1)
+        raise BadRequest()
+
+    with pytest.raises(BadRequest):
+        call_with_retry("test", "model", broken)
+    assert len(attempts) == 1
@@ -0,0 +1,62 @@
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, make_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() for the cache module"""
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_trivial_rewordings_share_a_key():
+    assert make_key("What's in my hand?") == make_key("  what's in my HAND ")
+    assert make_key("What's in my hand?", frame_hash=1) != make_key("What's in my hand?", frame_hash=2)
+
+
+def test_least_recently_used_entry_is_evicted_first(clock):
+    cache = ResponseCache(max_entries=2, db_path=None)
+    cache.put("a", "answer a")
+    cache.put("b", "answer b")
+    cache.get("a")  # a is now the most recently used
+    cache.put("c", "answer c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "answer a"
+    assert cache.get("c") == "answer c"
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResponseCache(ttl=60, db_path=None)
+    cache.put("a", "answer a", latency=1.5)
+    clock[0] += 59
+    assert cache.get("a") == "answer a"
+    clock[0] += 2
+
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert cache.latency_saved == 1.5
+
+
+def test_empty_answers_are_not_cached(clock):
+    cache = ResponseCache(db_path=None)
+    cache.put("a", "")
+    assert cache.get("a") is None
+
+
+def test_sqlite_tier_survives_a_restart_with_the_same_bounds(clock, tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(max_entries=2, ttl=60, db_path=path)
+    for key in ("a", "b", "c"):
+        clock[0] += 1
+        cache.put(key, f"answer {key}")
+
+    restarted = ResponseCache(max_entries=2, ttl=60, db_path=path)
+    assert restarted.get("a") is None
+    assert restarted.get("c") == "answer c"
+    clock[0] += 120
+    assert restarted.get("b") is None
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+from scheduler import RequestScheduler, current_token, request_key
+
+
+class Session:
+    def __init__(self, session_id="session"):
+        self.session_id = session_id
+        self.in_flight = None
+
+
+def cancelled(token):
+    return f"cancelled: {token.reason}"
+
+
+def wait_until(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_identical_requests_are_answered_once():
+    scheduler = RequestScheduler()
+    session = Session()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def work(token):
+        calls.append(token)
+        release.wait(2)
+        return "answer"
+
+    def ask():
+        results.append(scheduler.run_sync(session, "text", request_key("frame", "What's this?"), work, cancelled))
+
+    first = threading.Thread(target=ask)
+    first.start()
+    wait_until(lambda: session.in_flight is not None)
+    second = threading.Thread(target=ask)
+    second.start()
+    wait_until(lambda: scheduler.coalesced)
+    release.set()
+    first.join(2)
+    second.join(2)
+
+    assert results == ["answer", "answer"]
+    assert len(calls) == 1
+    assert session.in_flight is None
+
+
+def test_a_new_request_supersedes_the_one_in_flight():
+    scheduler = RequestScheduler()
+    session = Session()
+    started = threading.Event()
+    order = []
+    results = {}
+
+    def slow(token):
+        started.set()
+        token.wait(2)
+        order.append("first stopped")
+        return "first answer"
+
+    def fast(token):
+        order.append("second started")
+        # The work sees its own token as the request's current token
+        return "second answer" if current_token() is token else "wrong token"
+
+    first = threading.Thread(target=lambda: results.update(first=scheduler.run_sync(session, "text", request_key("frame", "one"), slow, cancelled)))
+    first.start()
+    started.wait(2)
+    results["second"] = scheduler.run_sync(session, "text", request_key("frame", "two"), fast, cancelled)
+    first.join(2)
+
+    assert results == {"first": "cancelled: superseded", "second": "second answer"}
+    assert order == ["first stopped", "second started"]
+    assert scheduler.stats()["superseded"] == 1
+
+
+def test_cancel_ends_a_stream_with_the_cancel_update():
+    scheduler = RequestScheduler()
+    session = Session()
+
+    async def work(token):
+        yield "listening"
+        scheduler.cancel(session.session_id, "cleared")
+        yield "answer nobody wants"
+
+    async def run():
+        return [update async for update in scheduler.stream(session, "voice", request_key("voice"), work, cancelled)]
+
+    assert asyncio.run(run()) == ["listening", "cancelled: cleared"]
+    assert scheduler.stats()["cancelled"] == 1
+
+
+def test_a_stream_nobody_listens_to_is_cancelled():
+    scheduler = RequestScheduler()
+    session = Session()
+    tokens = []
+
+    async def work(token):
+        tokens.append(token)
+        yield "first"
+        yield "second"
+
+    async def run():
+        updates = scheduler.stream(session, "voice", request_key("voice"), work, cancelled)
+        assert await updates.__anext__() == "first"
+        await updates.aclose()
+
+    asyncio.run(run())
+    assert tokens[0].reason == "abandoned"
+    assert session.in_flight is None
@@ -0,0 +1,116 @@
+import wave
+from io import BytesIO
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("dotenv")
+
+from stt_backends import STTBackend, STTRouter, wav_to_float32
+
+
+class FakeBackend(STTBackend):
+    def __init__(self, name, scales_with_audio=False, ready=True):
+        self.name = name
+        self.scales_with_audio = scales_with_audio
+        self._ready = ready
+        self.preloads = 0
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def preload(self):
+        self.preloads += 1
+
+    def transcribe(self, upload_name, audio_bytes):
+        self._ready = True  # the first call loaded the model
+        return self.name
+
+
+def silent_wav(seconds):
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(bytes(int(16000 * seconds) * 2))
+    return buffer.getvalue()
+
+
+def make_router(explore_every=0, local_ready=True):
+    local = FakeBackend("local", scales_with_audio=True, ready=local_ready)
+    return STTRouter([FakeBackend("groq"), local], mode="auto", explore_every=explore_every), local
+
+
+def test_backends_must_implement_transcribe():
+    class Incomplete(STTBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_picks_the_faster_backend_for_short_audio():
+    router, _ = make_router()
+    router._observe("local", 2.0, 0.4)  # 0.2 s per audio second
+    router._observe("groq", 2.0, 0.6)
+
+    assert router.choose(2.0) == ["local", "groq"]
+    assert router.choose(5.0) == ["groq", "local"]  # 1.0 s locally vs 0.6 s remote
+    assert router.choose(30.0) == ["groq", "local"]  # past local_max_seconds
+
+
+def test_explores_the_slower_backend_periodically():
+    router, _ = make_router(explore_every=3)
+    router._observe("local", 2.0, 0.4)
+    router._observe("groq", 2.0, 0.6)
+
+    firsts = [router.choose(2.0)[0] for _ in range(6)]
+    assert firsts == ["local", "local", "groq", "local", "local", "groq"]
+
+
+def test_cold_local_model_is_preloaded_and_not_measured():
+    router, local = make_router(local_ready=False)
+    assert router.choose(2.0) == ["groq", "local"]
+    assert local.preloads == 1
+
+    router.mode = "local"
+    router.transcribe("clip.wav", silent_wav(1.0))  # loads the model
+    assert "local" not in router.stats()
+    router.transcribe("clip.wav", silent_wav(1.0))
+    assert "local" in router.stats()
+
+
+def wav(samples, channels=1, rate=16000):
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(channels)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def test_wav_is_downmixed_and_resampled_for_whisper():
+    # One second of 44.1 kHz stereo: left at half scale, right silent
+    stereo = np.zeros((44100, 2), dtype=np.int16)
+    stereo[:, 0] = 16384
+
+    samples = wav_to_float32(wav(stereo.reshape(-1), channels=2, rate=44100))
+
+    assert samples.dtype == np.float32
+    assert len(samples) == 16000
+    assert np.allclose(samples, 0.25)
+
+
+def test_unsupported_wav_sample_width_is_rejected():
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(3)
+        out.setframerate(16000)
+        out.writeframes(bytes(300))
+
+    with pytest.raises(ValueError, match="24-bit"):
+        wav_to_float32(buffer.getvalue())
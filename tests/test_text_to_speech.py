@@ -0,0 +1,60 @@
+import threading
+import time
+
+import rate_limiter
+import text_to_speech
+from tts_cache import AudioCache
+
+
+class FakeBackend:
+    name = "fake"
+    voice = "fake"
+    audio_format = "pcm"
+    sample_rate = 16000
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.active = 0
+        self.most_active = 0
+        self.lock = threading.Lock()
+
+    def stream(self, text, lang="en"):
+        with self.lock:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("reset")
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        yield text.encode()
+
+
+def drain(chunks):
+    parts = []
+    while (part := chunks.get(timeout=2)) is not None:
+        parts.append(part)
+    return b"".join(parts)
+
+
+def use_backend(monkeypatch, tmp_path, backend):
+    monkeypatch.setattr(text_to_speech, "tts_backend", backend)
+    monkeypatch.setattr(text_to_speech, "audio_cache", AudioCache(cache_dir=str(tmp_path)))
+
+
+def test_a_long_answer_is_synthesized_a_few_phrases_at_a_time(monkeypatch, tmp_path):
+    backend = FakeBackend()
+    use_backend(monkeypatch, tmp_path, backend)
+
+    queues = [text_to_speech.synthesize_stream(f"Sentence {number}.") for number in range(8)]
+
+    assert [drain(chunks) for chunks in queues] == [f"Sentence {number}.".encode() for number in range(8)]
+    assert backend.most_active <= text_to_speech.TTS_WORKERS
+
+
+def test_a_dropped_connection_is_retried(monkeypatch, tmp_path):
+    use_backend(monkeypatch, tmp_path, FakeBackend(failures=1))
+    monkeypatch.setattr(rate_limiter, "backoff_delay", lambda attempt: 0)
+
+    assert text_to_speech.synthesize_segment("Apex here!") == b"Apex here!"
@@ -0,0 +1,37 @@
+import os
+
+from tts_cache import AudioCache
+
+
+def test_entries_are_named_after_their_audio_format(tmp_path):
+    cache = AudioCache(cache_dir=str(tmp_path))
+    cache.put("Apex here!", b"mp3 bytes", voice="gtts", audio_format="mp3")
+    cache.put("Apex here!", b"pcm bytes", voice="piper", audio_format="pcm")
+
+    assert sorted(name.rpartition(".")[2] for name in os.listdir(tmp_path)) == ["mp3", "pcm"]
+    assert cache.get("Apex here!", voice="piper", audio_format="pcm") == b"pcm bytes"
+
+    # A new process picks up entries of every format
+    reloaded = AudioCache(cache_dir=str(tmp_path))
+    assert reloaded.stats()["phrases"] == 2
+    assert reloaded.get("Apex here!", voice="gtts", audio_format="mp3") == b"mp3 bytes"
+
+
+def test_use_counts_are_dropped_with_their_entries(tmp_path):
+    cache = AudioCache(cache_dir=str(tmp_path), max_bytes=10, memory_max_bytes=10)
+    for number in range(5):
+        cache.put(f"phrase {number}", b"12345678", audio_format="pcm")
+    # Larger than the whole cache: written and evicted right away
+    cache.put("long phrase", b"x" * 20, audio_format="pcm")
+
+    assert cache.stats()["phrases"] == 0
+    assert cache._uses == {}
+
+
+def test_phrases_heard_twice_move_to_memory(tmp_path):
+    cache = AudioCache(cache_dir=str(tmp_path))
+    cache.put("Apex here!", b"audio", audio_format="pcm")
+    assert cache.get("Apex here!", audio_format="pcm") == b"audio"
+
+    assert cache.stats()["memory_bytes"] == len(b"audio")
+    assert cache._uses == {}
@@ -0,0 +1,65 @@
+import pytest
+
+from tts_text import normalize_for_speech
+
+
+def test_plain_prose_only_has_its_whitespace_collapsed():
+    assert normalize_for_speech("  Apex here!  I can see\na desk. ") == "Apex here! I can see a desk."
+
+
+def test_identifiers_keep_their_underscores():
+    assert normalize_for_speech("Set snake_case_var to 3.") == "Set snake_case_var to three."
+
+
+def test_only_paired_delimiters_are_emphasis():
+    assert normalize_for_speech("Use C++ and x*y.") == "Use C++ and x*y."
+    assert normalize_for_speech("**Bold**, *it*, ~~old~~ and 2 * 3") == "Bold, it, old and two * three"
+
+
+def test_underscore_emphasis_is_dropped():
+    assert normalize_for_speech("It's _really_ good | yes") == "It's really good yes"
+
+
+@pytest.mark.parametrize("text, spoken", [
+    ("Visit https://example.com/docs.", "Visit example dot com."),
+    ("(see https://www.example.com/report?id=42)", "(see example dot com)"),
+    ("Try www.python.org, then", "Try python dot org, then"),
+])
+def test_urls_are_read_as_hosts_and_keep_the_punctuation_after_them(text, spoken):
+    assert normalize_for_speech(text) == spoken
+
+
+def test_links_are_read_as_their_text():
+    assert normalize_for_speech("Read [the guide](https://docs.example.org/guide) & ![a cat](cat.png)") == "Read the guide and a cat"
+
+
+def test_emoji_and_inline_markdown_are_removed():
+    text = "✅ **Delhi** is the capital 😉 of India 🇮🇳 - try `apex --help` 🚀✨"
+    assert normalize_for_speech(text) == "Delhi is the capital of India - try apex --help"
+
+
+def test_non_emoji_unicode_is_kept():
+    assert normalize_for_speech("日本語 𝒳 — “quoted”") == "日本語 𝒳 — “quoted”"
+
+
+def test_block_markers_are_dropped_only_at_line_start():
+    text = "## Summary\n- one\n  * two\n1. three\n> four\nI have 3. Then 2 - 1 = 1"
+    assert normalize_for_speech(text) == "Summary one two three four I have three. Then two - one = one"
+
+
+@pytest.mark.parametrize("text, spoken", [
+    ("3 apples", "three apples"),
+    ("2.5 liters", "two point five liters"),
+    ("the 1st, 2nd, 23rd and 112th", "the first, second, twenty-third and one hundred twelfth"),
+    ("about 33,800,000 people", "about thirty-three million eight hundred thousand people"),
+    ("prices rose 7.5%", "prices rose seven point five percent"),
+    ("It was 42°C, then -5°F", "It was forty-two degrees Celsius, then minus five degrees Fahrenheit"),
+    ("Tickets cost $1,250.50", "Tickets cost one thousand two hundred fifty dollars and fifty cents"),
+    ("€20, $1 and $0.99", "twenty euros, one dollar and ninety-nine cents"),
+    ("Range 1–2 and 3 – 4", "Range one to two and three to four"),
+    ("code 0042", "code zero zero four two"),
+    # Version strings, times and identifiers are left for the TTS engine
+    ("v1.2.3 at 10:30 on COVID-19 in 3D", "v1.2.3 at 10:30 on COVID-nineteen in 3D"),
+])
+def test_numbers_are_expanded(text, spoken):
+    assert normalize_for_speech(text) == spoken
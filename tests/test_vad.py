@@ -0,0 +1,70 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from vad import EnergyVAD, UtteranceSegmenter, merge_transcripts, FRAME_MS, SAMPLE_RATE
+
+FRAME = SAMPLE_RATE * FRAME_MS // 1000
+
+
+def audio(*parts):
+    """int16 samples from (milliseconds, amplitude) parts: quiet noise or a loud tone"""
+    rng = np.random.default_rng(0)
+    chunks = []
+    for ms, amplitude in parts:
+        n = SAMPLE_RATE * ms // 1000
+        if amplitude:
+            chunks.append(amplitude * np.sin(np.arange(n) * 2 * np.pi * 220 / SAMPLE_RATE))
+        else:
+            chunks.append(rng.normal(0, 30, n))
+    return np.concatenate(chunks).astype(np.int16)
+
+
+def test_loud_frames_are_speech_and_quiet_ones_feed_the_noise_floor():
+    vad = EnergyVAD()
+    decisions = vad.classify(audio((300, 0), (300, 8000)))
+
+    assert not decisions[:10].any()
+    assert decisions[10:].all()
+    floor = vad.noise_floor_db
+    # The floor persists, so the next command needs no calibration
+    assert vad.classify(audio((90, 0))).tolist() == [False, False, False]
+    assert vad.noise_floor_db == pytest.approx(floor, abs=1)
+
+
+def test_utterance_gets_pre_roll_and_ends_after_the_hangover():
+    vad = EnergyVAD()
+    segmenter = UtteranceSegmenter(vad, hangover_ms=300, pre_roll_ms=90)
+    samples = audio((600, 0), (600, 8000), (600, 0))
+
+    ended = False
+    for start in range(0, len(samples), FRAME):
+        ended = segmenter.feed(samples[start:start + FRAME])
+        if ended:
+            break
+
+    assert ended
+    # 600 ms of speech plus 90 ms of pre-roll, cut right after the last loud frame
+    assert segmenter.utterance_frames() == (600 + 90) // FRAME_MS
+    assert len(segmenter.utterance_samples()) == segmenter.utterance_frames() * FRAME
+
+
+def test_a_click_does_not_start_an_utterance():
+    segmenter = UtteranceSegmenter(EnergyVAD(), min_speech_frames=3)
+    segmenter.feed(audio((300, 0), (30, 8000), (300, 0)))
+
+    assert not segmenter.started
+    assert len(segmenter.utterance_samples()) == 0
+
+
+def test_partial_frames_are_kept_for_the_next_feed():
+    segmenter = UtteranceSegmenter(EnergyVAD())
+    segmenter.feed(audio((45, 0)))
+    assert len(segmenter.frames) == 1
+    segmenter.feed(audio((15, 0)))
+    assert len(segmenter.frames) == 2
+
+
+def test_merge_transcripts_drops_words_repeated_in_the_overlap():
+    parts = ["what is the capital of", "capital of France, and", "and how big is it"]
+    assert merge_transcripts(parts) == "what is the capital of France, and how big is it"
@@ -1,294 +1,258 @@
-from gtts import gTTS
 import os
-import subprocess
-import platform
-from dotenv import load_dotenv
-import tempfile
-import pygame
 import time
-import uuid
-from threading import Lock, Event
-import threading
 import re
+import queue
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from tts_cache import AudioCache
+from tts_backends import get_tts_backend
+from tts_text import normalize_for_speech
+from playback import playback_engine, PRIORITY_NORMAL
+from rate_limiter import call_with_retry
+from scheduler import RequestCancelled, current_token, is_cancelled
+from tracing import span, wrap
 
-
-# Initialize pygame mixer for audio playback
-pygame.mixer.init()
+logger = logging.getLogger(__name__)
 
 
 # Global controls
-file_lock = Lock()
-stop_audio_event = Event()
-current_audio_thread = None
+audio_cache = AudioCache()  # Content-addressed cache of synthesized phrases
+tts_backend = get_tts_backend()  # gTTS, ElevenLabs (streaming PCM) or Piper (local PCM)
+
+# Sentence boundaries used to cut streamed responses into speakable pieces
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n+')
+
+# Phrases are synthesized in order on a small shared pool, so a long answer keeps a
+# sentence or two ahead of playback instead of opening a connection per sentence
+TTS_WORKERS = int(os.getenv("APEX_TTS_WORKERS", "2"))
+_synthesis_pool = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="apex-tts")
 
 
 def clean_text_for_tts(text):
-    """Remove emojis and clean text for better TTS output"""
-    # Remove emojis using regex
-    emoji_pattern = re.compile("["
-        "\U0001F600-\U0001F64F"  # emoticons
-        "\U0001F300-\U0001F5FF"  # symbols & pictographs
-        "\U0001F680-\U0001F6FF"  # transport & map symbols
-        "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-        "\U00002702-\U000027B0"
-        "\U000024C2-\U0001F251"
-        "\U00002500-\U00002BEF"  # chinese char
-        "\U00002702-\U000027B0"
-        "\U00002702-\U000027B0"
-        "\U000024C2-\U0001F251"
-        "\U0001f926-\U0001f937"
-        "\U00010000-\U0010ffff"
-        "\u2640-\u2642" 
-        "\u2600-\u2B55"
-        "\u200d"
-        "\u23cf"
-        "\u23e9"
-        "\u231a"
-        "\ufe0f"  # dingbats
-        "\u3030"
-        "]+", flags=re.UNICODE)
-    
-    # Remove emojis
-    cleaned_text = emoji_pattern.sub('', text)
-    
-    # Clean up extra spaces and newlines
-    cleaned_text = ' '.join(cleaned_text.split())
-    
-    # Remove common emoji-like symbols that might be missed
-    symbols_to_remove = ['✅', '❌', '🔧', '🎯', '📋', '💡', '⚠️', '🔍', 
-                        '🚀', '🎉', '😊', '😉', '🔊', '🔇', '🗑️', '🧪', 
-                        '🔄', '🔑', '✨', '🎊', '💻', '📱', '🖥️']
-    
-    for symbol in symbols_to_remove:
-        cleaned_text = cleaned_text.replace(symbol, '')
-    
-    # Final cleanup
-    cleaned_text = cleaned_text.strip()
-    
-    print(f"🧹 Original text: {text[:50]}...")
-    print(f"🧹 Cleaned text: {cleaned_text[:50]}...")
-    
-    return cleaned_text
+    """Normalize a response for speech: emoji and markdown removed, URLs and numbers expanded"""
+    return normalize_for_speech(text)
 
 
 def stop_all_audio():
-    """Stop all currently playing audio"""
-    global stop_audio_event
-    
+    """Stop all currently playing audio and drop anything queued"""
     try:
-        print("🔇 Stopping all audio...")
-        
-        # Signal all audio threads to stop
-        stop_audio_event.set()
+        logger.debug("🔇 Stopping all audio...")
         
-        # Stop pygame mixer
-        if pygame.mixer.get_init():
-            pygame.mixer.music.stop()
-            pygame.mixer.music.unload()
+        # The playback engine confirms once the mixer is silent - no fixed sleep
+        playback_engine.stop()
         
-        # Clear the stop event for future use
-        time.sleep(0.1)  # Brief pause to ensure stop takes effect
-        stop_audio_event.clear()
-        
-        print("✅ All audio stopped")
+        logger.debug("✅ All audio stopped")
         return True
         
     except Exception as e:
-        print(f"❌ Error stopping audio: {e}")
+        logger.error(f"❌ Error stopping audio: {e}")
         return False
 
 
-def speak_text(text, output_path=None):
-    """TTS using Google Text-to-Speech with emoji cleaning and stop control"""
-    global current_audio_thread
+def stop_session_audio(session_id=None):
+    """
+    Stop one session's audio (by default that of the calling request's session) and
+    leave other sessions playing; without a session, stops everything.
+    """
+    if session_id is None:
+        token = current_token()
+        session_id = token.session_id if token is not None else None
+    if session_id is None:
+        return stop_all_audio()
+    try:
+        return playback_engine.stop_session(session_id)
+    except Exception as e:
+        logger.error(f"❌ Error stopping audio: {e}")
+        return False
+
+
+def backend_stream(text, lang='en'):
+    """
+    The backend's audio chunks for a phrase. Opening the stream (up to its first chunk)
+    goes through the provider's rate limiter and is retried like the other provider calls.
+    """
+    def open_stream():
+        stream = tts_backend.stream(text, lang)
+        return next(stream, None), stream
+    
+    first, stream = call_with_retry(tts_backend.name, tts_backend.voice, open_stream)
+    with closing(stream):
+        if first is None:
+            return
+        yield first
+        yield from stream
+
+
+def synthesize_segment(text, lang='en'):
+    """Complete audio for a cleaned phrase, served from the audio cache when it was spoken before"""
+    data = audio_cache.get(text, lang, tts_backend.voice, tts_backend.audio_format)
+    if data is not None:
+        return data
     
+    data = b"".join(backend_stream(text, lang))
+    audio_cache.put(text, data, lang, tts_backend.voice, tts_backend.audio_format)
+    return data
+
+
+def synthesize_stream(text, lang='en'):
+    """
+    Queue a phrase for synthesis on the shared pool and return a queue of audio chunks
+    (ending with None), so playback can begin with the first chunk the backend sends.
+    Synthesis stops early (and caches nothing) once the calling request is cancelled.
+    """
+    chunks = queue.Queue()
+    token = current_token()
+    
+    def fetch():
+        try:
+            if token is not None and token.cancelled:
+                return  # Cancelled while waiting for a worker
+            with span("synthesize", backend=tts_backend.name, chars=len(text)) as synthesis:
+                data = audio_cache.get(text, lang, tts_backend.voice, tts_backend.audio_format)
+                synthesis.attrs["cached"] = data is not None
+                if data is not None:
+                    chunks.put(data)
+                    return
+                
+                parts = []
+                with closing(backend_stream(text, lang)) as stream:
+                    for part in stream:
+                        if token is not None and token.cancelled:
+                            synthesis.attrs["cancelled"] = True
+                            return
+                        if not parts:
+                            synthesis.mark("first_chunk")
+                        parts.append(part)
+                        chunks.put(part)
+                audio_cache.put(text, b"".join(parts), lang, tts_backend.voice, tts_backend.audio_format)
+        except RequestCancelled:
+            pass
+        except Exception as e:
+            logger.error(f"❌ TTS Error ({tts_backend.name}): {e}")
+        finally:
+            chunks.put(None)
+    
+    # The synthesis job joins the caller's trace
+    _synthesis_pool.submit(wrap(fetch))
+    return chunks
+
+
+def play_synthesized(chunks, on_start=None, priority=PRIORITY_NORMAL):
+    """Hand a chunk queue from synthesize_stream to the playback engine; returns its Utterance"""
+    return playback_engine.enqueue(
+        chunks, tts_backend.audio_format, tts_backend.sample_rate,
+        priority=priority, on_start=on_start
+    )
+
+
+def speak_text(text, on_start=None, wait=True):
+    """TTS with emoji cleaning and stop control; with wait=False returns as soon as it is queued"""
     try:
         # Clean the text to remove emojis before TTS
         clean_text = clean_text_for_tts(text)
         
         # If text becomes empty after cleaning, skip TTS
         if not clean_text.strip():
-            print("⚠️ Text empty after emoji cleaning - skipping TTS")
+            logger.warning("⚠️ Text empty after cleaning - skipping TTS")
             return False
         
-        print(f"🔊 Speaking with gTTS: {clean_text[:50]}...")
-        
-        # Check if we should stop before starting
-        if stop_audio_event.is_set():
-            print("🔇 Audio stop requested - canceling TTS")
-            return False
+        logger.debug(f"🔊 Speaking with {tts_backend.name}: {clean_text[:50]}...")
         
-        # Generate unique filename if none provided
-        if output_path is None:
-            timestamp = int(time.time() * 1000)
-            unique_id = str(uuid.uuid4())[:8]
-            output_path = f"apex_voice_{timestamp}_{unique_id}.mp3"
+        # Split into phrases so cached ones ("Apex here!", stock errors) play
+        # right away while only the new remainder is synthesized
+        segments, remainder = split_sentences(clean_text)
+        if remainder.strip():
+            segments.append(remainder.strip())
         
-        # Use absolute path
-        abs_path = os.path.abspath(output_path)
-        
-        # Thread-safe file operations
-        with file_lock:
-            # Check again after acquiring lock
-            if stop_audio_event.is_set():
-                print("🔇 Audio stop requested during file creation")
-                return False
-            
-            # Create gTTS object with cleaned text
-            tts = gTTS(text=clean_text, lang='en', slow=False)
-            
-            # Save to unique file
-            tts.save(abs_path)
-            print(f"✅ Audio saved: {abs_path}")
-        
-        # Check one more time before playing
-        if stop_audio_event.is_set():
-            print("🔇 Audio stop requested - cleaning up file")
-            cleanup_audio_file(abs_path)
-            return False
-        
-        # Play using multiple methods for reliability
-        success = play_audio_with_cleanup(abs_path)
+        utterances = speak_segments(segments, on_start=on_start)
+        if not wait:
+            return bool(utterances)
         
+        success = all(utterance.wait() for utterance in utterances)
         if success:
-            print("✅ Audio playbook completed")
-            return True
+            logger.debug("✅ Audio playbook completed")
         else:
-            print("❌ Audio playbook failed")
-            cleanup_audio_file(abs_path)
-            return False
+            logger.warning("❌ Audio playbook failed")
+        return success
             
     except Exception as e:
-        print(f"❌ gTTS Error: {e}")
+        logger.error(f"❌ TTS Error: {e}")
         return False
 
 
-def play_audio_with_cleanup(file_path):
-    """Play audio with automatic cleanup and stop control"""
-    success = False
-    
-    try:
-        # Method 1: Try pygame with stop control
-        print("🔄 Trying pygame mixer...")
-        
-        # Check if we should stop
-        if stop_audio_event.is_set():
-            print("🔇 Stop requested - skipping playbook")
-            cleanup_audio_file(file_path)
-            return False
-        
-        # Load and play
-        pygame.mixer.music.load(file_path)
-        pygame.mixer.music.play()
-        
-        # Wait for playbook to complete with periodic stop checks
-        while pygame.mixer.music.get_busy():
-            if stop_audio_event.is_set():
-                print("🔇 Stop requested during playbook")
-                pygame.mixer.music.stop()
-                pygame.mixer.music.unload()
-                cleanup_audio_file(file_path)
-                return False
-            pygame.time.wait(100)
-        
-        # Stop and unload to release file handle
-        pygame.mixer.music.stop()
-        pygame.mixer.music.unload()
-        
-        print("✅ Pygame playbook successful!")
-        success = True
-        
-    except Exception as e:
-        print(f"❌ Pygame failed: {e}")
-        
-        # Method 2: Try system command as fallbook
-        try:
-            if stop_audio_event.is_set():
-                cleanup_audio_file(file_path)
-                return False
-                
-            print("🔄 Trying system command...")
-            system = platform.system().lower()
-            
-            if system == "windows":
-                subprocess.Popen(["start", "", file_path], shell=True)
-                time.sleep(2)
-                print("✅ Windows start command initiated!")
-                success = True
-            elif system == "darwin":
-                subprocess.run(["open", file_path], check=True)
-                print("✅ macOS open command successful!")
-                success = True
-            elif system == "linux":
-                for player in ["aplay", "paplay", "play", "mpg123"]:
-                    try:
-                        subprocess.run([player, file_path], check=True, timeout=10)
-                        print(f"✅ Linux {player} successful!")
-                        success = True
-                        break
-                    except:
-                        continue
-                
-        except Exception as e2:
-            print(f"❌ System command failed: {e2}")
-    
-    # Schedule cleanup after delay
-    if success:
-        def delayed_cleanup():
-            time.sleep(3)
-            cleanup_audio_file(file_path)
-        
-        cleanup_thread = threading.Thread(target=delayed_cleanup, daemon=True)
-        cleanup_thread.start()
-    else:
-        cleanup_audio_file(file_path)
-    
-    return success
+def speak_segments(segments, on_start=None):
+    """Queue every phrase for synthesis and playback in order; at most TTS_WORKERS are synthesized at once"""
+    utterances = []
+    for segment in segments:
+        utterances.append(play_synthesized(synthesize_stream(segment), on_start=None if utterances else on_start))
+    return utterances
 
 
-def cleanup_audio_file(file_path):
-    """Safely clean up audio file"""
-    try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            print(f"🗑️ Cleaned up audio file: {file_path}")
-    except Exception as e:
-        print(f"⚠️ Could not cleanup file {file_path}: {e}")
+def speak_text_with_control(text, on_start=None):
+    """Interrupt whatever this session is playing and queue the new text (synthesis and playback run in the background)"""
+    stop_session_audio()
+    return speak_text(text, on_start=on_start, wait=False)
+
 
+def split_sentences(buffer):
+    """Split buffered text into complete sentences and the unfinished remainder"""
+    parts = SENTENCE_BOUNDARY.split(buffer)
+    complete = [part.strip() for part in parts[:-1] if part.strip()]
+    return complete, parts[-1]
 
-def speak_text_with_control(text):
-    """Wrapper function that can be controlled by main thread"""
-    global current_audio_thread
+
+def speak_text_stream(chunks, on_first_audio=None):
+    """
+    Speak a streamed response sentence by sentence while it is still being generated.
     
-    def audio_worker():
-        speak_text(text)
+    Each sentence starts synthesizing as soon as it is complete and is queued on
+    the playback engine, so sentence N plays while the caller keeps pulling
+    sentence N+1 out of `chunks`. Returns the full response text once the
+    stream is exhausted; playback of the tail continues in the background.
+    If the request is cancelled, stops pulling from `chunks` (closing the LLM
+    stream) and returns what was generated so far.
+    """
+    # Cut this session's earlier answer (other sessions keep talking), then
+    # remember the generation so a global stop still silences this one
+    stop_session_audio()
+    generation = playback_engine.generation
+    first_audio_reported = threading.Event()
     
-    # Stop any existing audio
-    stop_all_audio()
+    def report_first_audio():
+        if not first_audio_reported.is_set():
+            first_audio_reported.set()
+            if on_first_audio is not None:
+                on_first_audio()
     
-    # Start new audio thread
-    current_audio_thread = threading.Thread(target=audio_worker, daemon=True)
-    current_audio_thread.start()
+    def speak_sentence(sentence):
+        clean_text = clean_text_for_tts(sentence)
+        if clean_text and generation == playback_engine.generation and not is_cancelled():
+            play_synthesized(synthesize_stream(clean_text), on_start=report_first_audio)
     
-    return current_audio_thread
-
-
-def cleanup_old_audio_files():
-    """Clean up old apex audio files"""
+    full_text = []
+    buffer = ""
     try:
-        current_dir = os.getcwd()
-        for filename in os.listdir(current_dir):
-            if filename.startswith('apex_voice_') and filename.endswith('.mp3'):
-                file_path = os.path.join(current_dir, filename)
-                try:
-                    file_age = time.time() - os.path.getmtime(file_path)
-                    if file_age > 60:
-                        os.remove(file_path)
-                        print(f"🗑️ Cleaned up old file: {filename}")
-                except:
-                    pass
-    except Exception as e:
-        print(f"⚠️ Cleanup error: {e}")
+        for chunk in chunks:
+            if is_cancelled():
+                break
+            full_text.append(chunk)
+            if generation != playback_engine.generation:
+                continue
+            buffer += chunk
+            sentences, buffer = split_sentences(buffer)
+            for sentence in sentences:
+                speak_sentence(sentence)
+    finally:
+        if buffer.strip():
+            speak_sentence(buffer.strip())
+        close = getattr(chunks, "close", None)
+        if close is not None and is_cancelled():
+            # Stop the generator now rather than at garbage collection, so the LLM stream is released
+            close()
+    
+    return "".join(full_text)
 
 
 # Test function
@@ -309,6 +273,7 @@ def test_audio_control():
     time.sleep(1)
     thread2 = speak_text_with_control("🔊 This is a second test message without emoji sounds!")
     
+    print(f"🧪 Playback engine: {playback_engine.stats()}")
     return True
 
 
@@ -1,57 +1,36 @@
 import os
-import cv2
+import time
+import logging
+import numpy as np
 from dotenv import load_dotenv
-import google.generativeai as genai
 from PIL import Image
+from vision import frame_hash
+from camera_service import get_camera_service, probe_cameras
+from response_cache import response_cache, make_key
+from rate_limiter import call_with_retry, classify_error, RATE_LIMITED, FATAL, error_status
+from clients import configure_genai, get_gemini_model, gemini_request_options, GEMINI_MODEL
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Rough prompt cost of one image, for the tokens-per-minute budget
+IMAGE_TOKENS = 258
 
 # Load environment variables
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")  # Using your variable name
 
 # Configure Gemini client
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
-    print("❌ GEMINI_API_KEY not found in tools.py")
+if not configure_genai():
+    logger.warning("❌ GEMINI_API_KEY not found in tools.py")
 
 def capture_image(width: int = 1280, height: int = 720) -> Image.Image:
     """
-    Captures a high-quality image from webcam with custom resolution.
+    Returns the newest frame from the persistent camera service as a PIL image.
+    The device is opened once and kept warm, so this no longer pays for open/warm-up/release.
     """
-    cap = None
-    try:
-        # Try most common camera indices first
-        for idx in [0, 1, 2]:
-            cap = cv2.VideoCapture(idx)
-            if cap.isOpened():
-                # Set camera properties
-                cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-                cap.set(cv2.CAP_PROP_FPS, 30)
-                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                
-                # Test camera functionality
-                ret, test_frame = cap.read()
-                if ret and test_frame is not None:
-                    # Camera warm-up
-                    for _ in range(3):
-                        cap.read()
-                    
-                    ret, frame = cap.read()
-                    cap.release()
-                    
-                    if ret and frame is not None:
-                        # Convert BGR to RGB for PIL
-                        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        return Image.fromarray(rgb_frame)
-                cap.release()
-                
-        raise RuntimeError("❌ No functional camera found")
-        
-    except Exception as e:
-        if cap is not None and cap.isOpened():
-            cap.release()
-        raise RuntimeError(f"❌ Camera access failed: {e}")
+    # Resolution is set when the service first opens the device (APEX_CAMERA_WIDTH/HEIGHT)
+    return Image.fromarray(get_camera_service().latest())
 
 def analyze_image_with_query(query: str = "What do you see in this image?", 
                            img: Image.Image = None, 
@@ -62,47 +41,53 @@ def analyze_image_with_query(query: str = "What do you see in this image?",
     if not GEMINI_API_KEY:
         return "❌ GEMINI_API_KEY not found in environment variables"
 
-    for attempt in range(max_retries):
-        try:
-            # Capture new image if none provided
-            if img is None:
-                print("📸 Capturing image from webcam...")
+    try:
+        # Capture new image if none provided
+        if img is None:
+            logger.debug("📸 Capturing image from webcam...")
+            with span("capture"):
                 img = capture_image()
+        
+        # Same question about the same scene? Answer from the cache
+        key = make_key(query, frame_hash(np.asarray(img)))
+        cached = response_cache.get(key)
+        if cached is not None:
+            logger.debug("💾 Cache hit - reusing the earlier answer for this image")
+            return cached
+        started_at = time.perf_counter()
+        
+        # Shared Gemini model (configured once, warm connection)
+        model = get_gemini_model()
+        
+        # Generate response (rate limited, with backoff on quota and transient errors)
+        logger.debug("🤖 Analyzing image with AI...")
+        with span("llm", route="tool"):
+            response = call_with_retry(
+                "gemini", GEMINI_MODEL, model.generate_content, [query, img],
+                tokens=IMAGE_TOKENS, max_retries=max_retries - 1,
+                request_options=gemini_request_options()
+            )
+        
+        if response and response.text:
+            answer = response.text.strip()
+            response_cache.put(key, answer, time.perf_counter() - started_at)
+            return answer
+        else:
+            return "❌ AI returned empty response"
             
-            # Initialize Gemini model
-            model = genai.GenerativeModel("gemini-1.5-flash")
-            
-            # Generate response
-            print("🤖 Analyzing image with AI...")
-            response = model.generate_content([query, img])
-            
-            if response and response.text:
-                return response.text.strip()
-            else:
-                return "❌ AI returned empty response"
-                
-        except Exception as e:
-            error_msg = str(e).lower()
-            if "quota" in error_msg or "rate limit" in error_msg:
-                if attempt < max_retries - 1:
-                    print(f"⏳ Rate limit hit, retrying in 2 seconds... (Attempt {attempt + 1})")
-                    import time
-                    time.sleep(2)
-                    continue
-                return "❌ API quota exceeded. Please try again later."
-            elif "api" in error_msg:
-                return f"❌ API Error: {e}"
-            else:
-                if attempt < max_retries - 1:
-                    print(f"🔄 Retrying... (Attempt {attempt + 1})")
-                    continue
-                return f"❌ Analysis failed: {e}"
-    
-    return "❌ Failed after multiple attempts"
+    except Exception as e:
+        kind = classify_error(e)
+        if kind == RATE_LIMITED:
+            return "❌ API quota exceeded. Please try again later."
+        elif kind == FATAL and error_status(e) is not None:
+            return f"❌ API Error: {e}"
+        else:
+            return f"❌ Analysis failed: {e}"
 
 def test_camera_connection() -> bool:
     """Test if camera is accessible."""
     try:
+        import cv2
         cap = cv2.VideoCapture(0)
         if cap.isOpened():
             ret, _ = cap.read()
@@ -121,16 +106,8 @@ def save_captured_image(img: Image.Image, filename: str = "captured_image.jpg")
         return f"❌ Failed to save image: {e}"
 
 def get_available_cameras() -> list:
-    """Get list of available camera indices."""
-    available = []
-    for i in range(10):
-        cap = cv2.VideoCapture(i)
-        if cap.isOpened():
-            ret, _ = cap.read()
-            if ret:
-                available.append(i)
-        cap.release()
-    return available
+    """Get list of available camera indices (probed concurrently)."""
+    return probe_cameras(10)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,170 @@
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from metrics import observe
+
+# Console verbosity: DEBUG shows every pipeline step and span timing, INFO the
+# per-request milestones, WARNING and above only problems
+LOG_LEVEL = os.getenv("APEX_LOG_LEVEL", "INFO").upper()
+
+_current_span = contextvars.ContextVar("apex_span", default=None)
+
+logger = logging.getLogger("apex.trace")
+
+
+class _TraceFilter(logging.Filter):
+    """Stamp every log record with the trace id of the request it belongs to"""
+
+    def filter(self, record):
+        span = _current_span.get()
+        record.trace = span.trace_id if span is not None else "-"
+        return True
+
+
+def configure_logging(level=LOG_LEVEL):
+    """Send log records to stderr at the given level, tagged with their trace id (idempotent)"""
+    root = logging.getLogger()
+    if not any(isinstance(f, _TraceFilter) for handler in root.handlers for f in handler.filters):
+        handler = logging.StreamHandler()
+        handler.addFilter(_TraceFilter())
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s [%(trace)s] %(message)s", "%H:%M:%S"))
+        root.addHandler(handler)
+    root.setLevel(getattr(logging, level, logging.INFO))
+
+
+configure_logging()
+
+
+class Span:
+    """
+    One timed stage of a request. Spans started while another is current become
+    its children and share its trace id. Ending a span records its duration in
+    the `span.<name>` histogram and logs it at DEBUG.
+    """
+
+    def __init__(self, name, parent=None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:8]
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def mark(self, event):
+        """Note when something happened inside the span (e.g. first_token), in ms since it started"""
+        self.attrs.setdefault(f"{event}_ms", round((time.perf_counter() - self.started) * 1000, 1))
+
+    def end(self):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.started
+        observe(f"span.{self.name}", self.duration)
+        if logger.isEnabledFor(logging.DEBUG):
+            details = " ".join(f"{key}={value}" for key, value in self.attrs.items())
+            logger.debug(f"⏱️ {self.name} {self.duration * 1000:.1f} ms {details}".rstrip())
+
+
+def current_span():
+    """The span the calling code runs under, or None"""
+    return _current_span.get()
+
+
+def start_span(name, **attrs):
+    """
+    Start a span under the current one without making it current; end() it yourself.
+    Use this in generators, where a context variable must not be held across a yield.
+    """
+    return Span(name, _current_span.get(), **attrs)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as a span and make it current, so spans started inside become its children"""
+    current = start_span(name, **attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        current.end()
+        _current_span.reset(token)
+
+
+async def iterate_in_span(current, updates):
+    """
+    Drive an async generator with `current` as the current span during each step.
+    The span is set and reset within one step, because whoever iterates an async
+    generator (Gradio does) may run each step in a different context.
+    """
+    try:
+        while True:
+            token = _current_span.set(current)
+            try:
+                item = await updates.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                _current_span.reset(token)
+            yield item
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            current.attrs.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        await updates.aclose()
+
+
+def traced(name):
+    """Decorator: run each call (sync, async or async generator) inside its own span"""
+    def decorator(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def async_gen_wrapper(*args, **kwargs):
+                current = start_span(name)
+                try:
+                    async for item in iterate_in_span(current, fn(*args, **kwargs)):
+                        yield item
+                finally:
+                    current.end()
+            return async_gen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def wrap(fn):
+    """Bind fn to the caller's trace context so spans it starts on another thread join the same trace"""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run_in_context(*args, **kwargs):
+        # A Context can't be entered by two threads at once, so each call gets its own copy
+        return context.copy().run(fn, *args, **kwargs)
+    return run_in_context
+
+
+def start_thread(target, *args, name=None, **kwargs):
+    """Start a daemon thread that carries the caller's trace context"""
+    thread = threading.Thread(target=wrap(target), args=args, kwargs=kwargs, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,194 @@
+import logging
+import os
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from metrics import record_timing
+from clients import get_http_client
+
+logger = logging.getLogger(__name__)
+
+try:
+    from piper import PiperVoice
+except ImportError:  # Local engine is optional
+    PiperVoice = None
+
+# "gtts" (default), "elevenlabs", "piper" or "auto" (first available of piper, elevenlabs, gtts)
+TTS_BACKEND = os.getenv("APEX_TTS_BACKEND", "gtts")
+
+ELEVENLABS_VOICE_ID = os.getenv("APEX_ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")
+ELEVENLABS_MODEL = os.getenv("APEX_ELEVENLABS_MODEL", "eleven_flash_v2_5")
+ELEVENLABS_SAMPLE_RATE = 22050
+ELEVENLABS_TIMEOUT = float(os.getenv("APEX_ELEVENLABS_TIMEOUT", "15"))
+
+# Path to a Piper .onnx voice (its .onnx.json config must sit next to it)
+PIPER_VOICE = os.getenv("APEX_PIPER_VOICE", "")
+
+
+class TTSBackend(ABC):
+    """
+    Text-to-speech engine. stream(text, lang) yields audio as it is produced:
+    MP3 bytes when audio_format is "mp3", or 16-bit mono PCM at sample_rate when it is "pcm".
+    """
+
+    name = "base"
+    audio_format = "mp3"
+    sample_rate = None
+
+    @property
+    def available(self):
+        return True
+
+    @property
+    def voice(self):
+        """Identifies the voice in audio cache keys"""
+        return self.name
+
+    @abstractmethod
+    def stream(self, text, lang="en"):
+        """Yield the audio for text in chunks as the engine produces them"""
+
+
+class GTTSBackend(TTSBackend):
+    """Google Translate TTS: network round trip, MP3 per request"""
+
+    name = "gtts"
+
+    def stream(self, text, lang="en"):
+        from gtts import gTTS
+
+        # gTTS splits long text into requests of its own; each part is a playable MP3 piece
+        for part in gTTS(text=text, lang=lang, slow=False).stream():
+            yield part
+
+
+class ElevenLabsBackend(TTSBackend):
+    """ElevenLabs streaming endpoint returning raw PCM over one pooled keep-alive connection"""
+
+    name = "elevenlabs"
+    audio_format = "pcm"
+    sample_rate = ELEVENLABS_SAMPLE_RATE
+
+    def __init__(self, voice_id=ELEVENLABS_VOICE_ID, model=ELEVENLABS_MODEL):
+        self.voice_id = voice_id
+        self.model = model
+
+    @property
+    def available(self):
+        return bool(os.getenv("ELEVENLABS_API_KEY"))
+
+    @property
+    def voice(self):
+        return f"elevenlabs:{self.voice_id}:{self.model}"
+
+    @property
+    def client(self):
+        return get_http_client(
+            "elevenlabs", timeout=ELEVENLABS_TIMEOUT,
+            base_url="https://api.elevenlabs.io",
+            headers={"xi-api-key": os.getenv("ELEVENLABS_API_KEY", "")},
+        )
+
+    def stream(self, text, lang="en"):
+        with self.client.stream(
+            "POST",
+            f"/v1/text-to-speech/{self.voice_id}/stream",
+            params={"output_format": f"pcm_{self.sample_rate}"},
+            json={"text": text, "model_id": self.model},
+        ) as response:
+            response.raise_for_status()
+            for chunk in response.iter_bytes():
+                if chunk:
+                    yield chunk
+
+
+class PiperBackend(TTSBackend):
+    """Piper ONNX voice on the CPU: no network and works offline"""
+
+    name = "piper"
+    audio_format = "pcm"
+
+    def __init__(self, voice_path=PIPER_VOICE):
+        self.voice_path = voice_path
+        self._voice = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return PiperVoice is not None and bool(self.voice_path) and os.path.exists(self.voice_path)
+
+    @property
+    def voice(self):
+        return f"piper:{os.path.basename(self.voice_path)}"
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._voice is None:
+                if not self.available:
+                    raise RuntimeError("❌ Piper TTS needs piper-tts and APEX_PIPER_VOICE pointing at an .onnx voice")
+                logger.info(f"🔄 Loading Piper voice '{self.voice_path}'...")
+                self._voice = PiperVoice.load(self.voice_path)
+            return self._voice
+
+    @property
+    def sample_rate(self):
+        return self.model.config.sample_rate
+
+    def stream(self, text, lang="en"):
+        # Raw 16-bit mono PCM, one sentence at a time
+        for chunk in self.model.synthesize_stream_raw(text):
+            yield chunk
+
+
+BACKENDS = {backend.name: backend for backend in (GTTSBackend(), ElevenLabsBackend(), PiperBackend())}
+
+
+def get_tts_backend(name=TTS_BACKEND):
+    """The configured backend, falling back to gTTS when it isn't available"""
+    if name == "auto":
+        for candidate in ("piper", "elevenlabs", "gtts"):
+            if BACKENDS[candidate].available:
+                return BACKENDS[candidate]
+
+    backend = BACKENDS.get(name)
+    if backend is None or not backend.available:
+        logger.warning(f"⚠️ TTS backend '{name}' unavailable - using gTTS")
+        return BACKENDS["gtts"]
+    return backend
+
+
+def benchmark_backends(text, runs=3):
+    """Time to first audio sample and total synthesis time per available backend"""
+    print(f"\n=== TTS benchmark: {len(text)} chars, {runs} runs ===")
+    results = {}
+    for backend in BACKENDS.values():
+        if not backend.available:
+            print(f"{backend.name:>10}: unavailable, skipped")
+            continue
+
+        first, total, size = [], [], 0
+        for _ in range(runs):
+            started = time.perf_counter()
+            first_at = None
+            size = 0
+            for chunk in backend.stream(text):
+                if first_at is None:
+                    first_at = time.perf_counter() - started
+                size += len(chunk)
+            total.append(time.perf_counter() - started)
+            first.append(first_at if first_at is not None else total[-1])
+            record_timing(f"tts.first_sample.{backend.name}", first[-1])
+
+        results[backend.name] = {"first_sample": sum(first) / runs, "total": sum(total) / runs, "bytes": size}
+        print(
+            f"{backend.name:>10}: first sample {results[backend.name]['first_sample'] * 1000:7.1f} ms, "
+            f"total {results[backend.name]['total'] * 1000:7.1f} ms, {size} bytes {backend.audio_format}"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_backends(" ".join(sys.argv[1:]) or "Apex here! The capital of India is New Delhi.")
@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Disk tier: content-addressed audio files named after their format, LRU-evicted past the byte cap
+TTS_CACHE_DIR = os.getenv("APEX_TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "apex_tts_cache"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("APEX_TTS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Memory tier: phrases requested at least HOT_PHRASE_HITS times stay in RAM
+TTS_MEMORY_MAX_BYTES = int(os.getenv("APEX_TTS_MEMORY_MAX_BYTES", str(4 * 1024 * 1024)))
+HOT_PHRASE_HITS = 2
+
+# Audio formats the backends produce; cache files use them as their extension
+AUDIO_FORMATS = ("mp3", "pcm", "wav")
+
+
+def audio_key(text, lang="en", voice="gtts"):
+    """Content address for a phrase: hash of the cleaned text, language and voice"""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{voice}\0{lang}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """Two-tier (memory + disk) cache of synthesized speech, keyed by content"""
+
+    def __init__(self, cache_dir=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES,
+                 memory_max_bytes=TTS_MEMORY_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._disk = OrderedDict()    # entry (key.format) -> size, least recently used first
+        self._disk_bytes = 0
+        self._memory = OrderedDict()  # entry -> audio bytes
+        self._memory_bytes = 0
+        self._uses = {}               # entry -> requests so far, for entries on disk not yet in memory
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _entry(self, text, lang, voice, audio_format):
+        """Cache entry name: the content address plus the audio format as the file extension"""
+        return f"{audio_key(text, lang, voice)}.{audio_format}"
+
+    def _path(self, entry):
+        return os.path.join(self.cache_dir, entry)
+
+    def _load_index(self):
+        """Rebuild the LRU index from files left by a previous run (oldest first)"""
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if filename.rpartition(".")[2] in AUDIO_FORMATS:
+                path = os.path.join(self.cache_dir, filename)
+                try:
+                    entries.append((os.path.getmtime(path), filename, os.path.getsize(path)))
+                except OSError:
+                    continue
+        for _, entry, size in sorted(entries):
+            self._disk[entry] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def get(self, text, lang="en", voice="gtts", audio_format="mp3"):
+        """Cached audio bytes for a phrase, or None"""
+        key = self._entry(text, lang, voice, audio_format)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+
+            if key not in self._disk:
+                self.misses += 1
+                return None
+            self._disk.move_to_end(key)
+
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._forget_disk(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._note_use(key, data)
+        return data
+
+    def put(self, text, data, lang="en", voice="gtts", audio_format="mp3"):
+        """Store synthesized audio for a phrase"""
+        key = self._entry(text, lang, voice, audio_format)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write TTS cache entry: {e}")
+            return
+
+        with self._lock:
+            if key in self._disk:
+                self._disk_bytes -= self._disk[key]
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            self._evict_disk()
+            self._note_use(key, data)
+
+    def _note_use(self, key, data):
+        """Promote phrases that keep coming back (stock phrases) into the memory tier"""
+        if key not in self._disk or key in self._memory:
+            return  # evicted meanwhile (or bigger than the whole cache), or already promoted
+        self._uses[key] = self._uses.get(key, 0) + 1
+        if self._uses[key] < HOT_PHRASE_HITS or len(data) > self.memory_max_bytes:
+            return
+        del self._uses[key]
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _forget_disk(self, key):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+        self._uses.pop(key, None)
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_bytes and self._disk:
+            key, _ = next(iter(self._disk.items()))
+            self._forget_disk(key)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Hit/miss counters and bytes held per tier"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_bytes": self._disk_bytes,
+                "memory_bytes": self._memory_bytes,
+                "phrases": len(self._disk),
+            }
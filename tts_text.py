@@ -0,0 +1,216 @@
+import functools
+import re
+import sys
+import time
+
+# Emoji and pictographs, based on the Unicode Extended_Pictographic property,
+# plus the joiners and modifiers that glue emoji sequences together. Unlike a
+# blanket non-BMP range this leaves CJK extensions, math letters etc. alone.
+_EMOJI_RANGES = [
+    (0x203C, 0x203C), (0x2049, 0x2049), (0x2122, 0x2122), (0x2139, 0x2139),
+    (0x2194, 0x2199), (0x21A9, 0x21AA), (0x231A, 0x231B), (0x2328, 0x2328),
+    (0x23CF, 0x23CF), (0x23E9, 0x23F3), (0x23F8, 0x23FA), (0x24C2, 0x24C2),
+    (0x25AA, 0x25AB), (0x25B6, 0x25B6), (0x25C0, 0x25C0), (0x25FB, 0x25FE),
+    (0x2600, 0x27BF),                    # misc symbols and dingbats (✅ ❌ ✨ ⚠)
+    (0x2934, 0x2935), (0x2B05, 0x2B07), (0x2B1B, 0x2B1C), (0x2B50, 0x2B50),
+    (0x2B55, 0x2B55), (0x3030, 0x3030), (0x303D, 0x303D), (0x3297, 0x3297),
+    (0x3299, 0x3299),
+    (0x1F000, 0x1FAFF),                  # mahjong .. pictographs extended-A, flags, skin tones
+    (0x200D, 0x200D),                    # zero width joiner
+    (0xFE0E, 0xFE0F),                    # variation selectors
+    (0x20E3, 0x20E3),                    # combining keycap
+    (0xE0020, 0xE007F),                  # tag characters (subdivision flags)
+]
+
+# str.translate table deleting every emoji code point
+_EMOJI_TABLE = {code: None for start, end in _EMOJI_RANGES for code in range(start, end + 1)}
+# translate() looks up every character, so it only runs when there is an emoji to delete
+_EMOJI = re.compile("[" + "".join(f"{re.escape(chr(start))}-{re.escape(chr(end))}" for start, end in _EMOJI_RANGES) + "]")
+
+# Markdown links and images are read as their text; bare URLs as their host
+_LINK = re.compile(r"!?\[([^\]\n]*)\]\([^)\s]*\)")
+# A URL doesn't end in punctuation, so a sentence's full stop after it survives
+_URL = re.compile(r"(?:https?://|www\.)[^\s<>()\[\]]*[^\s<>()\[\].,;:!?'\"]")
+_URL_PREFIX = re.compile(r"^(?:https?://)?(?:www\.)?")
+
+# List, quote and heading markers, only at the start of a line
+_BLOCK_MARKER = re.compile(r"^[ \t]*(?:#{1,6}|[-+*•>]|\d+[.)])[ \t]+", re.MULTILINE)
+# Paired emphasis delimiters: **bold**, _italic_, ~~struck~~. A delimiter touching a
+# word on its outer side isn't one, so x*y, C++ and snake_case are left alone.
+# (The opening delimiter's first character is matched before the lookbehind that
+# checks what precedes it, so the search can skip straight to candidate characters.)
+_EMPHASIS = re.compile(
+    r"(?P<delimiter>[*_~](?<![\w*_~][*_~])(?:(?<=\*)\*{0,2}|(?<=_)_{0,2}|(?<=~)~))"
+    r"(?=\S)(?P<content>.+?)(?<=\S)(?P=delimiter)(?![\w*_~])"
+)
+_MARKDOWN_CHARS = {ord("`"): None, ord("|"): " "}
+
+_CURRENCIES = {"$": ("dollar", "cent"), "€": ("euro", "cent"), "£": ("pound", "penny"), "₹": ("rupee", "paisa"), "¥": ("yen", None)}
+_PLURALS = {"penny": "pence", "paisa": "paise", "yen": "yen"}
+_TEMPERATURE_UNITS = {"C": "Celsius", "F": "Fahrenheit", "c": "Celsius", "f": "Fahrenheit"}
+
+# 1,250.50 or 2.5 or 42
+_AMOUNT = r"(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?"
+_RANGE = re.compile(r"(\d)[ \t]?[–—][ \t]?(?=[$€£₹¥]?\d)")
+_MONEY = re.compile(r"([$€£₹¥])[ \t]?(" + _AMOUNT + r")(?![\w.,]?\d)")
+# A minus sign in front of a number, not a hyphen (COVID-19, 1-2) or an operator (2 - 1)
+_MINUS = re.compile(r"[-−](?<![\w.,:][-−])(?=\d)")
+# A number, from its first digit (the lookbehind rejects digits inside words, version
+# strings, times and bigger numbers), with an optional ordinal, percent or degree
+# suffix, and not followed by more of a number (1.2.3, 10:30, 3D)
+_NUMBER = re.compile(
+    r"(?P<numeral>\d(?<![\w.,:]\d)(?:\d{0,2}(?:,\d{3})+|\d*)(?:\.\d+)?)"
+    r"(?:(?P<ordinal>st|nd|rd|th)|[ \t]?(?P<percent>%)|[ \t]?°[ \t]?(?P<unit>[CFcf](?!\w))?)?"
+    r"(?![\w:°%]|[.,]\d)"
+)
+
+_ONES = (
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen",
+)
+_TENS = ("", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety")
+_SCALES = ((10 ** 12, "trillion"), (10 ** 9, "billion"), (10 ** 6, "million"), (1000, "thousand"))
+_ORDINALS = {"one": "first", "two": "second", "three": "third", "five": "fifth", "eight": "eighth", "nine": "ninth", "twelve": "twelfth"}
+
+
+def integer_to_words(number):
+    """English words for a non-negative integer: 1250 -> 'one thousand two hundred fifty'"""
+    if number < 20:
+        return _ONES[number]
+    if number < 100:
+        tens, ones = divmod(number, 10)
+        return _TENS[tens] + (f"-{_ONES[ones]}" if ones else "")
+    if number < 1000:
+        hundreds, rest = divmod(number, 100)
+        return f"{_ONES[hundreds]} hundred" + (f" {integer_to_words(rest)}" if rest else "")
+    for scale, name in _SCALES:
+        if number >= scale:
+            head, rest = divmod(number, scale)
+            return f"{integer_to_words(head)} {name}" + (f" {integer_to_words(rest)}" if rest else "")
+
+
+@functools.lru_cache(maxsize=1024)
+def number_to_words(numeral):
+    """Words for a numeral as written: '1,250' -> 'one thousand two hundred fifty', '2.5' -> 'two point five'"""
+    whole, _, fraction = numeral.replace(",", "").partition(".")
+    if len(whole) > 15 or (len(whole) > 1 and whole[0] == "0"):
+        # Codes, phone numbers and the like are read digit by digit
+        words = " ".join(_ONES[int(digit)] for digit in whole)
+    else:
+        words = integer_to_words(int(whole))
+    if fraction:
+        words += " point " + " ".join(_ONES[int(digit)] for digit in fraction)
+    return words
+
+
+def _ordinal(words):
+    """'twenty-one' -> 'twenty-first'"""
+    head, last = re.match(r"(.*?)(\w+)$", words).groups()
+    if last in _ORDINALS:
+        return head + _ORDINALS[last]
+    return head + (last[:-1] + "ieth" if last.endswith("y") else last + "th")
+
+
+def _number(match):
+    numeral = match.group("numeral")
+    words = number_to_words(numeral)
+    if match.group("ordinal"):
+        return _ordinal(words)
+    if match.group("percent"):
+        return f"{words} percent"
+    if "°" in match.group():
+        unit = match.group("unit")
+        words += " degree" if numeral == "1" else " degrees"
+        return f"{words} {_TEMPERATURE_UNITS[unit]}" if unit else words
+    return words
+
+
+def _plural(unit, amount):
+    return unit if amount == 1 else _PLURALS.get(unit, unit + "s")
+
+
+def _money(match):
+    major, minor = _CURRENCIES[match.group(1)]
+    whole, _, fraction = match.group(2).replace(",", "").partition(".")
+    if minor is not None and len(fraction) == 2:
+        cents = f"{integer_to_words(int(fraction))} {_plural(minor, int(fraction))}"
+        if not int(whole):
+            return cents
+        spoken = f"{integer_to_words(int(whole))} {_plural(major, int(whole))}"
+        return f"{spoken} and {cents}" if int(fraction) else spoken
+    return f"{number_to_words(match.group(2))} {_plural(major, 0 if fraction else int(whole))}"
+
+
+def _url_for_speech(match):
+    """Read a URL as its host: 'https://www.example.com/a?b' -> 'example dot com'"""
+    host = _URL_PREFIX.sub("", match.group()).split("/", 1)[0].split("?", 1)[0]
+    return host.replace(".", " dot ")
+
+
+def normalize_for_speech(text):
+    """
+    Prepare model output for a TTS engine: emoji are deleted, markdown links and
+    URLs are read as text / host names, list and heading markers and emphasis are
+    dropped, and numbers, money, percentages and temperatures are spelled out.
+    Whitespace is collapsed afterwards. Each pass is skipped when the text can't
+    contain anything it rewrites.
+    """
+    if not text.isascii() and _EMOJI.search(text):
+        text = text.translate(_EMOJI_TABLE)
+
+    # Links first: their URLs would otherwise be read as hosts
+    if "](" in text:
+        text = _LINK.sub(r"\1", text)
+    if "://" in text or "www." in text:
+        text = _URL.sub(_url_for_speech, text)
+
+    digits = any(digit in text for digit in "0123456789")
+    if digits or any(marker in text for marker in "#-+*•>"):
+        text = _BLOCK_MARKER.sub("", text)
+    if "*" in text or "_" in text or "~" in text:
+        text = _EMPHASIS.sub(r"\g<content>", text)
+    if "`" in text or "|" in text:
+        text = text.translate(_MARKDOWN_CHARS)
+    text = text.replace(" & ", " and ")
+
+    if digits:
+        if "–" in text or "—" in text:
+            text = _RANGE.sub(r"\1 to ", text)
+        if any(symbol in text for symbol in _CURRENCIES):
+            text = _MONEY.sub(_money, text)
+        if "-" in text or "−" in text:
+            text = _MINUS.sub("minus ", text)
+        text = _NUMBER.sub(_number, text)
+    return " ".join(text.split())
+
+
+def benchmark(runs=2000):
+    """Per-call cost of normalize_for_speech on long responses: markdown/emoji-heavy and plain prose"""
+    markdown = (
+        "## Summary 🎯\n"
+        "- **Delhi** is the capital of India 🇮🇳 with about 33,800,000 people 😊\n"
+        "- It was 42°C yesterday, and prices rose 7.5% (see https://www.example.com/report?id=42)\n"
+        "1. Read [the guide](https://docs.example.org/guide) & try `apex --help` ✅\n"
+        "Tickets cost $1,250.50 – 2,000 total. 日本語のテキストもそのまま 𝒳 🚀✨\n\n"
+    )
+    prose = (
+        "Apex here! I can see a desk with a laptop, a coffee mug and a notebook. "
+        "The room looks well lit, and there is a window on the left side of the frame. "
+    )
+
+    results = {}
+    for name, text in (("markdown", markdown * 20), ("prose", prose * 40)):
+        normalize_for_speech(text)  # warm up
+        started = time.perf_counter()
+        for _ in range(runs):
+            normalize_for_speech(text)
+        results[name] = (time.perf_counter() - started) / runs
+        print(f"normalize_for_speech ({name}): {results[name] * 1e6:.1f} µs per call on {len(text)} chars ({runs} runs)")
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        print(normalize_for_speech(" ".join(sys.argv[1:])))
+    else:
+        benchmark()
@@ -0,0 +1,173 @@
+import os
+import threading
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+
+# Speech must be this many dB above the noise floor
+SPEECH_MARGIN_DB = float(os.getenv("APEX_VAD_MARGIN_DB", "10"))
+# Trailing silence that ends an utterance
+HANGOVER_MS = int(os.getenv("APEX_VAD_HANGOVER_MS", "600"))
+# Consecutive speech frames needed to start an utterance (filters clicks)
+MIN_SPEECH_FRAMES = 3
+# Audio kept from before the detected start so the first syllable isn't clipped
+PRE_ROLL_MS = 240
+
+# The floor never drops below this (digital silence would otherwise make everything "speech")
+MIN_NOISE_FLOOR_DB = 20.0
+
+
+def frame_energy_db(frames):
+    """Energy in dB of each row of a (n_frames, frame_len) int16 array"""
+    samples = frames.astype(np.float32)
+    power = np.mean(samples * samples, axis=-1)
+    return 10.0 * np.log10(power + 1e-10)
+
+
+class EnergyVAD:
+    """
+    Energy frame classifier with a persistent noise-floor estimate.
+
+    The floor tracks non-speech frames with an exponential moving average, so
+    it carries over between commands instead of being recalibrated each time.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, margin_db=SPEECH_MARGIN_DB,
+                 noise_alpha=0.05, initial_floor_db=None):
+        self.sample_rate = sample_rate
+        self.frame_len = sample_rate * frame_ms // 1000
+        self.margin_db = margin_db
+        self.noise_alpha = noise_alpha
+        self.noise_floor_db = initial_floor_db
+        self._lock = threading.Lock()
+
+    def classify(self, samples):
+        """
+        Split int16 samples into frames and classify each as speech (True) or not.
+        Trailing samples that don't fill a frame are ignored; callers keep them for next time.
+        """
+        n_frames = len(samples) // self.frame_len
+        if n_frames == 0:
+            return np.zeros(0, dtype=bool)
+        frames = samples[:n_frames * self.frame_len].reshape(n_frames, self.frame_len)
+        energies = frame_energy_db(frames)
+
+        with self._lock:
+            if self.noise_floor_db is None:
+                # First audio ever: seed the floor from the quietest frames we have
+                self.noise_floor_db = max(MIN_NOISE_FLOOR_DB, float(np.percentile(energies, 20)))
+
+            decisions = np.empty(n_frames, dtype=bool)
+            for i, energy in enumerate(energies):
+                is_speech = energy > self.noise_floor_db + self.margin_db
+                decisions[i] = is_speech
+                if not is_speech:
+                    self.noise_floor_db += self.noise_alpha * (energy - self.noise_floor_db)
+                    self.noise_floor_db = max(MIN_NOISE_FLOOR_DB, self.noise_floor_db)
+            return decisions
+
+
+class UtteranceSegmenter:
+    """Turns per-frame speech decisions into utterance start/end with pre-roll and hangover"""
+
+    def __init__(self, vad, hangover_ms=HANGOVER_MS, pre_roll_ms=PRE_ROLL_MS, min_speech_frames=MIN_SPEECH_FRAMES):
+        self.vad = vad
+        frame_ms = vad.frame_len * 1000 // vad.sample_rate
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.pre_roll_frames = pre_roll_ms // frame_ms
+        self.min_speech_frames = min_speech_frames
+        self.reset()
+
+    def reset(self):
+        self.frames = []          # every frame seen so far (int16 arrays)
+        self.start_frame = None   # index of the utterance start (incl. pre-roll)
+        self.end_frame = None
+        self._speech_run = 0
+        self._silence_run = 0
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    @property
+    def started(self):
+        return self.start_frame is not None
+
+    @property
+    def finished(self):
+        return self.end_frame is not None
+
+    def feed(self, samples):
+        """Feed int16 samples; returns True once the utterance has ended"""
+        samples = np.concatenate([self._pending, samples]) if len(self._pending) else samples
+        decisions = self.vad.classify(samples)
+        used = len(decisions) * self.vad.frame_len
+        self._pending = samples[used:]
+
+        for i, is_speech in enumerate(decisions):
+            self.frames.append(samples[i * self.vad.frame_len:(i + 1) * self.vad.frame_len])
+            index = len(self.frames) - 1
+
+            if not self.started:
+                self._speech_run = self._speech_run + 1 if is_speech else 0
+                if self._speech_run >= self.min_speech_frames:
+                    first_speech = index - self._speech_run + 1
+                    self.start_frame = max(0, first_speech - self.pre_roll_frames)
+                continue
+
+            self._silence_run = 0 if is_speech else self._silence_run + 1
+            if self._silence_run >= self.hangover_frames:
+                # Cut right after the last speech frame
+                self.end_frame = index - self._silence_run + 1
+                return True
+        return False
+
+    def utterance_samples(self, until_frame=None):
+        """Samples from the utterance start up to until_frame (default: end or everything so far)"""
+        if not self.started:
+            return np.zeros(0, dtype=np.int16)
+        end = until_frame if until_frame is not None else (self.end_frame if self.finished else len(self.frames))
+        return np.concatenate(self.frames[self.start_frame:end]) if end > self.start_frame else np.zeros(0, dtype=np.int16)
+
+    def utterance_slice(self, first, last):
+        """Samples for utterance-relative frames [first, last)"""
+        if not self.started:
+            return np.zeros(0, dtype=np.int16)
+        frames = self.frames[self.start_frame + first:self.start_frame + last]
+        return np.concatenate(frames) if frames else np.zeros(0, dtype=np.int16)
+
+    def end_now(self):
+        """Force the utterance to end at the current frame (e.g. phrase time limit reached)"""
+        if self.started and not self.finished:
+            self.end_frame = len(self.frames)
+
+    def utterance_frames(self):
+        """Number of frames in the utterance so far"""
+        if not self.started:
+            return 0
+        end = self.end_frame if self.finished else len(self.frames)
+        return end - self.start_frame
+
+
+def merge_transcripts(parts, max_overlap_words=8):
+    """Join chunk transcripts, dropping words repeated across the overlapping audio"""
+    merged = []
+    for part in parts:
+        words = part.split()
+        if not merged:
+            merged.extend(words)
+            continue
+
+        def norm(ws):
+            return [w.lower().strip(".,!?;:") for w in ws]
+
+        overlap = 0
+        for k in range(min(max_overlap_words, len(merged), len(words)), 0, -1):
+            if norm(merged[-k:]) == norm(words[:k]):
+                overlap = k
+                break
+        merged.extend(words[overlap:])
+    return " ".join(merged)
+
+
+# One detector for the whole process so the noise floor persists between commands
+shared_vad = EnergyVAD()
@@ -0,0 +1,147 @@
+import io
+import logging
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Upload settings: frames are downscaled and JPEG-encoded before they go to Gemini
+MAX_UPLOAD_DIM = int(os.getenv("APEX_VISION_MAX_DIM", "768"))
+JPEG_QUALITY = int(os.getenv("APEX_VISION_JPEG_QUALITY", "85"))
+
+# Frames whose hashes differ by at most this many bits (out of 64) count as the same scene
+CHANGE_THRESHOLD = int(os.getenv("APEX_FRAME_CHANGE_THRESHOLD", "6"))
+
+# Answer follow-ups on an unchanged scene from what Apex already saw, without re-uploading
+REUSE_DESCRIPTION = os.getenv("APEX_VISION_REUSE_DESCRIPTION", "1") == "1"
+
+# Only the last few Q/A pairs about a scene are kept as its description
+MAX_SCENE_NOTES = 3
+
+# Luma weights for RGB -> grayscale
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def frame_hash(frame, hash_size=8):
+    """
+    Vectorized difference hash (dHash) of a frame.
+
+    The frame is subsampled, converted to grayscale and block-averaged down to
+    hash_size x (hash_size + 1); each bit says whether a cell is brighter than
+    its right-hand neighbour.
+    """
+    # Cheap stride subsample first so the grayscale conversion touches few pixels
+    stride = max(1, min(frame.shape[0], frame.shape[1]) // (hash_size * 8))
+    sub = frame[::stride, ::stride]
+    gray = sub[..., :3] @ _LUMA if sub.ndim == 3 else sub.astype(np.float32)
+
+    rows, cols = hash_size, hash_size + 1
+    h, w = gray.shape
+    h, w = h - h % rows, w - w % cols
+    cells = gray[:h, :w].reshape(rows, h // rows, cols, w // cols).mean(axis=(1, 3))
+
+    bits = cells[:, 1:] > cells[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hash_distance(a, b):
+    """Number of differing bits between two frame hashes"""
+    return bin(a ^ b).count("1")
+
+
+def encode_frame(frame, max_dim=MAX_UPLOAD_DIM, quality=JPEG_QUALITY):
+    """Downscale a frame to max_dim on its longest side and JPEG-encode it as a Gemini blob part"""
+    image = Image.fromarray(frame)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_dim, max_dim))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return {"mime_type": "image/jpeg", "data": buffer.getvalue()}
+
+
+class Scene:
+    """A prepared frame: its hash, the encoded upload and what Apex already knows about it"""
+
+    def __init__(self, frame_hash, image_part, notes, unchanged):
+        self.hash = frame_hash
+        self.image_part = image_part
+        self.notes = notes
+        self.unchanged = unchanged
+
+    @property
+    def description(self):
+        return "\n".join(f"Q: {question}\nA: {answer}" for question, answer in self.notes)
+
+    @property
+    def reusable(self):
+        """Whether a follow-up can be answered from the notes instead of the image"""
+        return REUSE_DESCRIPTION and self.unchanged and bool(self.notes)
+
+
+class VisionPreprocessor:
+    """Per-session frame change detection, downscaled uploads and scene notes for follow-ups"""
+
+    def __init__(self, max_dim=MAX_UPLOAD_DIM, quality=JPEG_QUALITY, threshold=CHANGE_THRESHOLD):
+        self.max_dim = max_dim
+        self.quality = quality
+        self.threshold = threshold
+        self.raw_bytes = 0
+        self.uploaded_bytes = 0
+        self.reused_encodings = 0
+        self._scenes = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, session_id, frame):
+        """Hash the frame and reuse the previous encoding when the scene hasn't changed"""
+        session_id = session_id or "default"
+        current_hash = frame_hash(frame)
+
+        with self._lock:
+            previous = self._scenes.get(session_id)
+
+        if previous is not None and hash_distance(previous.hash, current_hash) <= self.threshold:
+            with self._lock:
+                self.reused_encodings += 1
+            return Scene(previous.hash, previous.image_part, previous.notes, unchanged=True)
+
+        image_part = encode_frame(frame, self.max_dim, self.quality)
+        scene = Scene(current_hash, image_part, [], unchanged=False)
+        with self._lock:
+            self.raw_bytes += frame.nbytes
+            self.uploaded_bytes += len(image_part["data"])
+            self._scenes[session_id] = scene
+        logger.debug(f"📐 Encoded frame {frame.shape[1]}x{frame.shape[0]} -> {len(image_part['data']) / 1024:.0f} KB JPEG")
+        return scene
+
+    def remember(self, session_id, scene, question, answer):
+        """Keep the latest Q/A about a scene so follow-ups can skip the upload"""
+        if not answer:
+            return
+        with self._lock:
+            scene.notes.append((question, answer))
+            del scene.notes[:-MAX_SCENE_NOTES]
+
+    def has_notes(self, session_id):
+        """Whether Apex already answered something about this session's current scene"""
+        with self._lock:
+            scene = self._scenes.get(session_id or "default")
+            return scene is not None and bool(scene.notes)
+
+    def reset(self, session_id):
+        """Forget the scene for a session"""
+        with self._lock:
+            self._scenes.pop(session_id or "default", None)
+
+    def stats(self):
+        """Upload savings so far"""
+        with self._lock:
+            return {
+                "raw_bytes": self.raw_bytes,
+                "uploaded_bytes": self.uploaded_bytes,
+                "reused_encodings": self.reused_encodings,
+            }
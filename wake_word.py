@@ -0,0 +1,356 @@
+import glob
+import logging
+import os
+import threading
+import time
+import wave
+
+import numpy as np
+
+from metrics import record_timing
+from speech_to_txt import microphone, transcribe_stream, UPLOAD_SAMPLE_RATE
+from vad import EnergyVAD, UtteranceSegmenter, FRAME_MS
+
+logger = logging.getLogger(__name__)
+
+# Enrolled recordings of the wake word (16 kHz mono WAVs of someone saying "Apex")
+WAKE_TEMPLATES_DIR = os.getenv("APEX_WAKE_TEMPLATES_DIR", "wake_templates")
+# DTW distance below which a candidate counts as the wake word
+WAKE_THRESHOLD = float(os.getenv("APEX_WAKE_THRESHOLD", "45"))
+
+# Only bursts of plausible keyword length are scored, which bounds the CPU spent per burst
+MIN_CANDIDATE_MS = 250
+MAX_CANDIDATE_MS = 1200
+# Hangover for keyword candidates is short so "Apex, what's..." splits after "Apex"
+CANDIDATE_HANGOVER_MS = 180
+# Frames kept while idle; must cover the VAD pre-roll plus the speech-start run
+ROLLING_FRAMES = 20
+
+# MFCC settings
+N_FFT = 512
+WIN_LENGTH = 400   # 25 ms
+HOP_LENGTH = 160   # 10 ms
+N_MELS = 26
+N_MFCC = 13
+DTW_BAND = 0.25    # Sakoe-Chiba band as a fraction of the longer sequence
+
+
+def _mel_filterbank(sample_rate=UPLOAD_SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS):
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10 ** (mel / 2595.0) - 1.0)
+
+    mel_points = np.linspace(hz_to_mel(0), hz_to_mel(sample_rate / 2), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mel_points) / sample_rate).astype(int)
+    bank = np.zeros((n_mels, n_fft // 2 + 1), dtype=np.float32)
+    for m in range(1, n_mels + 1):
+        left, center, right = bins[m - 1], bins[m], bins[m + 1]
+        if center > left:
+            bank[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            bank[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+    return bank
+
+
+# Precomputed once: window, mel filterbank and DCT-II matrix
+_WINDOW = np.hamming(WIN_LENGTH).astype(np.float32)
+_MEL_BANK = _mel_filterbank()
+_DCT = np.cos(np.pi / N_MELS * (np.arange(N_MELS) + 0.5)[None, :] * np.arange(N_MFCC)[:, None]).astype(np.float32)
+
+
+def mfcc(samples):
+    """MFCC features (frames x N_MFCC) of int16 samples, mean-normalized per coefficient"""
+    signal = samples.astype(np.float32) / 32768.0
+    signal = np.append(signal[0], signal[1:] - 0.97 * signal[:-1])  # pre-emphasis
+
+    if len(signal) < WIN_LENGTH:
+        signal = np.pad(signal, (0, WIN_LENGTH - len(signal)))
+    n_frames = 1 + (len(signal) - WIN_LENGTH) // HOP_LENGTH
+    index = np.arange(WIN_LENGTH)[None, :] + HOP_LENGTH * np.arange(n_frames)[:, None]
+    frames = signal[index] * _WINDOW
+
+    power = np.abs(np.fft.rfft(frames, N_FFT)) ** 2 / N_FFT
+    mel = np.log(power @ _MEL_BANK.T + 1e-10)
+    features = mel @ _DCT.T
+    return features - features.mean(axis=0)
+
+
+def dtw_distance(a, b, band=DTW_BAND):
+    """Length-normalized DTW distance between two feature sequences, within a Sakoe-Chiba band"""
+    n, m = len(a), len(b)
+    cost = np.sqrt(((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=-1))
+    width = max(int(band * max(n, m)), abs(n - m) + 1)
+
+    acc = np.full((n + 1, m + 1), np.inf)
+    acc[0, 0] = 0.0
+    for i in range(1, n + 1):
+        center = int(i * m / n)
+        for j in range(max(1, center - width), min(m, center + width) + 1):
+            acc[i, j] = cost[i - 1, j - 1] + min(acc[i - 1, j], acc[i, j - 1], acc[i - 1, j - 1])
+    return acc[n, m] / (n + m)
+
+
+def load_wav_samples(path):
+    """int16 samples from a 16 kHz mono 16-bit WAV"""
+    with wave.open(path, "rb") as wav:
+        if wav.getframerate() != UPLOAD_SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            raise ValueError(f"❌ {path}: expected a 16 kHz mono 16-bit WAV")
+        return np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+
+
+class KeywordSpotter:
+    """Template-matching keyword spotter: MFCC + DTW against enrolled recordings"""
+
+    def __init__(self, templates=None, threshold=WAKE_THRESHOLD):
+        self.templates = list(templates or [])
+        self.threshold = threshold
+
+    @classmethod
+    def from_directory(cls, directory=WAKE_TEMPLATES_DIR, threshold=WAKE_THRESHOLD):
+        paths = sorted(glob.glob(os.path.join(directory, "*.wav")))
+        return cls([mfcc(load_wav_samples(path)) for path in paths], threshold)
+
+    def score(self, samples):
+        """Best (lowest) DTW distance of a candidate against the templates"""
+        features = mfcc(samples)
+        return min(dtw_distance(features, template) for template in self.templates)
+
+    def matches(self, samples):
+        return bool(self.templates) and self.score(samples) < self.threshold
+
+
+class MicrophoneSource:
+    """
+    One microphone stream kept open for the lifetime of the listener. It is closed
+    while a Voice button capture needs the device and reopened once that is done.
+    """
+
+    def __init__(self, block_ms=FRAME_MS):
+        self._chunk_size = UPLOAD_SAMPLE_RATE * block_ms // 1000
+        self._mic = None
+        self._open()
+
+    def _open(self):
+        import speech_recognition as sr
+        microphone.background_opened()
+        try:
+            self._mic = sr.Microphone(sample_rate=UPLOAD_SAMPLE_RATE, chunk_size=self._chunk_size)
+            self._source = self._mic.__enter__()
+        except Exception:
+            self._mic = None
+            microphone.background_closed()
+            raise
+
+    def _close(self):
+        if self._mic is not None:
+            self._mic.__exit__(None, None, None)
+            self._mic = None
+            microphone.background_closed()
+
+    def read(self):
+        if microphone.wanted:
+            # Blocks until the capture is done; the listener just sees a gap in the audio
+            self._close()
+            self._open()
+        return np.frombuffer(self._source.stream.read(self._source.CHUNK), dtype=np.int16)
+
+    def close(self):
+        self._close()
+
+
+class WavFileSource:
+    """Plays one or more WAV files as if they were the microphone (for tests and benchmarks)"""
+
+    def __init__(self, paths, block_ms=FRAME_MS, realtime=False, trailing_silence_ms=1500):
+        paths = [paths] if isinstance(paths, str) else paths
+        silence = np.zeros(UPLOAD_SAMPLE_RATE * trailing_silence_ms // 1000, dtype=np.int16)
+        self._samples = np.concatenate([np.concatenate([load_wav_samples(p), silence]) for p in paths])
+        self._block = UPLOAD_SAMPLE_RATE * block_ms // 1000
+        self._position = 0
+        self._realtime = realtime
+        self._block_seconds = block_ms / 1000
+
+    def read(self):
+        block = self._samples[self._position:self._position + self._block]
+        self._position += len(block)
+        if self._realtime and len(block):
+            time.sleep(self._block_seconds)
+        return block
+
+    def close(self):
+        pass
+
+
+class WakeWordListener:
+    """
+    Background listener: keeps one audio stream open, spots "Apex" locally and hands
+    the speech that follows to the streaming transcription stage.
+
+    `on_command(text)` is called on the listener thread with each transcribed
+    command and must return quickly - hand the answer off to a worker - since the
+    microphone isn't read while it runs. Only short voiced
+    bursts (found by an energy VAD) are scored, so CPU cost is bounded by the burst
+    rate, not the audio rate; the per-frame cost is measured and exposed in stats().
+    """
+
+    def __init__(self, on_command, source_factory=MicrophoneSource, spotter=None,
+                 command_timeout=5, phrase_time_limit=10, transcribe=None):
+        self.on_command = on_command
+        self.source_factory = source_factory
+        self.spotter = spotter or KeywordSpotter.from_directory()
+        self.command_timeout = command_timeout
+        self.phrase_time_limit = phrase_time_limit
+        self.transcribe = transcribe
+        self.vad = EnergyVAD()
+        self.frames_processed = 0
+        self.processing_seconds = 0.0
+        self.candidates_scored = 0
+        self.wakes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.spotter.templates:
+            logger.warning(
+                f"⚠️ No wake word templates in '{WAKE_TEMPLATES_DIR}' - wake word listener not started "
+                f"(record them with: python wake_word.py enroll)"
+            )
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="apex-wake-word", daemon=True)
+        self._thread.start()
+        logger.info("👂 Wake word listener running - say 'Apex'")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _new_segmenter(self):
+        return UtteranceSegmenter(self.vad, hangover_ms=CANDIDATE_HANGOVER_MS)
+
+    def _run(self):
+        source = self.source_factory()
+        try:
+            segmenter = self._new_segmenter()
+            while not self._stop.is_set():
+                samples = source.read()
+                if samples is None or len(samples) == 0:
+                    break
+
+                started = time.perf_counter()
+                ended = segmenter.feed(samples)
+                woke = False
+                if ended:
+                    woke = self._score_candidate(segmenter)
+                    segmenter = self._new_segmenter()
+                elif segmenter.started and segmenter.utterance_frames() * FRAME_MS > MAX_CANDIDATE_MS:
+                    segmenter = self._new_segmenter()  # too long to be the keyword
+                elif not segmenter.started and len(segmenter.frames) > ROLLING_FRAMES:
+                    # Keep only a rolling window (enough for pre-roll) while nobody is talking
+                    del segmenter.frames[:-ROLLING_FRAMES]
+
+                elapsed = time.perf_counter() - started
+                self.frames_processed += max(1, len(samples) * 1000 // (UPLOAD_SAMPLE_RATE * FRAME_MS))
+                self.processing_seconds += elapsed
+                record_timing("wake_word.block_cost", elapsed)
+
+                if woke:
+                    self._handle_command(source)
+        finally:
+            source.close()
+
+    def _score_candidate(self, segmenter):
+        length_ms = segmenter.utterance_frames() * FRAME_MS
+        if not MIN_CANDIDATE_MS <= length_ms <= MAX_CANDIDATE_MS:
+            return False
+        self.candidates_scored += 1
+        return self.spotter.matches(segmenter.utterance_samples())
+
+    def _handle_command(self, source):
+        self.wakes += 1
+        logger.info("👂 Wake word detected - listening for the command...")
+        try:
+            text = transcribe_stream(
+                source.read, timeout=self.command_timeout,
+                phrase_time_limit=self.phrase_time_limit, transcribe=self.transcribe
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ No command after wake word: {e}")
+            return
+        if text.strip():
+            self.on_command(text)
+
+    def stats(self):
+        """Per-frame processing cost and detection counters"""
+        frames = self.frames_processed or 1
+        per_frame = self.processing_seconds / frames
+        return {
+            "frames": self.frames_processed,
+            "avg_frame_cost_ms": per_frame * 1000,
+            "cpu_fraction": per_frame / (FRAME_MS / 1000),
+            "candidates_scored": self.candidates_scored,
+            "wakes": self.wakes,
+        }
+
+
+def enroll(count=3, directory=WAKE_TEMPLATES_DIR, source_factory=MicrophoneSource):
+    """Record `count` takes of the wake word from the microphone as templates; returns their paths"""
+    os.makedirs(directory, exist_ok=True)
+    first = len(glob.glob(os.path.join(directory, "*.wav")))
+    source = source_factory()
+    paths = []
+    try:
+        while len(paths) < count:
+            print(f"🎙️ Say 'Apex' ({len(paths) + 1}/{count})...")
+            segmenter = UtteranceSegmenter(EnergyVAD(), hangover_ms=CANDIDATE_HANGOVER_MS)
+            while True:
+                block = source.read()
+                if block is None or len(block) == 0:
+                    return paths
+                if segmenter.feed(block):
+                    break
+                if not segmenter.started and len(segmenter.frames) > ROLLING_FRAMES:
+                    del segmenter.frames[:-ROLLING_FRAMES]
+            samples = segmenter.utterance_samples()
+            length_ms = len(samples) * 1000 // UPLOAD_SAMPLE_RATE
+            if not MIN_CANDIDATE_MS <= length_ms <= MAX_CANDIDATE_MS:
+                print(f"⚠️ That took {length_ms} ms - say just the one word, please")
+                continue
+            path = os.path.join(directory, f"apex_{first + len(paths) + 1:02d}.wav")
+            with wave.open(path, "wb") as wav:
+                wav.setnchannels(1)
+                wav.setsampwidth(2)
+                wav.setframerate(UPLOAD_SAMPLE_RATE)
+                wav.writeframes(samples.tobytes())
+            paths.append(path)
+    finally:
+        source.close()
+    return paths
+
+
+if __name__ == "__main__":
+    # python wake_word.py enroll [takes]            - record wake word templates into APEX_WAKE_TEMPLATES_DIR
+    # python wake_word.py clip1.wav [clip2.wav ...] - replay recordings through the listener and report cost
+    import sys
+
+    if sys.argv[1:2] == ["enroll"]:
+        saved = enroll(int(sys.argv[2]) if len(sys.argv) > 2 else 3)
+        print(f"✅ Saved {len(saved)} template(s) to '{WAKE_TEMPLATES_DIR}' - start Apex with APEX_WAKE_WORD=1")
+        sys.exit(0)
+
+    def print_command(text):
+        print(f"📝 Command: '{text}'")
+
+    listener = WakeWordListener(print_command, source_factory=lambda: WavFileSource(sys.argv[1:]))
+    listener.start()
+    if listener._thread is not None:
+        listener._thread.join()
+    stats = listener.stats()
+    print(
+        f"👂 {stats['frames']} frames, {stats['avg_frame_cost_ms']:.3f} ms/frame "
+        f"({stats['cpu_fraction']:.1%} of real time), {stats['candidates_scored']} candidates, {stats['wakes']} wakes"
+    )